@@ -0,0 +1,97 @@
+"""
+Compare the streaming PDF assembler with the original FPDF and reportlab scripts
+
+Each assembler runs in its own process on the same synthetic JPEG pages,
+and wall time, peak RSS and output size are reported.
+
+Usage:
+    python benchmark/bench_img_2_pdf.py [--pages 100] [--width 1700 --height 2200]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def reportlab_baseline(image_dir, output_pdf):
+    # The original copy_img_to_pdf.images_to_pdf, kept as the baseline
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    image_paths = [os.path.join(image_dir, f) for f in os.listdir(image_dir) if f.lower().endswith('.jpg')]
+    c = canvas.Canvas(output_pdf, pagesize=letter)
+    for image_path in image_paths:
+        img = Image.open(image_path)
+        img_width, img_height = img.size
+        c.drawImage(image_path, 0, 0, width=img_width, height=img_height)
+        c.showPage()
+    c.save()
+
+
+def make_pages(image_dir, pages, width, height):
+    rng = np.random.default_rng(0)
+    os.makedirs(image_dir, exist_ok=True)
+    for index in range(1, pages + 1):
+        page = np.full((height, width), 255, dtype=np.uint8)
+        for top in range(100, height - 100, 40):
+            strokes = rng.random((12, width - 200)) < 0.2
+            page[top:top + 12, 100:width - 100][strokes] = 0
+        Image.fromarray(page).convert('RGB').save(os.path.join(image_dir, f'img{index}.jpg'), quality=75, dpi=(200, 200))
+
+
+def measure(command, cwd):
+    """
+    Run a command and return (seconds, peak RSS in MB) for that process only
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} exited with {process.returncode}")
+    rss_kb = usage.ru_maxrss if sys.platform != 'darwin' else usage.ru_maxrss / 1024
+    return seconds, rss_kb / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark images-to-PDF assembly')
+    parser.add_argument('--pages', type=int, default=100, help='Synthetic pages (default: 100)')
+    parser.add_argument('--width', type=int, default=1700, help='Page width in pixels (default: 1700)')
+    parser.add_argument('--height', type=int, default=2200, help='Page height in pixels (default: 2200)')
+    parser.add_argument('--reportlab-baseline', nargs=2, metavar=('IMAGE_DIR', 'OUTPUT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.reportlab_baseline:
+        reportlab_baseline(*args.reportlab_baseline)
+        return
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        make_pages(os.path.join(work_dir, 'rr'), args.pages, args.width, args.height)
+        input_mb = sum(os.path.getsize(os.path.join(work_dir, 'rr', f)) for f in os.listdir(os.path.join(work_dir, 'rr'))) / 1e6
+        print(f"{args.pages} JPEG pages of {args.width}x{args.height}, {input_mb:.1f} MB")
+
+        runs = [
+            ('img_2_pdf_old.py (fpdf)', [sys.executable, os.path.join(REPO, 'img_2_pdf_old.py')], 'no_watermark.pdf'),
+            ('copy_img_to_pdf (reportlab)', [sys.executable, os.path.abspath(__file__), '--reportlab-baseline', 'rr', 'reportlab.pdf'], 'reportlab.pdf'),
+            ('img_2_pdf.py (streaming)', [sys.executable, os.path.join(REPO, 'img_2_pdf.py'), '--output', 'streamed.pdf', '--quiet'], 'streamed.pdf'),
+        ]
+        print(f"{'assembler':<30} {'seconds':>8} {'peak RSS MB':>12} {'output MB':>10}")
+        for name, command, output in runs:
+            try:
+                seconds, rss_mb = measure(command, work_dir)
+            except (RuntimeError, OSError) as e:
+                print(f"{name:<30} failed: {e}")
+                continue
+            output_mb = os.path.getsize(os.path.join(work_dir, output)) / 1e6
+            print(f"{name:<30} {seconds:>8.2f} {rss_mb:>12.1f} {output_mb:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
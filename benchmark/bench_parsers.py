@@ -0,0 +1,85 @@
+"""
+Compare patent page parser backends by pages/sec and peak memory
+
+Usage:
+    python benchmark/bench_parsers.py [--fixtures 'benchmark/fixtures/*.html'] [--pages 500]
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patent_parser import available_backends, extract_patent_page
+
+
+def run_backend(backend, fixtures, pages, queue):
+    """
+    Parse `pages` documents with one backend, run in its own process
+
+    Peak RSS is per process, so each backend gets a fresh interpreter.
+    """
+    documents = []
+    for path in fixtures:
+        with open(path, 'rb') as f:
+            documents.append(f.read())
+
+    # Warm up imports and caches
+    extract_patent_page(documents[0], backend)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    for i in range(pages):
+        extract_patent_page(documents[i % len(documents)], backend)
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Second, smaller pass for Python heap peak (tracemalloc slows parsing down)
+    tracemalloc.start()
+    for document in documents:
+        extract_patent_page(document, backend)
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    queue.put({
+        'backend': backend,
+        'pages_per_sec': pages / elapsed if elapsed > 0 else float('inf'),
+        'ms_per_page': elapsed * 1000 / pages,
+        'rss_growth_kb': rss_after - rss_before,
+        'peak_rss_kb': rss_after,
+        'python_heap_peak_kb': heap_peak // 1024,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark patent page parser backends')
+    parser.add_argument('--fixtures', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', '*.html'),
+                        help='Glob of saved patent HTML pages')
+    parser.add_argument('--pages', type=int, default=500, help='Pages parsed per backend (default: 500)')
+    parser.add_argument('--backends', nargs='+', default=available_backends(), help='Backends to compare')
+    args = parser.parse_args()
+
+    fixtures = sorted(glob.glob(args.fixtures))
+    if not fixtures:
+        print(f"No fixtures found for {args.fixtures}")
+        return
+
+    print(f"Parsing {args.pages} pages from {len(fixtures)} fixture(s)")
+    print(f"{'backend':<12} {'pages/sec':>10} {'ms/page':>9} {'peak RSS KB':>12} {'RSS growth KB':>14} {'heap peak KB':>13}")
+    queue = multiprocessing.Queue()
+    for backend in args.backends:
+        process = multiprocessing.Process(target=run_backend, args=(backend, fixtures, args.pages, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        print(f"{result['backend']:<12} {result['pages_per_sec']:>10.1f} {result['ms_per_page']:>9.2f} "
+              f"{result['peak_rss_kb']:>12} {result['rss_growth_kb']:>14} {result['python_heap_peak_kb']:>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Compare vectorized watermark removal against the original per-pixel loop
+
+Usage:
+    python benchmark/bench_watermark.py [--width 1700 --height 2200] [--pages 3] [--loop-rows 200]
+
+The loop is timed on the first --loop-rows rows of a page and
+extrapolated to a full page, because a full 200 DPI page takes minutes.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from remove_watermark import handle, select_pixel2, RULES
+from synthetic import watermarked_page as synthetic_page
+
+
+def handle_loop(imgs):
+    # The original remove_watermark.handle, kept as the baseline
+    for i in range(imgs.shape[0]):
+        for j in range(imgs.shape[1]):
+            if select_pixel2(imgs[i][j][0], imgs[i][j][1], imgs[i][j][2]):
+                imgs[i][j][0] = imgs[i][j][1] = imgs[i][j][2] = 255
+    return imgs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark watermark removal')
+    parser.add_argument('--width', type=int, default=1700, help='Page width in pixels (default: 1700, letter at 200 DPI)')
+    parser.add_argument('--height', type=int, default=2200, help='Page height in pixels (default: 2200)')
+    parser.add_argument('--pages', type=int, default=3, help='Synthetic pages for the vectorized run (default: 3)')
+    parser.add_argument('--loop-rows', type=int, default=200, help='Rows timed with the pixel loop (default: 200)')
+    args = parser.parse_args()
+
+    pages = [synthetic_page(args.height, args.width, seed) for seed in range(args.pages)]
+    print(f"{args.pages} synthetic page(s) of {args.width}x{args.height} ({args.width * args.height / 1e6:.2f}M pixels)")
+
+    # Same result as the loop on the sampled rows
+    rows = min(args.loop_rows, args.height)
+    sample = pages[0][:rows].copy()
+    start = time.perf_counter()
+    expected = handle_loop(sample.copy())
+    loop_seconds = (time.perf_counter() - start) * args.height / rows
+    assert np.array_equal(handle(sample.copy()), expected), "vectorized result differs from the loop"
+
+    results = {}
+    for rules, band in [(['range'], False), (RULES, False), (RULES, True)]:
+        start = time.perf_counter()
+        for page in pages:
+            handle(page.copy(), rules, band)
+        results[(tuple(rules), band)] = (time.perf_counter() - start) / len(pages)
+
+    print(f"{'engine':<32} {'s/page':>10} {'speedup':>10}")
+    print(f"{'pixel loop (extrapolated)':<32} {loop_seconds:>10.3f} {1:>10.1f}")
+    for (rules, band), seconds in results.items():
+        name = f"vectorized {'+'.join(rules)}{' band' if band else ''}"
+        print(f"{name:<32} {seconds:>10.4f} {loop_seconds / seconds:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
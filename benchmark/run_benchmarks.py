@@ -0,0 +1,306 @@
+"""
+Benchmark suite for the downloader, watermark, OCR, PDF assembly and table extraction hot paths
+
+Fixtures are generated (see synthetic.py), so the suite runs offline.
+Every component runs in its own fresh process and reports throughput,
+per-item latency percentiles and peak RSS. Results can be saved as a
+JSON baseline and later runs compared against it, so swapping an engine
+(parser backend, OCR engine, PDF writer) shows up as a regression or a win.
+
+Components:
+    parse               patent_parser.extract_patent_page on generated patent pages
+    read_existing_info  GooglePatentDownloader.read_existing_info on generated _info.txt files
+    watermark           remove_watermark.handle on watermarked pages
+    ocr / ocr_cached    img_ocr.ocr_pages, cold and then from the result cache
+    pdf_assembly        img_2_pdf.StreamingPdfWriter on JPEG pages
+    pdf_extract         pdf_extract.extract_rows on a ruled-table PDF
+
+Usage:
+    python benchmark/run_benchmarks.py [--components parse watermark ...] [--quick]
+                                       [--save-baseline benchmark/baseline.json] [--compare benchmark/baseline.json]
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+import synthetic
+
+# Default sizes, and the smaller --quick ones
+SIZES = {
+    'html_pages': (300, 50),
+    'info_files': (2000, 300),
+    'watermark_pages': (4, 1),
+    'image_pages': (30, 6),
+    'table_pages': (20, 4),
+}
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def timed(items, run):
+    """
+    Run `run` on every item, timing each call
+
+    Returns:
+        list: Seconds per item
+    """
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        run(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_parse(work_dir, args):
+    from patent_parser import default_backend, extract_patent_page
+    backend = args.parser or default_backend()
+    documents = []
+    html_dir = os.path.join(work_dir, 'html')
+    for name in sorted(os.listdir(html_dir)):
+        with open(os.path.join(html_dir, name), 'rb') as f:
+            documents.append(f.read())
+    extract_patent_page(documents[0], backend)  # Warm up imports
+    return backend, 'pages', timed(documents, lambda document: extract_patent_page(document, backend))
+
+
+def bench_read_existing_info(work_dir, args):
+    from google_patent_downloader import GooglePatentDownloader
+    from patent_report import ReportWriter
+    os.chdir(work_dir)  # The downloader reads patents/<n>_info.txt relative to the working directory
+    downloader = GooglePatentDownloader(report=ReportWriter(os.path.join(work_dir, 'reports', 'bench.csv')))
+    numbers = [synthetic.patent_number(index) for index in range(args.sizes['info_files'])]
+    return 'regex', 'files', timed(numbers, downloader.read_existing_info)
+
+
+def bench_watermark(work_dir, args):
+    from remove_watermark import DEFAULT_RULES, handle
+    pages = [synthetic.watermarked_page(args.height, args.width, seed) for seed in range(args.sizes['watermark_pages'])]
+    return '+'.join(DEFAULT_RULES), 'pages', timed(pages, lambda page: handle(page.copy()))
+
+
+def ocr_backend():
+    from img_ocr import OCR_BACKENDS
+    if shutil.which('tesseract'):
+        return 'tesseract', OCR_BACKENDS['tesseract']
+    return 'fake', synthetic.fake_ocr
+
+
+def bench_ocr(work_dir, args, cache_dir=None):
+    from img_ocr import ocr_pages
+    name, ocr = ocr_backend()
+    paths = sorted(os.path.join(work_dir, 'pages', f) for f in os.listdir(os.path.join(work_dir, 'pages')))
+    latencies = []
+    start = time.perf_counter()
+    # Pages are yielded in order as they finish, so the gaps are the per-page latency seen by the caller
+    for _ in ocr_pages(paths, ocr, name, workers=args.workers, cache_dir=cache_dir or os.path.join(work_dir, 'ocr_cache_cold')):
+        now = time.perf_counter()
+        latencies.append(now - start)
+        start = now
+    return name, 'pages', latencies
+
+
+def bench_ocr_cached(work_dir, args):
+    cache_dir = os.path.join(work_dir, 'ocr_cache_warm')
+    bench_ocr(work_dir, args, cache_dir)  # Fill the cache, not measured
+    return bench_ocr(work_dir, args, cache_dir)
+
+
+def bench_pdf_assembly(work_dir, args):
+    from img_2_pdf import StreamingPdfWriter
+    paths = sorted(os.path.join(work_dir, 'pages', f) for f in os.listdir(os.path.join(work_dir, 'pages')))
+    writer = StreamingPdfWriter(os.path.join(work_dir, 'assembled.pdf'))
+    latencies = timed(paths, writer.add_page)
+    writer.close()
+    return 'streaming', 'pages', latencies
+
+
+def bench_pdf_extract(work_dir, args):
+    from pdf_extract import extract_rows
+    pdf_path = os.path.join(work_dir, 'tables.pdf')
+    pages = range(1, args.sizes['table_pages'] + 1)
+    return 'pdfplumber', 'pages', timed(pages, lambda page: extract_rows(pdf_path, [page], r'^SBIOS'))
+
+
+COMPONENTS = {
+    'parse': bench_parse,
+    'read_existing_info': bench_read_existing_info,
+    'watermark': bench_watermark,
+    'ocr': bench_ocr,
+    'ocr_cached': bench_ocr_cached,
+    'pdf_assembly': bench_pdf_assembly,
+    'pdf_extract': bench_pdf_extract,
+}
+
+
+def make_fixtures(work_dir, components, args):
+    """
+    Generate the fixture files the selected components read
+    """
+    if 'parse' in components:
+        html_dir = os.path.join(work_dir, 'html')
+        os.makedirs(html_dir, exist_ok=True)
+        for index in range(args.sizes['html_pages']):
+            number = synthetic.patent_number(index)
+            with open(os.path.join(html_dir, f'{number}.html'), 'wb') as f:
+                f.write(synthetic.patent_html(number, seed=index))
+    if 'read_existing_info' in components:
+        patents_dir = os.path.join(work_dir, 'patents')
+        os.makedirs(patents_dir, exist_ok=True)
+        for index in range(args.sizes['info_files']):
+            number = synthetic.patent_number(index)
+            with open(os.path.join(patents_dir, f'{number}_info.txt'), 'w', encoding='utf-8') as f:
+                f.write(synthetic.info_text(number, seed=index))
+    if {'ocr', 'ocr_cached', 'pdf_assembly'} & set(components):
+        synthetic.write_pages(os.path.join(work_dir, 'pages'), args.sizes['image_pages'], args.width, args.height)
+    if 'pdf_extract' in components:
+        synthetic.write_table_pdf(os.path.join(work_dir, 'tables.pdf'), args.sizes['table_pages'])
+
+
+def run_component(name, work_dir, args, queue):
+    """
+    Run one component in a fresh process so its peak RSS is its own
+    """
+    try:
+        start = time.perf_counter()
+        engine, unit, latencies = COMPONENTS[name](work_dir, args)
+        seconds = time.perf_counter() - start
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            peak_kb /= 1024
+        # Worker processes (OCR) are measured too
+        children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        if sys.platform == 'darwin':
+            children_kb /= 1024
+        busy = sum(latencies)
+        queue.put({
+            'component': name,
+            'engine': engine,
+            'unit': unit,
+            'items': len(latencies),
+            'seconds': seconds,
+            'per_second': len(latencies) / busy if busy > 0 else float('inf'),
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'max_ms': max(latencies) * 1000 if latencies else 0.0,
+            'peak_rss_mb': max(peak_kb, children_kb) / 1024,
+        })
+    except Exception as e:
+        queue.put({'component': name, 'error': f"{type(e).__name__}: {e}"})
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results with a saved baseline
+
+    Returns:
+        list: Regression messages, empty if nothing got slower or bigger than the tolerance allows
+    """
+    regressions = []
+    print(f"\n{'component':<20} {'engine':<22} {'throughput':>11} {'p95':>9} {'peak RSS':>9}")
+    for name, result in results.items():
+        old = baseline['results'].get(name)
+        if not old or 'error' in result or 'error' in old:
+            continue
+        engine = result['engine'] if result['engine'] == old['engine'] else f"{old['engine']} -> {result['engine']}"
+        throughput = result['per_second'] / old['per_second'] - 1 if old['per_second'] else 0.0
+        p95 = result['p95_ms'] / old['p95_ms'] - 1 if old['p95_ms'] else 0.0
+        rss = result['peak_rss_mb'] / old['peak_rss_mb'] - 1 if old['peak_rss_mb'] else 0.0
+        print(f"{name:<20} {engine:<22} {throughput:>+10.1%} {p95:>+8.1%} {rss:>+8.1%}")
+        if throughput < -tolerance:
+            regressions.append(f"{name}: throughput {throughput:+.1%}")
+        if rss > tolerance:
+            regressions.append(f"{name}: peak RSS {rss:+.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the offline benchmark suite')
+    parser.add_argument('--components', nargs='+', choices=list(COMPONENTS), default=list(COMPONENTS),
+                        help='Components to run (default: all)')
+    parser.add_argument('--quick', action='store_true', help='Smaller fixtures for a fast smoke run')
+    parser.add_argument('--width', type=int, default=1700, help='Page width in pixels (default: 1700, letter at 200 DPI)')
+    parser.add_argument('--height', type=int, default=2200, help='Page height in pixels (default: 2200)')
+    parser.add_argument('--workers', type=int, default=2, help='OCR worker processes (default: 2)')
+    parser.add_argument('--parser', help='HTML parser backend for the parse component (default: the downloader default)')
+    parser.add_argument('--save-baseline', metavar='PATH', help='Write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='Compare with a JSON baseline, exit 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Allowed throughput drop or peak RSS growth before a regression is reported (default: 0.15)')
+    args = parser.parse_args()
+    args.sizes = {name: sizes[1] if args.quick else sizes[0] for name, sizes in SIZES.items()}
+
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix='patent_bench_')
+    try:
+        context = multiprocessing.get_context('spawn')
+        # Linux keeps the peak RSS of the parent across fork and exec, so fixtures
+        # are generated in their own process to keep this one small
+        process = context.Process(target=make_fixtures, args=(work_dir, args.components, args))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            print("Generating fixtures failed")
+            sys.exit(1)
+        queue = context.Queue()
+        print(f"{'component':<20} {'engine':<12} {'items':>6} {'per sec':>10} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'peak RSS MB':>12}")
+        for name in args.components:
+            process = context.Process(target=run_component, args=(name, work_dir, args, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+            results[name] = result
+            if 'error' in result:
+                print(f"{name:<20} failed: {result['error']}")
+                continue
+            print(f"{name:<20} {result['engine']:<12} {result['items']:>6} {result['per_second']:>10.1f} "
+                  f"{result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['max_ms']:>9.2f} {result['peak_rss_mb']:>12.1f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    run = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'sizes': args.sizes,
+        'page_size': [args.width, args.height],
+        'results': results,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(run, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('sizes') != args.sizes or baseline.get('page_size') != [args.width, args.height]:
+            print("Warning: baseline was recorded with different fixture sizes")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions beyond the tolerance")
+
+
+if __name__ == '__main__':
+    main()
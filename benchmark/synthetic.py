@@ -0,0 +1,235 @@
+"""
+Generated fixtures for the benchmark suite, so every benchmark runs offline
+
+    patent_html     Google Patents style page (metadata, abstract, description, claims, citations)
+    info_text       patents/<n>_info.txt content as written by save_patent_info
+    write_pages     JPEG page images with text strokes and a gray diagonal watermark
+    write_table_pdf Vector PDF of ruled SBIOS requirement tables, readable by pdfplumber
+    fake_ocr        Deterministic OCR backend for machines without tesseract
+
+All generators are seeded, so the same arguments give the same bytes.
+"""
+import html
+import os
+import random
+
+import numpy as np
+from PIL import Image
+
+WORDS = ('power supply motherboard voltage server system signal backup unit load state processor memory controller '
+         'firmware interface module circuit device method detecting switching regulator thermal sensor fan storage '
+         'network adapter bus clock reset management platform battery output input current').split()
+FIRST_NAMES = ['Wei-Ming', 'Hsiao-Ling', 'Jian', 'Maria', 'John', 'Akira', 'Priya', 'Lars', 'Chen', 'Sofia']
+LAST_NAMES = ['Chen', 'Lin', 'Wang', 'Garcia', 'Smith', 'Tanaka', 'Patel', 'Berg', 'Huang', 'Rossi']
+AREAS = ['PWR', 'MEM', 'PCIE', 'SEC', 'BOOT', 'THERM', 'USB', 'NET']
+
+
+def sentence(rng, words):
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def patent_number(index):
+    return f"US{9000000 + index}B2"
+
+
+def patent_html(number, seed=0, paragraphs=8, claims=10, citations=6):
+    """
+    Build a patent page with the structure of benchmark/fixtures/US1234567B2.html
+
+    Args:
+        number (str): Publication number
+        seed (int): Random seed for the text
+        paragraphs (int): Description paragraphs, the bulk of a real page
+        claims (int): Number of claims
+        citations (int): Cited-by rows (and as many family rows)
+
+    Returns:
+        bytes: UTF-8 HTML
+    """
+    rng = random.Random(seed)
+    title = sentence(rng, rng.randint(4, 9)).rstrip('.')
+    inventors = [f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}" for _ in range(rng.randint(1, 5))]
+    year = rng.randint(2000, 2020)
+    filing = f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    publication = f"{year + 2}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    pdf_url = f"https://patentimages.storage.googleapis.com/{number[-4:]}/{number}.pdf"
+
+    parts = [
+        '<!DOCTYPE html>\n<html lang="en">\n<head>\n  <meta charset="UTF-8">\n',
+        f'  <title>{number} - {html.escape(title)} - Google Patents</title>\n',
+        f'  <meta name="DC.title" content="{html.escape(title)}">\n',
+        f'  <meta name="citation_pdf_url" content="{pdf_url}">\n</head>\n<body>\n  <search-app>\n',
+        '    <article class="result" itemscope itemtype="http://schema.org/ScholarlyArticle">\n',
+        f'      <h1 itemprop="pageTitle">{number} - {html.escape(title)} - Google Patents</h1>\n',
+        f'      <span itemprop="title">{html.escape(title)}\n     </span>\n',
+        f'      <a href="{pdf_url}" itemprop="pdfLink">Download PDF</a>\n',
+        f'      <h2>Info</h2>\n      <dl>\n        <dt>Publication number</dt>\n'
+        f'        <dd itemprop="publicationNumber">{number}</dd>\n        <dt>Inventor</dt>\n',
+    ]
+    for inventor in inventors:
+        parts.append(f'        <dd itemprop="inventor" repeat><span itemprop="inventor">{inventor}</span></dd>\n')
+    parts += [
+        '      </dl>\n      <dl>\n',
+        f'        <dt>Filing date</dt>\n        <dd><time itemprop="filingDate" datetime="{filing}">{filing}</time></dd>\n',
+        f'        <dt>Publication date</dt>\n        <dd><time itemprop="publicationDate" datetime="{publication}">{publication}</time></dd>\n',
+        '      </dl>\n      <section itemprop="abstract" itemscope>\n        <h2>Abstract</h2>\n',
+        '        <div itemprop="content" html><abstract lang="EN" load-source="patent-office">\n',
+        f'          <div class="abstract">{" ".join(sentence(rng, rng.randint(12, 30)) for _ in range(4))}</div>\n',
+        '        </abstract></div>\n      </section>\n',
+        '      <section itemprop="description" itemscope>\n        <h2>Description</h2>\n'
+        '        <div itemprop="content" html><div class="description">\n',
+    ]
+    for _ in range(paragraphs):
+        parts.append(f'          <div class="description-paragraph">{" ".join(sentence(rng, rng.randint(10, 25)) for _ in range(5))}</div>\n')
+    parts.append(f'        </div></div>\n      </section>\n      <section itemprop="claims" itemscope>\n'
+                 f'        <h2>Claims ({claims})</h2>\n        <div itemprop="content" html><div class="claims">\n')
+    for claim in range(1, claims + 1):
+        parts.append(f'          <div class="claim" num="{claim}"><div class="claim-text">{claim}. {sentence(rng, rng.randint(15, 40))}</div></div>\n')
+    parts.append(f'        </div></div>\n      </section>\n      <h2>Cited By ({citations})</h2>\n      <table>\n')
+    for itemprop in ('forwardReferencesOrig', 'backwardReferencesFamily'):
+        for _ in range(citations):
+            cited = f"US{rng.randint(5000000, 9999999)}B1"
+            parts.append(f'        <tr itemprop="{itemprop}" repeat>\n'
+                         f'          <td><a href="/patent/{cited}/en"><span itemprop="publicationNumber">{cited}</span></a></td>\n'
+                         f'          <td><span itemprop="title">{sentence(rng, 5).rstrip(".")}</span></td>\n        </tr>\n')
+    parts.append('      </table>\n    </article>\n  </search-app>\n</body>\n</html>\n')
+    return ''.join(parts).encode('utf-8')
+
+
+def info_text(number, seed=0):
+    """
+    Text of a patents/<n>_info.txt file, in the save_patent_info format
+
+    Returns:
+        str: File content
+    """
+    rng = random.Random(seed)
+    inventors = [f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}" for _ in range(rng.randint(1, 5))]
+    return (f"Patent Number: {number}\n"
+            f"Title: {sentence(rng, rng.randint(4, 9)).rstrip('.')}\n"
+            f"Filing Date: 2014-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}\n"
+            f"Publication Date: 2016-0{rng.randint(1, 9)}-2{rng.randint(0, 8)}\n"
+            f"Inventors: {', '.join(inventors)}\n"
+            f"\nAbstract:\n{' '.join(sentence(rng, rng.randint(12, 30)) for _ in range(4))}\n")
+
+
+def watermarked_page(height, width, seed=0):
+    """
+    White page with black text-like strokes and a diagonal gray watermark band
+
+    Returns:
+        np.ndarray: HxWx3 uint8 image
+    """
+    rng = np.random.default_rng(seed)
+    page = np.full((height, width, 3), 255, dtype=np.uint8)
+
+    # Text lines: short dark runs on every 40th row band
+    for top in range(100, height - 100, 40):
+        strokes = rng.random((12, width - 200)) < 0.25
+        page[top:top + 12, 100:width - 100][strokes] = rng.integers(0, 60, size=(int(strokes.sum()), 1), dtype=np.uint8)
+
+    # Watermark: anti-aliased grays in a diagonal band, like the scanned specs
+    y, x = np.ogrid[:height, :width]
+    band = np.abs(y - (height * 0.8 - 0.38 * x)) < 80
+    watermark = band & (rng.random((height, width)) < 0.6)
+    gray = rng.choice([196, 206, 208, 180, 230, 245], size=int(watermark.sum())).astype(np.uint8)
+    page[watermark] = gray[:, None]
+    return page
+
+
+def write_pages(image_dir, pages, width=1700, height=2200, quality=75):
+    """
+    Save watermarked JPEG pages as img1.jpg ... imgN.jpg at 200 DPI
+
+    Returns:
+        list: Image paths in page order
+    """
+    os.makedirs(image_dir, exist_ok=True)
+    paths = []
+    for index in range(1, pages + 1):
+        path = os.path.join(image_dir, f'img{index}.jpg')
+        Image.fromarray(watermarked_page(height, width, seed=index)).save(path, quality=quality, dpi=(200, 200))
+        paths.append(path)
+    return paths
+
+
+def pdf_string(text):
+    return '(' + text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ')'
+
+
+def write_table_pdf(path, pages, rows_per_page=12, seed=0):
+    """
+    Write a letter-size PDF with one ruled requirement table per page
+
+    Columns are ID, Description and Priority; IDs look like SBIOS-PWR-001
+    so pdf_extract's default --id-pattern matches them.
+
+    Returns:
+        int: Number of requirement rows written
+    """
+    rng = random.Random(seed)
+    columns = [(50, 170), (170, 480), (480, 562)]
+    row_height = 48
+    offsets = []
+    objects = []  # (object id, bytes)
+    page_ids = []
+    next_id = 4  # 1 catalog, 2 page tree, 3 font
+    requirement = 0
+
+    for _ in range(pages):
+        top = 742
+        lines = ['0.5 w']
+        texts = []
+        table_rows = [('ID', 'Description', 'Priority')]
+        for _ in range(rows_per_page):
+            requirement += 1
+            table_rows.append((f"SBIOS-{rng.choice(AREAS)}-{requirement:03d}",
+                               sentence(rng, rng.randint(4, 7)), rng.choice(['P0', 'P1', 'P2'])))
+        bottom = top - row_height * len(table_rows)
+        for row_index, row in enumerate(table_rows):
+            y = top - row_height * row_index
+            lines.append(f'{columns[0][0]} {y} m {columns[-1][1]} {y} l S')
+            for (left, _), cell in zip(columns, row):
+                texts.append(f'BT /F1 9 Tf {left + 4} {y - 16} Td {pdf_string(cell)} Tj ET')
+        lines.append(f'{columns[0][0]} {bottom} m {columns[-1][1]} {bottom} l S')
+        for left, _ in columns:
+            lines.append(f'{left} {top} m {left} {bottom} l S')
+        lines.append(f'{columns[-1][1]} {top} m {columns[-1][1]} {bottom} l S')
+
+        content = '\n'.join(lines + texts).encode('latin-1')
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        objects.append((content_id, b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream'))
+        objects.append((page_id, (f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                                  f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>').encode('ascii')))
+        page_ids.append(page_id)
+
+    kids = ' '.join(f'{page_id} 0 R' for page_id in page_ids)
+    objects = [(1, b'<< /Type /Catalog /Pages 2 0 R >>'),
+               (2, f'<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>'.encode('ascii')),
+               (3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')] + objects
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.4\n')
+        for object_id, body in objects:
+            offsets.append(f.tell())
+            f.write(b'%d 0 obj\n' % object_id + body + b'\nendobj\n')
+        xref = f.tell()
+        f.write(f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('ascii'))
+        for offset in offsets:
+            f.write(f'{offset:010d} 00000 n \n'.encode('ascii'))
+        f.write(f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('ascii'))
+    return requirement
+
+
+def fake_ocr(image_path, lang='eng', config=''):
+    """
+    Stand-in OCR backend: decodes the image and returns fixed-size text
+
+    Only the decode and the pipeline around OCR (cache, worker dispatch)
+    are measured; used when tesseract is not installed.
+    """
+    with Image.open(image_path) as img:
+        pixels = np.asarray(img.convert('L'))
+    dark_rows = int((pixels < 128).any(axis=1).sum())
+    return f"{os.path.basename(image_path)} {dark_rows} dark rows\n" + 'SBIOS-PWR-001: Placeholder text.\n' * 40
@@ -1,32 +1,25 @@
-from PIL import Image
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-import os
+import img_2_pdf
+from page_files import list_page_images
 
 def images_to_pdf(image_paths, output_pdf):
     """
     Converts a list of image paths to a single PDF file.
 
+    Pages are letter sized with the image scaled to fit, written by the
+    streaming assembler in img_2_pdf.
+
     Args:
         image_paths: A list of strings, where each string is the path to an image.
         output_pdf: The path where the output PDF should be saved.
     """
-    c = canvas.Canvas(output_pdf, pagesize=letter)
-    for image_path in image_paths:
-        try:
-            img = Image.open(image_path)
-            img_width, img_height = img.size
-            c.drawImage(image_path, 0, 0, width=img_width, height=img_height)
-            c.showPage()
-        except Exception as e:
-            print(f"Could not process image {image_path}: {e}")
-    c.save()
+    img_2_pdf.images_to_pdf(image_paths, output_pdf, page_size='letter', fit='contain', verbose=False)
 
 if __name__ == '__main__':
     image_dir = "rr/"
     output_pdf = "output.pdf"
-    
-    image_files = [os.path.join(image_dir, f) for f in os.listdir(image_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif'))]
-    
+
+    # Natural sort so img2 comes before img10
+    image_files = list_page_images(image_dir)
+
     images_to_pdf(image_files, output_pdf)
-    print(f"PDF created at: {output_pdf}")
\ No newline at end of file
+    print(f"PDF created at: {output_pdf}")
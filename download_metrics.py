@@ -0,0 +1,276 @@
+"""
+Per-patent and per-phase metrics for the patent downloader
+
+Phases timed (seconds):
+    rate_wait       blocked in the per-host rate limiter (what the fixed delay used to be)
+    retry_wait      backoff sleeps before a retried request
+    page_fetch      patent page request and body download
+    parse           HTML parsing of the patent page
+    pdf_transfer    PDF response streaming, excluding disk writes
+    disk_write      writing PDF chunks, info files and catalog rows
+    verify          PDF header/trailer/size verification
+
+Every finished patent is emitted as one JSON line with its phase times,
+bytes and outcome; counters cover skips, bytes and failures by HTTP
+status. The same numbers can be written as a Prometheus textfile for the
+node_exporter textfile collector.
+
+Latencies are kept as log-spaced histograms rather than every sample, so
+memory stays constant over long batches; percentiles, in the summary and
+the textfile, are read from the buckets.
+"""
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PHASES = ['rate_wait', 'retry_wait', 'page_fetch', 'parse', 'pdf_transfer', 'disk_write', 'verify']
+QUANTILES = [0.5, 0.9, 0.99]
+PROMETHEUS_PREFIX = 'patent_downloader'
+
+
+BUCKET_BASE = 1e-6  # Upper bound of the smallest latency bucket, seconds
+BUCKETS_PER_DOUBLING = 8  # Percentiles read from the buckets are within 2 ** (1 / 8), about 9%, of the exact value
+
+
+class LatencyHistogram:
+    def __init__(self):
+        """
+        Running count, sum and max plus log-spaced buckets, so memory stays
+        constant however many samples a run observes
+        """
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = {}  # Bucket index -> samples, a few hundred indexes cover microseconds to hours
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        index = 0 if seconds <= BUCKET_BASE else math.ceil(math.log2(seconds / BUCKET_BASE) * BUCKETS_PER_DOUBLING)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def percentile(self, q):
+        """
+        Nearest-rank percentile, as the upper bound of the bucket holding that rank
+
+        Returns:
+            float: The value, capped at the largest sample, 0.0 without samples
+        """
+        if not self.count:
+            return 0.0
+        rank = min(self.count, max(1, math.ceil(q * self.count)))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(BUCKET_BASE * 2 ** (index / BUCKETS_PER_DOUBLING), self.max)
+        return self.max
+
+    def describe(self):
+        stats = {'count': self.count, 'total': self.total}
+        for q in QUANTILES:
+            stats[f'p{int(q * 100)}'] = self.percentile(q)
+        stats['max'] = self.max
+        return stats
+
+
+class DownloadMetrics:
+    def __init__(self, jsonl_path=None, prometheus_path=None, prometheus_interval=15):
+        """
+        Collect downloader metrics, optionally streaming them to files
+
+        Args:
+            jsonl_path (str): JSON lines file, one event per finished patent plus a final summary
+            prometheus_path (str): Prometheus textfile, rewritten atomically
+            prometheus_interval (float): Seconds between textfile rewrites during a run
+        """
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.prometheus_interval = prometheus_interval
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started = time.time()
+        self.last_prometheus = time.monotonic()
+        self.phase_times = {phase: LatencyHistogram() for phase in PHASES}
+        self.patent_times = LatencyHistogram()
+        self.counters = {}
+        self.failures = {}  # HTTP status (or error name) -> count
+        self.outcomes = {}
+        self.jsonl = None
+        if jsonl_path:
+            directory = os.path.dirname(jsonl_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.jsonl = open(jsonl_path, 'a', encoding='utf-8')
+
+    def emit(self, event):
+        if self.jsonl:
+            self.jsonl.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+    @contextmanager
+    def patent(self, patent_number):
+        """
+        Attribute the phases timed in this thread to one patent until the block exits
+
+        The block can set record['outcome'] ('downloaded', 'cached', 'failed', ...).
+        """
+        record = {'patent_number': patent_number, 'phases': {}, 'bytes': 0, 'outcome': 'failed'}
+        self.local.record = record
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.local.record = None
+            seconds = time.perf_counter() - start
+            with self.lock:
+                self.patent_times.add(seconds)
+                self.outcomes[record['outcome']] = self.outcomes.get(record['outcome'], 0) + 1
+                self.emit({'event': 'patent', 'time': time.time(), 'seconds': round(seconds, 6),
+                           **record, 'phases': {phase: round(value, 6) for phase, value in record['phases'].items()}})
+            self.maybe_write_prometheus()
+
+    def current(self):
+        return getattr(self.local, 'record', None)
+
+    def observe(self, phase, seconds):
+        """
+        Add time spent in a phase, to the totals and to the current patent
+        """
+        record = self.current()
+        if record is not None:
+            record['phases'][phase] = record['phases'].get(phase, 0.0) + seconds
+        with self.lock:
+            self.phase_times[phase].add(seconds)
+
+    @contextmanager
+    def phase(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start)
+
+    def count(self, name, value=1):
+        """
+        Increment a counter, e.g. 'pdf_skipped_existing' or 'pdf_bytes'
+        """
+        if name.endswith('_bytes'):
+            record = self.current()
+            if record is not None:
+                record['bytes'] += value
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def failure(self, status):
+        """
+        Count a failed request by HTTP status code, or by exception name when there is no response
+        """
+        with self.lock:
+            self.failures[str(status)] = self.failures.get(str(status), 0) + 1
+
+    def summary(self):
+        """
+        Latency percentiles and totals for the run so far
+
+        Returns:
+            dict: phases -> {count, total, p50, p90, p99, max}, plus patent latency, counters, failures and throughput
+        """
+        with self.lock:
+            elapsed = max(time.time() - self.started, 1e-9)
+            transferred = sum(value for name, value in self.counters.items() if name.endswith('_bytes'))
+            return {
+                'elapsed': elapsed,
+                'patents': self.patent_times.describe(),
+                'phases': {phase: histogram.describe() for phase, histogram in self.phase_times.items() if histogram.count},
+                'counters': dict(self.counters),
+                'failures': dict(self.failures),
+                'outcomes': dict(self.outcomes),
+                'patents_per_second': self.patent_times.count / elapsed,
+                'bytes_per_second': transferred / elapsed,
+            }
+
+    def maybe_write_prometheus(self):
+        if not self.prometheus_path:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_prometheus < self.prometheus_interval:
+                return
+            self.last_prometheus = now
+        self.write_prometheus()
+
+    def write_prometheus(self):
+        """
+        Rewrite the Prometheus textfile (written to a temp file and renamed, as the collector expects)
+        """
+        if not self.prometheus_path:
+            return
+        summary = self.summary()
+        p = PROMETHEUS_PREFIX
+        lines = [f'# HELP {p}_phase_seconds Time spent per download phase',
+                 f'# TYPE {p}_phase_seconds summary']
+        for phase, stats in summary['phases'].items():
+            for q in QUANTILES:
+                lines.append(f'{p}_phase_seconds{{phase="{phase}",quantile="{q}"}} {stats[f"p{int(q * 100)}"]:.6f}')
+            lines.append(f'{p}_phase_seconds_sum{{phase="{phase}"}} {stats["total"]:.6f}')
+            lines.append(f'{p}_phase_seconds_count{{phase="{phase}"}} {stats["count"]}')
+        lines += [f'# HELP {p}_patent_seconds End-to-end time per patent',
+                  f'# TYPE {p}_patent_seconds summary']
+        for q in QUANTILES:
+            lines.append(f'{p}_patent_seconds{{quantile="{q}"}} {summary["patents"][f"p{int(q * 100)}"]:.6f}')
+        lines.append(f'{p}_patent_seconds_sum {summary["patents"]["total"]:.6f}')
+        lines.append(f'{p}_patent_seconds_count {summary["patents"]["count"]}')
+        lines += [f'# HELP {p}_patents_total Patents finished by outcome', f'# TYPE {p}_patents_total counter']
+        for outcome, value in sorted(summary['outcomes'].items()):
+            lines.append(f'{p}_patents_total{{outcome="{outcome}"}} {value}')
+        lines += [f'# HELP {p}_failures_total Failed requests by HTTP status', f'# TYPE {p}_failures_total counter']
+        for status, value in sorted(summary['failures'].items()):
+            lines.append(f'{p}_failures_total{{status="{status}"}} {value}')
+        for name, value in sorted(summary['counters'].items()):
+            lines += [f'# TYPE {p}_{name}_total counter', f'{p}_{name}_total {value}']
+
+        directory = os.path.dirname(self.prometheus_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.prometheus_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.prometheus_path)
+
+    def format_summary(self):
+        """
+        Human-readable end-of-run summary
+
+        Returns:
+            str: Multi-line table of phase percentiles, throughput and counters
+        """
+        summary = self.summary()
+        lines = [f"{'phase':<14} {'count':>7} {'total s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+        rows = [(phase, summary['phases'][phase]) for phase in PHASES if phase in summary['phases']]
+        rows.append(('patent', summary['patents']))
+        for name, stats in rows:
+            lines.append(f"{name:<14} {stats['count']:>7} {stats['total']:>9.2f} {stats['p50'] * 1000:>9.1f} "
+                         f"{stats['p90'] * 1000:>9.1f} {stats['p99'] * 1000:>9.1f} {stats['max'] * 1000:>9.1f}")
+        lines.append(f"Throughput: {summary['patents_per_second']:.2f} patents/s, "
+                     f"{summary['bytes_per_second'] / 1e6:.2f} MB/s over {summary['elapsed']:.1f}s")
+        if summary['outcomes']:
+            lines.append('Outcomes: ' + ', '.join(f'{k}={v}' for k, v in sorted(summary['outcomes'].items())))
+        if summary['counters']:
+            lines.append('Counters: ' + ', '.join(f'{k}={v}' for k, v in sorted(summary['counters'].items())))
+        if summary['failures']:
+            lines.append('Failures by status: ' + ', '.join(f'{k}={v}' for k, v in sorted(summary['failures'].items())))
+        return '\n'.join(lines)
+
+    def close(self):
+        """
+        Write the final summary event and Prometheus textfile
+        """
+        if self.jsonl:
+            self.emit({'event': 'summary', 'time': time.time(), **self.summary()})
+            self.jsonl.close()
+            self.jsonl = None
+        self.write_prometheus()
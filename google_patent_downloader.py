@@ -1,26 +1,76 @@
 import requests
-from bs4 import BeautifulSoup
+import logging
 import os
 import time
 import re
 from urllib.parse import urljoin
 import argparse
 import sys
-import csv
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from http_client import HostRateLimiter, PooledSession
+from pdf_verify import classify_pdf, verify_pdf_file, STATUS_OK
+from patent_parser import extract_patent_page, available_backends, default_backend, RELATIONS
+from patent_catalog import PatentCatalog, parse_info_text, file_sha256
+from patent_input import iter_patent_numbers, read_lines, parse_shard, DEDUPE_MODES
+from patent_report import ReportWriter, COLUMNS, DEFAULT_COLUMNS, FORMATS, default_report_path
+from download_metrics import DownloadMetrics
+from http_cache import HttpCache, DEFAULT_CACHE_DIR
+from patent_crawler import CrawlFrontier, DEFAULT_FRONTIER, crawl
+from work_queue import WorkQueue, DEFAULT_QUEUE, drain
+from patent_store import FlatStore, open_store, STORES
+
+logger = logging.getLogger('patent_downloader')
 
 class GooglePatentDownloader:
-    def __init__(self):
+    def __init__(self, rate_limiter=None,
+                 base_url="https://patents.google.com/patent/",
+                 pdf_base_url="https://patentimages.storage.googleapis.com/pdfs/",
+                 pool_size=10, max_retries=3, parser_backend=None, resume_attempts=3,
+                 catalog=None, report=None, metrics=None, http_cache=None, frontier=None, store=None):
         self.headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
-        self.base_url = "https://patents.google.com/patent/"
-        self.downloaded_patents = []  # Store downloaded patent information
+        self.base_url = base_url
+        self.pdf_base_url = pdf_base_url
+        self.parser_backend = parser_backend or default_backend()
+        self.resume_attempts = resume_attempts  # Range resumes after a PDF transfer breaks
+        self.catalog = catalog  # PatentCatalog replacing _info.txt files and stat checks, optional
+        self.metrics = metrics or DownloadMetrics()  # Phase timings, byte and failure counters
+        # One pooled keep-alive session shared by every worker thread
+        self.session = PooledSession(
+            headers=self.headers,
+            rate_limiter=rate_limiter or HostRateLimiter(),
+            pool_size=pool_size,
+            max_retries=max_retries,
+            metrics=self.metrics,
+            cache=http_cache,  # HttpCache answering repeat page and PDF requests from disk, optional
+        )
+        self.frontier = frontier  # CrawlFrontier receiving the links of every parsed page, optional
+        self.store = store or FlatStore('patents')  # Where PDFs are kept, see patent_store
+        self.report = report  # Summary report written as each patent completes, opened on first use if None
+        self.reported = 0
+        self.page_fetches_saved = 0  # Page requests avoided by reusing a parsed page
+        self.stats_lock = threading.Lock()
     
         # Create directories if they don't exist
         for directory in ['patents', 'reports']:
             if not os.path.exists(directory):
-                os.makedirs(directory)
+                os.makedirs(directory, exist_ok=True)
+
+    def get(self, url, **kwargs):
+        """
+        Issue a GET request through the shared pooled session
+
+        Args:
+            url (str): URL to request
+            **kwargs: Extra arguments passed to PooledSession.get
+
+        Returns:
+            requests.Response: The response
+        """
+        return self.session.get(url, **kwargs)
     
     def check_existing_files(self, patent_number):
         """
@@ -31,22 +81,26 @@ class GooglePatentDownloader:
         Returns:
             tuple: (bool, bool) - (pdf_exists, info_exists)
         """
-        pdf_path = os.path.join('patents', f"{patent_number}.pdf")
+        if self.catalog:
+            # The catalog records verified PDFs and saved info, no file system checks needed
+            return self.catalog.state(patent_number)
+        
         info_path = os.path.join('patents', f"{patent_number}_info.txt")
         
-        pdf_exists = os.path.exists(pdf_path)
+        # One index query for a content-addressed store, a stat for the flat directory
+        pdf_exists = self.store.exists(patent_number)
         info_exists = os.path.exists(info_path)
         
-        if pdf_exists:
-            # Verify PDF file is not empty or corrupted
-            try:
-                file_size = os.path.getsize(pdf_path)
-                if file_size < 1024:  # If file is smaller than 1KB, consider it invalid
-                    pdf_exists = False
-                    os.remove(pdf_path)  # Remove invalid file
-                    print(f"Removed invalid PDF file: {pdf_path}")
-            except OSError:
+        if pdf_exists and not self.store.content_addressed:
+            # Verify PDF file is not empty, an HTML page, truncated or corrupted. The check
+            # leaves the file alone: a new download replaces it only once it verifies
+            # (a content-addressed store only ever holds verified PDFs)
+            pdf_path = self.store.path(patent_number)
+            status, _, reason = classify_pdf(pdf_path, count_pages=False)
+            if status != STATUS_OK:
                 pdf_exists = False
+                self.metrics.count('pdf_invalid_existing')
+                logger.warning(f"Existing PDF file is {status} ({reason}), will download again: {pdf_path}")
         
         return pdf_exists, info_exists
     
@@ -60,49 +114,65 @@ class GooglePatentDownloader:
         Returns:
             dict: Patent information if exists, None otherwise
         """
+        if self.catalog:
+            return self.catalog.get(patent_number)
+        
         info_path = os.path.join('patents', f"{patent_number}_info.txt")
         try:
-            patent_info = {'patent_number': patent_number}
             with open(info_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                
-                # 使用更安全的方式提取信息
-                def extract_field(pattern, default='N/A'):
-                    match = re.search(pattern, content)
-                    return match.group(1) if match else default
-                
-                # 提取各个字段
-                patent_info['title'] = extract_field(r'Title: (.+)')
-                patent_info['filing_date'] = extract_field(r'Filing Date: (.+)')
-                patent_info['publication_date'] = extract_field(r'Publication Date: (.+)')
-                
-                # 处理发明人
-                inventors_match = re.search(r'Inventors: (.+)', content)
-                patent_info['inventors'] = (
-                    inventors_match.group(1).split(', ') if inventors_match 
-                    else []
-                )
-                
-                # 处理摘要 - 使用更宽松的模式
-                abstract_match = re.search(r'Abstract:\n([\s\S]+)$', content)
-                patent_info['abstract'] = (
-                    abstract_match.group(1).strip() if abstract_match 
-                    else 'N/A'
-                )
-                
-                return patent_info
+                return parse_info_text(f.read(), patent_number)
                 
         except Exception as e:
-            print(f"Error reading existing info file for {patent_number}: {str(e)}")
-            print("Will download fresh information.")
+            logger.warning(f"Error reading existing info file for {patent_number}: {str(e)}")
+            logger.warning("Will download fresh information.")
             return None
     
-    def download_pdf(self, patent_number):
+    def fetch_patent_page(self, patent_number):
+        """
+        Fetch and parse the patent page once, extracting metadata and PDF link
+        
+        Args:
+            patent_number (str): The patent number
+        
+        Returns:
+            tuple: (dict, str) - (patent_info, pdf_url)
+        
+        Raises:
+            requests.RequestException: If the page cannot be fetched
+        """
+        url = urljoin(self.base_url, patent_number)
+        start = time.perf_counter()
+        response = self.get(url)
+        response.raise_for_status()
+        content = response.content
+        # Rate limit waits are timed separately by the session
+        self.metrics.observe('page_fetch', time.perf_counter() - start - self.session.last_wait())
+        self.metrics.count('page_bytes', len(content))
+        
+        # Extract patent information and PDF link in a single walk of the page
+        with self.metrics.phase('parse'):
+            page = extract_patent_page(content, self.parser_backend)
+        pdf_href = page.pop('pdf_href')
+        links = page.pop('links')
+        if self.frontier is not None:
+            self.frontier.add_links(patent_number, links)
+        patent_info = {'patent_number': patent_number, **page}
+        
+        if not pdf_href:
+            # Try alternative method - direct PDF URL construction
+            pdf_url = urljoin(self.pdf_base_url, f"{patent_number}.pdf")
+        else:
+            pdf_url = urljoin(url, pdf_href)
+        
+        return patent_info, pdf_url
+
+    def download_pdf(self, patent_number, pdf_url=None):
         """
         Download PDF version of the patent
         
         Args:
             patent_number (str): The patent number
+            pdf_url (str): PDF link from an already parsed page, fetched if None
         
         Returns:
             bool: True if download successful, False otherwise
@@ -110,55 +180,122 @@ class GooglePatentDownloader:
         # Check if PDF already exists
         pdf_exists, _ = self.check_existing_files(patent_number)
         if pdf_exists:
-            print(f">>>> PDF for patent {patent_number} already exists, skipping download.")
+            self.metrics.count('pdf_skipped_existing')
+            logger.info(f">>>> PDF for patent {patent_number} already exists, skipping download.")
             return True
             
         try:
-            # First get the patent page
-            url = urljoin(self.base_url, patent_number)
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
+            # Get the patent page only if the caller has not parsed it already
+            if pdf_url is None:
+                _, pdf_url = self.fetch_patent_page(patent_number)
             
-            # Find PDF link
-            soup = BeautifulSoup(response.content, 'html.parser')
-            pdf_link = soup.find('a', {'href': re.compile(r'.*\.pdf$')})
+            part_path = self.store.staging_path(patent_number)
+            pdf_path = self.store.path(patent_number) if not self.store.content_addressed else None
+            if (not os.path.exists(part_path) and pdf_path
+                    and classify_pdf(pdf_path, count_pages=False)[0] == 'truncated'):
+                # Keep the bytes of a truncated PDF so the download resumes from them
+                os.replace(pdf_path, part_path)
+                self.metrics.count('pdf_truncated_resumed')
             
-            if not pdf_link:
-                # Try alternative method - direct PDF URL construction
-                pdf_url = f"https://patentimages.storage.googleapis.com/pdfs/{patent_number}.pdf"
-            else:
-                pdf_url = urljoin(url, pdf_link['href'])
-            
-            # Download PDF
-            pdf_response = requests.get(pdf_url, headers=self.headers, stream=True)
-            pdf_response.raise_for_status()
-            
-            pdf_path = os.path.join('patents', f"{patent_number}.pdf")
+            # Download PDF into a partial file, resuming with Range requests if the transfer breaks
+            logger.info(f"Downloading PDF for {patent_number}...")
+            for attempt in range(self.resume_attempts + 1):
+                try:
+                    expected_size = self.stream_pdf(pdf_url, part_path)
+                    break
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                    if attempt >= self.resume_attempts:
+                        raise
+                    self.metrics.count('pdf_resumes')
+                    logger.warning(f"Download of {patent_number} interrupted ({str(e)}), resuming...")
             
-            # Save PDF file
-            total_size = int(pdf_response.headers.get('content-length', 0))
-            block_size = 8192
-            downloaded = 0
-            
-            print(f"Downloading PDF for {patent_number}...")
-            with open(pdf_path, 'wb') as pdf_file:
-                for chunk in pdf_response.iter_content(chunk_size=block_size):
-                    if chunk:
-                        pdf_file.write(chunk)
-                        downloaded += len(chunk)
-                        # Show download progress
-                        if total_size > 0:
-                            percent = (downloaded / total_size) * 100
-                            sys.stdout.write(f"\rProgress: {percent:.1f}%")
-                            sys.stdout.flush()
+            # Only a verified, complete PDF is moved into place
+            with self.metrics.phase('verify'):
+                valid, reason = verify_pdf_file(part_path, expected_size)
+            if not valid:
+                self.metrics.failure('verification')
+                logger.error(f"Downloaded PDF for {patent_number} failed verification: {reason}")
+                if expected_size is None or os.path.getsize(part_path) >= expected_size:
+                    os.remove(part_path)  # Complete but corrupt, start over next time
+                if self.catalog:
+                    self.catalog.mark_pdf_failed(patent_number, reason, pdf_url)
+                return False
             
-            print(f"\nPDF successfully downloaded to: {pdf_path}")
+            pdf_size = os.path.getsize(part_path)
+            sha256 = file_sha256(part_path) if self.catalog or self.store.content_addressed else None
+            with self.metrics.phase('disk_write'):
+                pdf_path = self.store.put(patent_number, part_path, sha256)
+            if self.catalog:
+                self.catalog.mark_pdf_done(patent_number, pdf_size, sha256, pdf_url)
+            self.metrics.count('pdf_downloaded')
+            logger.info(f"PDF successfully downloaded to: {pdf_path}")
             return True
             
         except requests.RequestException as e:
-            print(f"Error downloading PDF for patent {patent_number}: {str(e)}")
+            logger.error(f"Error downloading PDF for patent {patent_number}: {str(e)}")
+            if self.catalog:
+                self.catalog.mark_pdf_failed(patent_number, str(e), pdf_url)
             return False
 
+    def stream_pdf(self, pdf_url, part_path):
+        """
+        Stream a PDF into a partial file, continuing from its current size
+        
+        Args:
+            pdf_url (str): URL of the PDF
+            part_path (str): Partial file to create or append to
+        
+        Returns:
+            int: Total size of the PDF announced by the server, None if unknown
+        """
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        pdf_response = self.get(pdf_url, stream=True, headers=headers)
+        # Closing also returns the connection and drops the cache spool file of a broken transfer
+        with pdf_response:
+            if offset and pdf_response.status_code == 416:
+                # Nothing left to fetch, the partial file already holds the whole PDF
+                return None
+            pdf_response.raise_for_status()
+
+            if offset and pdf_response.status_code == 206:
+                # Content-Range: bytes <start>-<end>/<total>
+                match = re.search(r'/(\d+)$', pdf_response.headers.get('content-range', ''))
+                total_size = int(match.group(1)) if match else None
+                mode = 'ab'
+            else:
+                # Server ignored the Range header, start from byte zero
+                offset = 0
+                content_length = int(pdf_response.headers.get('content-length', 0))
+                # A content-encoded body is decoded while streaming, so its length can't be checked
+                total_size = content_length if content_length and 'content-encoding' not in pdf_response.headers else None
+                mode = 'wb'
+
+            block_size = 8192
+            downloaded = offset
+            write_seconds = 0.0
+            next_progress = 10
+            start = time.perf_counter()
+            try:
+                with open(part_path, mode) as pdf_file:
+                    for chunk in pdf_response.iter_content(chunk_size=block_size):
+                        if chunk:
+                            write_start = time.perf_counter()
+                            pdf_file.write(chunk)
+                            write_seconds += time.perf_counter() - write_start
+                            downloaded += len(chunk)
+                            # Log progress every 10%, only visible with --log-level DEBUG
+                            if total_size and downloaded * 100 >= next_progress * total_size:
+                                logger.debug(f"{os.path.basename(part_path)} progress: {downloaded * 100 / total_size:.1f}%")
+                                next_progress = downloaded * 100 // total_size + 10
+            finally:
+                # Bytes and time of an interrupted transfer still count
+                self.metrics.observe('pdf_transfer', time.perf_counter() - start - write_seconds)
+                self.metrics.observe('disk_write', write_seconds)
+                self.metrics.count('pdf_bytes', downloaded - offset)
+        
+        return total_size
+
     def download_patent_info(self, patent_number):
         """
         Download patent information from Google Patents
@@ -169,56 +306,49 @@ class GooglePatentDownloader:
         Returns:
             dict: Patent information including title, abstract, and other details
         """
-        # Check if files already exist
-        pdf_exists, info_exists = self.check_existing_files(patent_number)
-        
-        # If both files exist, try to read existing info
-        if pdf_exists and info_exists:
-            print(f"Patent {patent_number} files found, attempting to read existing information...")
-            patent_info = self.read_existing_info(patent_number)
-            if patent_info:
-                print(f"Successfully read existing information for patent {patent_number}")
-                self.downloaded_patents.append(patent_info)
-                return patent_info
-            else:
-                print(f"Could not read existing information for patent {patent_number}, will download fresh data")
-        
-        url = urljoin(self.base_url, patent_number)
-        
-        try:
-            print(f"Fetching information for patent {patent_number}...")
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            
-            # Parse the HTML content
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Extract patent information
-            patent_info = {
-                'patent_number': patent_number,
-                'title': soup.find('span', {'itemprop': 'title'}).text.strip() if soup.find('span', {'itemprop': 'title'}) else 'N/A',
-                'abstract': soup.find('div', {'class': 'abstract'}).text.strip() if soup.find('div', {'class': 'abstract'}) else 'N/A',
-                'inventors': [inv.text.strip() for inv in soup.find_all('span', {'itemprop': 'inventor'})],
-                'filing_date': soup.find('time', {'itemprop': 'filingDate'}).text if soup.find('time', {'itemprop': 'filingDate'}) else 'N/A',
-                'publication_date': soup.find('time', {'itemprop': 'publicationDate'}).text if soup.find('time', {'itemprop': 'publicationDate'}) else 'N/A',
-            }
+        # Every phase timed inside this block is attributed to the patent
+        with self.metrics.patent(patent_number) as record:
+            # Check if files already exist
+            pdf_exists, info_exists = self.check_existing_files(patent_number)
             
-            # Add to downloaded patents list
-            self.downloaded_patents.append(patent_info)
+            # If both files exist, try to read existing info
+            if pdf_exists and info_exists:
+                logger.info(f"Patent {patent_number} files found, attempting to read existing information...")
+                patent_info = self.read_existing_info(patent_number)
+                if patent_info:
+                    self.metrics.count('patents_skipped_existing')
+                    logger.info(f"Successfully read existing information for patent {patent_number}")
+                    self.add_to_report(patent_info)
+                    record['outcome'] = 'cached'
+                    return patent_info
+                else:
+                    logger.warning(f"Could not read existing information for patent {patent_number}, will download fresh data")
+            elif info_exists:
+                self.metrics.count('info_skipped_existing')
             
-            # Save metadata to file if it doesn't exist
-            if not info_exists:
-                self.save_patent_info(patent_info)
-            
-            # Download PDF if it doesn't exist
-            if not pdf_exists:
-                self.download_pdf(patent_number)
-            
-            return patent_info
-            
-        except requests.RequestException as e:
-            print(f"Error downloading patent {patent_number}: {str(e)}")
-            return None
+            try:
+                logger.info(f"Fetching information for patent {patent_number}...")
+                patent_info, pdf_url = self.fetch_patent_page(patent_number)
+                
+                # Save metadata to file if it doesn't exist
+                if not info_exists:
+                    self.save_patent_info(patent_info)
+                
+                # Download PDF if it doesn't exist, reusing the PDF link from this page
+                record['outcome'] = 'downloaded'
+                if not pdf_exists:
+                    with self.stats_lock:
+                        self.page_fetches_saved += 1
+                    if not self.download_pdf(patent_number, pdf_url=pdf_url):
+                        record['outcome'] = 'pdf_failed'
+                
+                # Add to summary report, after the PDF so its stored location is known
+                self.add_to_report(patent_info)
+                return patent_info
+                
+            except requests.RequestException as e:
+                logger.error(f"Error downloading patent {patent_number}: {str(e)}")
+                return None
 
     def save_patent_info(self, patent_info):
         """
@@ -227,9 +357,15 @@ class GooglePatentDownloader:
         Args:
             patent_info (dict): Patent information to save
         """
+        if self.catalog:
+            with self.metrics.phase('disk_write'):
+                self.catalog.save_info(patent_info)
+            logger.info(f"Patent information saved to catalog: {patent_info['patent_number']}")
+            return
+        
         filename = f"patents/{patent_info['patent_number']}_info.txt"
         
-        with open(filename, 'w', encoding='utf-8') as f:
+        with self.metrics.phase('disk_write'), open(filename, 'w', encoding='utf-8') as f:
             f.write(f"Patent Number: {patent_info['patent_number']}\n")
             f.write(f"Title: {patent_info['title']}\n")
             f.write(f"Filing Date: {patent_info['filing_date']}\n")
@@ -237,35 +373,117 @@ class GooglePatentDownloader:
             f.write(f"Inventors: {', '.join(patent_info['inventors'])}\n")
             f.write(f"\nAbstract:\n{patent_info['abstract']}\n")
         
-        print(f"Patent information saved to: {filename}")
-    def generate_summary_report(self):
+        logger.info(f"Patent information saved to: {filename}")
+
+    def download_batch(self, patent_numbers, workers=1, chunk_size=500):
         """
-        Generate a summary report of downloaded patents
+        Download patents using a bounded thread pool
+
+        Requests are paced by the per-host rate limiter rather than a fixed
+        sleep, so throughput grows with workers until the rate limit is hit.
+        The input is consumed lazily in chunks with at most 2 * workers
+        patents in flight, so a generator of any length uses flat memory.
+
+        Args:
+            patent_numbers (iterable): Patent numbers to download, may be a generator
+            workers (int): Number of patents processed concurrently
+            chunk_size (int): Patent numbers read (and checked against the catalog) at a time
+
+        Returns:
+            tuple: (int, int) - (succeeded, failed)
         """
-        if not self.downloaded_patents:
-            print("No patents were downloaded.")
-            return
+        workers = max(1, workers)
+        counts = {'processed': 0, 'succeeded': 0, 'failed': 0}
+
+        def handle(future, patent_number):
+            try:
+                patent_info = future.result()
+            except Exception as e:
+                logger.error(f"Error processing patent {patent_number}: {str(e)}")
+                patent_info = None
+
+            counts['processed'] += 1
+            logger.info(f"Processed patent {counts['processed']}")
+            if patent_info:
+                counts['succeeded'] += 1
+                logger.info(f"Successfully processed patent: {patent_info['title']}")
+                logger.debug(f"Files in patents/ directory:")
+                logger.debug(f"- {patent_number}.pdf")
+                if not self.catalog:
+                    logger.debug(f"- {patent_number}_info.txt")
+            else:
+                counts['failed'] += 1
+
+        patent_numbers = iter(patent_numbers)
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                chunk = list(islice(patent_numbers, chunk_size))
+                if not chunk:
+                    break
+
+                if self.catalog:
+                    # One bulk query settles every patent in the chunk that is already complete
+                    known = self.catalog.get_many(self.catalog.done_numbers(chunk))
+                    for patent_number in chunk:
+                        if patent_number in known:
+                            self.add_to_report(known[patent_number])
+                            counts['succeeded'] += 1
+                    if known:
+                        self.metrics.count('patents_skipped_catalog', len(known))
+                        logger.info(f"{len(known)} of {len(chunk)} patents already complete in catalog")
+                    chunk = [patent_number for patent_number in chunk if patent_number not in known]
+
+                for patent_number in chunk:
+                    if len(in_flight) >= 2 * workers:
+                        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            handle(future, in_flight.pop(future))
+                    in_flight[executor.submit(self.download_patent_info, patent_number)] = patent_number
+
+            for future in list(in_flight):
+                handle(future, in_flight.pop(future))
 
-        # Generate report filename with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        report_file = f'reports/patent_summary_{timestamp}.csv'
-        report_file = f'reports/patent_summary.csv'
+        return counts['succeeded'], counts['failed']
+
+    def add_to_report(self, patent_info):
+        """
+        Write a completed patent to the summary report
         
-        # Write CSV report
-        with open(report_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            # Write header
-            writer.writerow(['Patent Number', 'Publication Date', 'Abstract'])
-            
-            # Write patent information
-            for patent in self.downloaded_patents:
-                writer.writerow([
-                    patent['patent_number'],
-                    patent['publication_date'],
-                    patent['abstract'].replace('\n', ' ')  # Remove newlines from abstract
-                ])
+        Args:
+            patent_info (dict): Patent information
+        """
+        with self.stats_lock:
+            # Opening a report reads it and may move it aside, so only do that once something is reported
+            if self.report is None:
+                self.report = ReportWriter()
+            self.reported += 1
+        if 'pdf_path' in self.report.columns:
+            patent_info = dict(patent_info, pdf_path=self.store.location(patent_info['patent_number']))
+        self.report.write(patent_info)
+
+    def generate_summary_report(self):
+        """
+        Flush and close the summary report of downloaded patents
+        """
+        if self.report is not None:
+            self.report.close()
+        if not self.reported:
+            logger.info("No patents were downloaded.")
+            return
         
-        print(f"\nSummary report generated: {report_file}")
+        logger.info(f"Summary report generated: {self.report.path} "
+              f"({self.report.written} new rows, {self.reported} patents processed)")
+
+    def close(self):
+        """
+        Close the session, PDF store, metrics and report of a downloader used as a library
+        """
+        self.session.close()
+        self.store.close()
+        self.metrics.close()
+        if self.report is not None:
+            self.report.close()
 
 def read_patent_numbers_from_file(file_path):
     """
@@ -275,73 +493,189 @@ def read_patent_numbers_from_file(file_path):
         file_path (str): Path to the file containing patent numbers
     
     Returns:
-        list: List of patent numbers
+        list: List of normalized, deduplicated patent numbers
     """
-    patent_numbers = []
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                # Remove whitespace and skip empty lines
-                patent_number = line.strip()
-                if patent_number:
-                    patent_numbers.append(patent_number)
-        return patent_numbers
+        return list(iter_patent_numbers(read_lines(file_path)))
     except Exception as e:
-        print(f"Error reading patent numbers from file: {str(e)}")
+        logger.error(f"Error reading patent numbers from file: {str(e)}")
         return []
 
 def main():
+    # Set up argument parser
+    parser = argparse.ArgumentParser(description='Download patents from Google Patents')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--patents', nargs='+', help='One or more patent numbers to download')
+    group.add_argument('--file', type=str, help='Path to file containing patent numbers (one per line)')
+    parser.add_argument('--delay', type=float, default=2, help='Minimum seconds between requests to the same host (default: 2)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of patents downloaded concurrently (default: 1)')
+    parser.add_argument('--page-rate', type=float, help='Max requests per second to patents.google.com (overrides --delay)')
+    parser.add_argument('--pdf-rate', type=float, help='Max requests per second to patentimages.storage.googleapis.com (overrides --delay)')
+    parser.add_argument('--pool-size', type=int, help='Keep-alive connections per host (default: max(workers, 10))')
+    parser.add_argument('--retries', type=int, default=3, help='Retries for connection errors, 429 and 5xx responses (default: 3)')
+    parser.add_argument('--parser', choices=available_backends(), help=f'HTML parser backend (default: {default_backend()})')
+    parser.add_argument('--catalog', nargs='?', const='patents/catalog.db',
+                        help='Keep metadata and download state in a SQLite catalog instead of _info.txt files '
+                             '(default path: patents/catalog.db, import old files with patent_catalog.py import)')
+    parser.add_argument('--shard', type=parse_shard, help='Only process shard i of N (i/N, 0 <= i < N), for splitting one input across processes')
+    parser.add_argument('--dedupe', choices=DEDUPE_MODES, default='memory',
+                        help='How duplicate numbers are detected: in-memory set, on-disk SQLite set, bloom filter, or none (default: memory)')
+    parser.add_argument('--report', help='Summary report path (default: reports/patent_summary.<format>)')
+    parser.add_argument('--report-format', choices=FORMATS, default='csv', help='Summary report format (default: csv, parquet needs pyarrow)')
+    parser.add_argument('--report-columns', nargs='+', choices=list(COLUMNS), default=DEFAULT_COLUMNS,
+                        help=f"Summary report columns (default: {' '.join(DEFAULT_COLUMNS)})")
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO',
+                        help='Log verbosity, WARNING keeps high-concurrency runs quiet (default: INFO)')
+    parser.add_argument('--log-file', help='Write the log to this file instead of the terminal')
+    parser.add_argument('--metrics', nargs='?', const='reports/download_metrics.jsonl',
+                        help='Append per-patent metrics as JSON lines (default path: reports/download_metrics.jsonl)')
+    parser.add_argument('--prometheus', help='Prometheus textfile for the node_exporter textfile collector, rewritten during the run')
+    parser.add_argument('--http-cache', nargs='?', const=DEFAULT_CACHE_DIR,
+                        help=f'Record pages and PDFs in an on-disk HTTP cache and reuse them on reruns (default path: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--replay', nargs='?', const=DEFAULT_CACHE_DIR,
+                        help='Serve only responses recorded with --http-cache, never touching the network')
+    parser.add_argument('--replay-latency', type=float, default=0.0, help='Seconds added to every replayed response (default: 0)')
+    parser.add_argument('--cache-size', type=float, default=2048, help='HTTP cache size cap in MB, least recently used entries are evicted (default: 2048)')
+    parser.add_argument('--cache-max-age', type=float, default=86400,
+                        help='Seconds a cached response is used without revalidating it with ETag/Last-Modified (default: 86400)')
+    parser.add_argument('--crawl', nargs='?', const=DEFAULT_FRONTIER,
+                        help=f'Treat the input as seeds and also download their citations, cited-by and family members, '
+                             f'keeping the crawl frontier in SQLite (default path: {DEFAULT_FRONTIER})')
+    parser.add_argument('--crawl-depth', type=int, default=2, help='Links followed from a seed (default: 2)')
+    parser.add_argument('--crawl-max', type=int, help='Stop after this many patents (default: no limit)')
+    parser.add_argument('--crawl-relations', nargs='+', choices=RELATIONS, default=RELATIONS,
+                        help=f"Links to follow (default: {' '.join(RELATIONS)})")
+    parser.add_argument('--crawl-countries', nargs='+', help='Only follow patent numbers with these country codes, e.g. US EP')
+    parser.add_argument('--frontier-size', type=int, default=100000,
+                        help='Queued patents kept in the frontier, the lowest priority ones beyond it are dropped (default: 100000)')
+    parser.add_argument('--crawl-retry-failed', action='store_true', help='Queue patents that failed in an earlier crawl again')
+    parser.add_argument('--queue', nargs='?', const=DEFAULT_QUEUE,
+                        help=f'Work from a crash-safe SQLite queue shared with other downloader processes; --patents/--file '
+                             f'are added to it first (default path: {DEFAULT_QUEUE}, see work_queue.py)')
+    parser.add_argument('--lease', type=float, default=300, help='Seconds a queued patent stays leased without a heartbeat (default: 300)')
+    parser.add_argument('--max-attempts', type=int, default=5, help='Attempts before a queued patent is marked dead (default: 5)')
+    parser.add_argument('--retry-delay', type=float, default=60, help='Seconds before a failed queued patent is retried, doubled per attempt (default: 60)')
+    parser.add_argument('--queue-wait', action='store_true',
+                        help='Keep running while other workers hold leases or retries are pending, instead of exiting when nothing is leasable')
+    parser.add_argument('--store', choices=STORES, default='flat',
+                        help='PDF storage: flat patents/<number>.pdf files, or content-addressed and deduplicated '
+                             'with a hash index (default: flat, migrate with patent_store.py import)')
+    parser.add_argument('--store-dir', help='Store directory (default: patents for flat, patents/store for content)')
+    parser.add_argument('--store-links', action='store_true',
+                        help='Content store only: also hard link each PDF as patents/<number>.pdf for tools that read that layout')
+    
     # Check if input.txt exists
     default_input_file = 'input.txt'
-    if os.path.exists(default_input_file) and len(sys.argv) == 1:  # No command line arguments provided
-        print(f"Found {default_input_file}, using it as input...")
-        patent_numbers = read_patent_numbers_from_file(default_input_file)
-        if not patent_numbers:
-            print("No valid patent numbers found in input.txt.")
-            return
-        delay = 2  # Default delay
+    use_default_input = os.path.exists(default_input_file) and len(sys.argv) == 1  # No command line arguments provided
+    if use_default_input:
+        args = parser.parse_args(['--file', default_input_file])
     else:
-        # Set up argument parser
-        parser = argparse.ArgumentParser(description='Download patents from Google Patents')
-        group = parser.add_mutually_exclusive_group(required=True)
-        group.add_argument('--patents', nargs='+', help='One or more patent numbers to download')
-        group.add_argument('--file', type=str, help='Path to file containing patent numbers (one per line)')
-        parser.add_argument('--delay', type=int, default=2, help='Delay between downloads in seconds (default: 2)')
-        
-        # Parse arguments
         args = parser.parse_args()
-        
-        # Get list of patent numbers
-        patent_numbers = []
-        if args.patents:
-            patent_numbers = args.patents
-        elif args.file:
-            patent_numbers = read_patent_numbers_from_file(args.file)
-            if not patent_numbers:
-                print("No valid patent numbers found in file.")
-                return
-        delay = args.delay
+    if not (args.patents or args.file or args.queue):
+        parser.error('one of the arguments --patents --file --queue is required')
+    if args.queue and args.crawl:
+        parser.error('--queue and --crawl cannot be combined')
     
-    print("Google Patent Downloader")
-    print("-----------------------")
+    logging.basicConfig(level=args.log_level, format='%(message)s', filename=args.log_file)
+    if use_default_input:
+        logger.info(f"Found {default_input_file}, using it as input...")
     
-    downloader = GooglePatentDownloader()
+    # Stream normalized, deduplicated patent numbers instead of loading the whole list
+    if args.file and not os.path.exists(args.file):
+        logger.error(f"Error reading patent numbers from file: {args.file} does not exist")
+        return
+    lines = args.patents if args.patents else read_lines(args.file) if args.file else []
+    patent_numbers = iter_patent_numbers(lines, shard=args.shard, dedupe=args.dedupe)
     
-    # Process each patent number
-    for i, patent_number in enumerate(patent_numbers):
-        print(f"\nProcessing patent {i+1} of {len(patent_numbers)}")
-        patent_info = downloader.download_patent_info(patent_number)
-        
-        if patent_info:
-            print(f"Successfully processed patent: {patent_info['title']}")
-            print(f"Files in patents/ directory:")
-            print(f"- {patent_number}.pdf")
-            print(f"- {patent_number}_info.txt")
-        
-        # Add delay between downloads if there are more patents to process
-        if i < len(patent_numbers) - 1:
-            print(f"\nWaiting {delay} seconds before next patent...")
-            time.sleep(delay)
+    logger.info("Google Patent Downloader")
+    logger.info("-----------------------")
+    
+    # Per-host token buckets replace the fixed sleep between patents
+    default_rate = 1.0 / args.delay if args.delay > 0 else None
+    host_rates = {}
+    if args.page_rate is not None:
+        host_rates['patents.google.com'] = args.page_rate
+    if args.pdf_rate is not None:
+        host_rates['patentimages.storage.googleapis.com'] = args.pdf_rate
+    rate_limiter = HostRateLimiter(default_rate=default_rate, host_rates=host_rates)
+    
+    http_cache = None
+    if args.replay or args.http_cache:
+        http_cache = HttpCache(args.replay or args.http_cache, mode='replay' if args.replay else 'record',
+                               max_size=int(args.cache_size * 1024 ** 2), max_age=args.cache_max_age,
+                               replay_latency=args.replay_latency)
+    
+    downloader = GooglePatentDownloader(
+        rate_limiter=rate_limiter,
+        pool_size=args.pool_size or max(args.workers, 10),
+        max_retries=args.retries,
+        parser_backend=args.parser,
+        catalog=PatentCatalog(args.catalog) if args.catalog else None,
+        report=ReportWriter(args.report or default_report_path(args.report_format),
+                            args.report_format, args.report_columns),
+        metrics=DownloadMetrics(args.metrics, args.prometheus),
+        http_cache=http_cache,
+        store=open_store(args.store, args.store_dir, 'patents' if args.store_links else None),
+    )
+    
+    frontier = None
+    if args.crawl:
+        frontier = CrawlFrontier(args.crawl, max_depth=args.crawl_depth, max_queued=args.frontier_size,
+                                 relations=args.crawl_relations, countries=args.crawl_countries)
+        downloader.frontier = frontier
+        frontier.requeue_active()
+        if args.crawl_retry_failed:
+            frontier.requeue_failed()
+        seeds = frontier.add_seeds(patent_numbers)
+        logger.info(f"Crawl frontier {args.crawl}: {seeds} new seeds, {frontier.queued} patents queued")
+    
+    queue = None
+    if args.queue:
+        queue = WorkQueue(args.queue, lease_seconds=args.lease, max_attempts=args.max_attempts, retry_delay=args.retry_delay)
+        added = queue.enqueue(patent_numbers)
+        if added:
+            logger.info(f"Added {added} patents to the work queue {args.queue}")
+    
+    # Process patent numbers, crawl outwards from them or drain the queue, up to `workers` at a time
+    if queue:
+        succeeded, failed = drain(downloader, queue, workers=args.workers, wait_for_others=args.queue_wait)
+    elif frontier:
+        succeeded, failed = crawl(downloader, frontier, workers=args.workers, max_patents=args.crawl_max)
+    else:
+        succeeded, failed = downloader.download_batch(patent_numbers, workers=args.workers)
+    if not succeeded and not failed:
+        logger.info("No valid patent numbers found.")
+    else:
+        logger.info(f"Patents succeeded: {succeeded}, failed: {failed}")
+    
+    stats = downloader.session.connection_stats()
+    logger.info(f"HTTP requests: {stats['requests']}, new connections: {stats['new_connections']}, "
+                f"reused connections: {stats['reused_connections']}, retries: {stats['retries']}")
+    logger.info(f"Patent page fetches saved: {downloader.page_fetches_saved}")
+    if http_cache:
+        cache_stats = http_cache.stats
+        logger.info(f"HTTP cache ({http_cache.mode}): {cache_stats['hits']} hits, {cache_stats['revalidated']} revalidated, "
+                    f"{cache_stats['misses']} misses, {cache_stats['stored']} stored, {cache_stats['evicted']} evicted")
+        http_cache.close()
+    
+    if downloader.store.content_addressed:
+        summary = downloader.store.summary()
+        logger.info(f"PDF store: {downloader.store.stats['stored']} stored, {downloader.store.stats['deduplicated']} deduplicated; "
+                    f"{summary['patents']} patents in {summary['objects']} distinct PDFs")
+    downloader.store.close()
+    if queue:
+        counts = queue.counts()
+        logger.info("Work queue: " + ', '.join(f"{state}={count}" for state, count in sorted(counts.items())))
+        queue.close()
+    if frontier:
+        stats = frontier.stats()
+        logger.info("Crawl frontier: " + ', '.join(f"{state}={count}" for state, count in sorted(stats['states'].items()))
+                    + f", {stats['edges']} links")
+        frontier.close()
+    
+    # Per-phase latency percentiles; the summary is also the last JSON line of --metrics
+    logger.info("\n" + downloader.metrics.format_summary())
+    downloader.metrics.close()
     
     # Generate summary report
     downloader.generate_summary_report()
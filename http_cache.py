@@ -0,0 +1,377 @@
+"""
+Content-addressed on-disk HTTP cache with record and replay modes
+
+Sits between PooledSession and the network:
+
+    record  Serve fresh entries from disk, revalidate stale ones with
+            If-None-Match / If-Modified-Since, store full 200 responses
+    replay  Serve only recorded responses (no network, no rate limiting),
+            with an optional fixed latency, for offline runs and benchmarks
+
+Bodies are stored once per SHA-256 under blobs/ab/<hash>, gzip-compressed
+for text content (HTML), as-is for PDFs. URL entries live in a SQLite
+index and the least recently used ones are evicted when the blobs exceed
+the size cap.
+
+Usage:
+    python http_cache.py stats [--cache-dir .http_cache]
+    python http_cache.py prune [--cache-dir .http_cache] [--max-size-mb 2048]
+"""
+import argparse
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+DEFAULT_CACHE_DIR = '.http_cache'
+DEFAULT_MAX_SIZE = 2 * 1024 ** 3
+MODES = ['record', 'replay']
+COMPRESSED_TYPES = ('text/', 'application/json', 'application/xml', 'application/xhtml')
+# Hop-by-hop and encoding headers don't describe the stored (decoded) body
+DROPPED_HEADERS = {'content-encoding', 'transfer-encoding', 'connection', 'keep-alive', 'content-length'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    url TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body_hash TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_body_hash ON entries (body_hash);
+CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access);
+CREATE TABLE IF NOT EXISTS blobs (
+    body_hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL,
+    compressed INTEGER NOT NULL
+);
+"""
+
+
+class TeeBody:
+    def __init__(self, raw, spool_dir, on_complete):
+        """
+        Wrap a streamed urllib3 response so the body is spooled to disk as it is read
+
+        Args:
+            raw (urllib3.HTTPResponse): The response body being streamed
+            spool_dir (str): Directory for the temporary spool file
+            on_complete (callable): Called with (spool path, sha256 hex, size) once the body was read to the end
+        """
+        self.raw = raw
+        self.on_complete = on_complete
+        fd, self.spool_path = tempfile.mkstemp(dir=spool_dir, suffix='.part')
+        self.spool = os.fdopen(fd, 'wb')
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        for chunk in self.raw.stream(amt, decode_content=True):
+            self.spool.write(chunk)
+            self.sha256.update(chunk)
+            self.size += len(chunk)
+            yield chunk
+        self.spool.close()
+        self.on_complete(self.spool_path, self.sha256.hexdigest(), self.size)
+
+    def close(self):
+        # An abandoned or broken transfer leaves nothing in the cache
+        if not self.spool.closed:
+            self.spool.close()
+        if os.path.exists(self.spool_path):
+            os.remove(self.spool_path)
+        self.raw.close()
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+class HttpCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, mode='record', max_size=DEFAULT_MAX_SIZE,
+                 max_age=86400, replay_latency=0.0):
+        """
+        Open (and create if needed) the cache directory
+
+        Args:
+            cache_dir (str): Cache directory holding index.db and blobs/
+            mode (str): 'record' or 'replay', see MODES
+            max_size (int): Bytes of stored bodies kept before LRU eviction
+            max_age (float): Seconds an entry is served without revalidation, 0 always revalidates
+            replay_latency (float): Seconds added to every replayed response
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown cache mode {mode!r}, expected one of {MODES}")
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.max_size = max_size
+        self.max_age = max_age
+        self.replay_latency = replay_latency
+        self.blob_dir = os.path.join(cache_dir, 'blobs')
+        self.tmp_dir = os.path.join(cache_dir, 'tmp')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stored': 0, 'evicted': 0}
+        # One connection shared by all downloader threads, serialized by a lock
+        self.conn = sqlite3.connect(os.path.join(cache_dir, 'index.db'), check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.executescript(SCHEMA)
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def blob_path(self, body_hash):
+        return os.path.join(self.blob_dir, body_hash[:2], body_hash)
+
+    def lookup(self, url):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT status, headers, body_hash, stored_at FROM entries WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        entry = {'status': row[0], 'headers': json.loads(row[1]), 'body_hash': row[2], 'stored_at': row[3]}
+        if not os.path.exists(self.blob_path(entry['body_hash'])):
+            return None
+        return entry
+
+    def response(self, url, entry):
+        """
+        Build a requests.Response reading the cached body from disk
+
+        Returns:
+            requests.Response: Cached response, None if another thread evicted the body since lookup()
+        """
+        body_hash = entry['body_hash']
+        with self.lock:
+            self.conn.execute('UPDATE entries SET last_access = ? WHERE url = ?', (time.time(), url))
+            self.conn.commit()
+            compressed = self.conn.execute('SELECT compressed FROM blobs WHERE body_hash = ?', (body_hash,)).fetchone()
+        if compressed is None:
+            return None
+        path = self.blob_path(body_hash)
+        try:
+            # Once open, the body stays readable even if it is evicted meanwhile
+            raw = gzip.open(path, 'rb') if compressed[0] else open(path, 'rb')
+        except FileNotFoundError:
+            return None
+
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = http.client.responses.get(entry['status'], '')
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = url
+        response.raw = raw
+        return response
+
+    def store_file(self, url, response, spool_path, body_hash, size):
+        """
+        Move a complete body into the blob store and point the URL at it
+        """
+        headers = {key: value for key, value in response.headers.items() if key.lower() not in DROPPED_HEADERS}
+        headers['Content-Length'] = str(size)
+        compressed = response.headers.get('Content-Type', '').startswith(COMPRESSED_TYPES)
+        path = self.blob_path(body_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(spool_path)  # Same content already stored for another URL
+        elif compressed:
+            with open(spool_path, 'rb') as source, gzip.open(spool_path + '.gz', 'wb', compresslevel=6) as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+            os.remove(spool_path)
+            os.replace(spool_path + '.gz', path)
+        else:
+            os.replace(spool_path, path)
+
+        now = time.time()
+        with self.lock:
+            self.conn.execute('INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?)',
+                              (body_hash, size, os.path.getsize(path), int(compressed)))
+            self.conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                              (url, response.status_code, json.dumps(headers), body_hash, now, now))
+            self.conn.commit()
+            self.stats['stored'] += 1
+        self.evict()
+
+    def store_bytes(self, url, response):
+        fd, spool_path = tempfile.mkstemp(dir=self.tmp_dir, suffix='.part')
+        with os.fdopen(fd, 'wb') as spool:
+            spool.write(response.content)
+        self.store_file(url, response, spool_path, hashlib.sha256(response.content).hexdigest(), len(response.content))
+
+    def touch(self, url, response):
+        """
+        A 304 revalidated the entry, refresh its age and any updated validators
+
+        Returns:
+            bool: False if another thread evicted the entry since lookup()
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT headers FROM entries WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return False
+            headers = json.loads(row[0])
+            for key in ('ETag', 'Last-Modified', 'Cache-Control', 'Expires'):
+                if key in response.headers:
+                    headers[key] = response.headers[key]
+            now = time.time()
+            self.conn.execute('UPDATE entries SET headers = ?, stored_at = ?, last_access = ? WHERE url = ?',
+                              (json.dumps(headers), now, now, url))
+            self.conn.commit()
+        return True
+
+    def evict(self, max_size=None):
+        """
+        Drop least recently used entries until the stored bodies fit the size cap
+
+        Returns:
+            int: Entries evicted
+        """
+        max_size = self.max_size if max_size is None else max_size
+        evicted = 0
+        with self.lock:
+            total = self.conn.execute('SELECT COALESCE(SUM(stored_size), 0) FROM blobs').fetchone()[0]
+            if total <= max_size:
+                return 0
+            victims = self.conn.execute('SELECT url, body_hash FROM entries ORDER BY last_access').fetchall()
+            for url, body_hash in victims:
+                if total <= max_size:
+                    break
+                self.conn.execute('DELETE FROM entries WHERE url = ?', (url,))
+                evicted += 1
+                # A body shared by several URLs goes with the last of them
+                if self.conn.execute('SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1', (body_hash,)).fetchone():
+                    continue
+                stored_size = self.conn.execute('SELECT stored_size FROM blobs WHERE body_hash = ?',
+                                                (body_hash,)).fetchone()
+                self.conn.execute('DELETE FROM blobs WHERE body_hash = ?', (body_hash,))
+                if stored_size:
+                    total -= stored_size[0]
+                try:
+                    os.remove(self.blob_path(body_hash))
+                except FileNotFoundError:
+                    pass
+            self.conn.commit()
+            self.stats['evicted'] += evicted
+        return evicted
+
+    def get(self, url, fetch, headers=None, stream=False):
+        """
+        Answer a GET from the cache, the network or both
+
+        Args:
+            url (str): URL requested
+            fetch (callable): fetch(extra_headers) performs the network request and returns a requests.Response
+            headers (dict): Request headers; Range requests that miss the cache are not recorded
+            stream (bool): Whether the caller streams the body
+
+        Returns:
+            requests.Response: Cached or network response
+
+        Raises:
+            requests.ConnectionError: In replay mode, when the URL was never recorded
+        """
+        entry = self.lookup(url)
+        if self.mode == 'replay':
+            if entry is None:
+                self.count('misses')
+                raise requests.ConnectionError(f"{url} is not in the replay cache {self.cache_dir}")
+            cached = self.response(url, entry)
+            if cached is None:
+                self.count('misses')
+                raise requests.ConnectionError(f"{url} was evicted from the replay cache {self.cache_dir}")
+            self.count('hits')
+            if self.replay_latency:
+                time.sleep(self.replay_latency)
+            return cached
+
+        if entry is not None and time.time() - entry['stored_at'] < self.max_age:
+            # A cached full body also answers a Range request; the caller restarts from byte zero
+            cached = self.response(url, entry)
+            if cached is not None:
+                self.count('hits')
+                return cached
+            entry = None  # Evicted by another thread since lookup()
+
+        conditional = {}
+        if entry is not None:
+            cached_headers = CaseInsensitiveDict(entry['headers'])
+            if 'ETag' in cached_headers:
+                conditional['If-None-Match'] = cached_headers['ETag']
+            if 'Last-Modified' in cached_headers:
+                conditional['If-Modified-Since'] = cached_headers['Last-Modified']
+            if conditional and headers and 'Range' in headers:
+                conditional['Range'] = None  # Revalidate the whole body, not the caller's range
+        response = fetch(conditional)
+
+        if response.status_code == 304 and entry is not None:
+            response.close()
+            cached = self.response(url, entry) if self.touch(url, response) else None
+            if cached is not None:
+                self.count('revalidated')
+                return cached
+            # Evicted by another thread while revalidating, fetch the body again without validators
+            response = fetch({})
+
+        self.count('misses')
+        if response.status_code != 200:
+            return response  # Errors and partial (206) bodies are never recorded
+        if not stream:
+            self.store_bytes(url, response)
+            return response
+        response.raw = TeeBody(response.raw, self.tmp_dir,
+                               lambda spool_path, body_hash, size: self.store_file(url, response, spool_path, body_hash, size))
+        return response
+
+    def summary(self):
+        """
+        Returns:
+            dict: entries, blobs, size (decoded bytes) and stored_size (bytes on disk)
+        """
+        with self.lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+            blobs, size, stored_size = self.conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM blobs').fetchone()
+        return {'entries': entries, 'blobs': blobs, 'size': size, 'stored_size': stored_size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or shrink the HTTP record/replay cache')
+    parser.add_argument('command', choices=['stats', 'prune'], help='show cache size, or evict down to --max-size-mb')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help=f'Cache directory (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--max-size-mb', type=float, default=DEFAULT_MAX_SIZE / 1024 ** 2,
+                        help=f'Size cap for prune (default: {DEFAULT_MAX_SIZE // 1024 ** 2})')
+    args = parser.parse_args()
+
+    cache = HttpCache(args.cache_dir)
+    if args.command == 'prune':
+        evicted = cache.evict(int(args.max_size_mb * 1024 ** 2))
+        print(f"Evicted {evicted} entries")
+    summary = cache.summary()
+    print(f"Cache {args.cache_dir}: {summary['entries']} URLs, {summary['blobs']} bodies, "
+          f"{summary['size'] / 1e6:.1f} MB ({summary['stored_size'] / 1e6:.1f} MB on disk)")
+    cache.close()
+
+
+if __name__ == '__main__':
+    main()
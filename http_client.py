@@ -0,0 +1,255 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1):
+        """
+        Thread-safe token bucket
+
+        Args:
+            rate (float): Tokens added per second, None or 0 disables limiting
+            capacity (int): Maximum number of tokens (burst size)
+        """
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available and consume it
+        """
+        if not self.rate:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    def __init__(self, default_rate=None, host_rates=None, burst=1):
+        """
+        Keep one token bucket per host so each host is throttled independently
+
+        Args:
+            default_rate (float): Requests per second for hosts without an explicit rate
+            host_rates (dict): Mapping of host name to requests per second
+            burst (int): Number of requests allowed back to back
+        """
+        self.default_rate = default_rate
+        self.host_rates = host_rates or {}
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket_for(self, host):
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                rate = self.host_rates.get(host, self.default_rate)
+                bucket = TokenBucket(rate, self.burst)
+                self.buckets[host] = bucket
+            return bucket
+
+    def wait(self, url):
+        """
+        Block until a request to the host of the given URL is allowed
+
+        Args:
+            url (str): URL about to be requested
+        """
+        self.bucket_for(urlparse(url).netloc).acquire()
+
+
+class PooledSession:
+    def __init__(self, headers=None, rate_limiter=None, pool_size=10, max_retries=3,
+                 backoff_factor=0.5, backoff_max=60, timeout=30,
+                 retry_statuses=(429, 500, 502, 503, 504), metrics=None, cache=None):
+        """
+        Shared keep-alive session with retries, backoff and per-host rate limiting
+
+        Args:
+            headers (dict): Headers sent with every request
+            rate_limiter (HostRateLimiter): Limiter consulted before every attempt
+            pool_size (int): Max keep-alive connections kept per host
+            max_retries (int): Retries after the first attempt
+            backoff_factor (float): Base delay in seconds for exponential backoff
+            backoff_max (float): Upper bound for any single retry delay
+            timeout (float): Connect/read timeout in seconds
+            retry_statuses (tuple): HTTP status codes that are retried
+            metrics (DownloadMetrics): Receives rate limit and retry wait times and failed statuses, optional
+            cache (HttpCache): On-disk record/replay cache consulted before the network, optional
+        """
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.retry_statuses = set(retry_statuses)
+        self.retries = 0
+        self.metrics = metrics
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        # Retries are handled here so every attempt goes through the rate limiter
+        self.adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+    def backoff(self, attempt):
+        """
+        Exponential backoff with full jitter
+
+        Args:
+            attempt (int): Zero based attempt number that just failed
+
+        Returns:
+            float: Seconds to wait before the next attempt
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * (2 ** attempt)))
+
+    def retry_after(self, response):
+        """
+        Parse the Retry-After header (seconds or HTTP date)
+
+        Args:
+            response (requests.Response): Response that will be retried
+
+        Returns:
+            float: Seconds to wait, or None if the header is missing or invalid
+        """
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            if retry_at.tzinfo is None:
+                retry_at = retry_at.replace(tzinfo=timezone.utc)
+            seconds = (retry_at - datetime.now(timezone.utc)).total_seconds()
+        return min(self.backoff_max, max(0.0, seconds))
+
+    def get(self, url, **kwargs):
+        """
+        GET a URL through the cache if one is set, otherwise from the network
+
+        Args:
+            url (str): URL to request
+            **kwargs: Extra arguments passed to requests.Session.get
+
+        Returns:
+            requests.Response: The final response (may still be an error status)
+        """
+        self.local.waited = 0.0
+        if self.cache is None:
+            return self.fetch(url, **kwargs)
+
+        def fetch(extra_headers):
+            # None values (e.g. Range while revalidating) remove the caller's header
+            return self.fetch(url, **{**kwargs, 'headers': {**(kwargs.get('headers') or {}), **extra_headers}})
+
+        return self.cache.get(url, fetch, kwargs.get('headers'), kwargs.get('stream', False))
+
+    def fetch(self, url, **kwargs):
+        """
+        GET a URL from the network, retrying connection errors and retryable status codes
+
+        Args:
+            url (str): URL to request
+            **kwargs: Extra arguments passed to requests.Session.get
+
+        Returns:
+            requests.Response: The final response (may still be an error status)
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            self.rate_limiter.wait(url)
+            waited = time.perf_counter() - start
+            self.local.waited += waited
+            if self.metrics:
+                self.metrics.observe('rate_wait', waited)
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if self.metrics:
+                    self.metrics.failure(type(e).__name__)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+            else:
+                if self.metrics and response.status_code >= 400:
+                    self.metrics.failure(response.status_code)
+                if response.status_code not in self.retry_statuses or attempt >= self.max_retries:
+                    return response
+                delay = self.retry_after(response)
+                if delay is None:
+                    delay = self.backoff(attempt)
+                response.close()
+
+            with self.lock:
+                self.retries += 1
+            self.local.waited += delay
+            if self.metrics:
+                self.metrics.observe('retry_wait', delay)
+            time.sleep(delay)
+
+    def last_wait(self):
+        """
+        Seconds the last get() in this thread spent in the rate limiter and retry backoff
+
+        Returns:
+            float: Wait time, so callers can separate it from transfer time
+        """
+        return getattr(self.local, 'waited', 0.0)
+
+    def connection_stats(self):
+        """
+        Count new and reused connections across the pooled hosts
+
+        Returns:
+            dict: requests, new_connections, reused_connections and retries
+        """
+        pools = self.adapter.poolmanager.pools
+        total_requests = 0
+        new_connections = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            total_requests += pool.num_requests
+            new_connections += pool.num_connections
+        return {
+            'requests': total_requests,
+            'new_connections': new_connections,
+            'reused_connections': max(0, total_requests - new_connections),
+            'retries': self.retries,
+        }
+
+    def close(self):
+        self.session.close()
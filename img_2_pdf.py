@@ -1,53 +1,216 @@
-from fpdf import FPDF
+"""
+Assemble page images into a PDF, one page at a time
+
+JPEG files are embedded as-is (DCTDecode, no re-encoding); other formats
+are stored losslessly with Flate. Each page is written to disk as soon
+as it is added, so memory stays bounded by the largest single image
+regardless of the page count.
+
+Usage:
+    python img_2_pdf.py [--input-dir rr] [--output no_watermark.pdf] [--page-size a4|letter|image] [--fit contain|stretch|none]
+"""
+import argparse
 import os
-import glob
+import shutil
+import zlib
+
 from PIL import Image
 
-pdf = FPDF()
+from page_files import list_page_images
 
-# Get all jpg images from the rr folder
-image_path = 'rr'
-image_pattern = os.path.join(image_path, '*.jpg')
-imagelist = sorted(glob.glob(image_pattern))  # Sort to maintain page order
+# Page sizes in points (1/72 inch)
+PAGE_SIZES = {
+    'a4': (595.28, 841.89),
+    'letter': (612.0, 792.0),
+    'image': None,  # Page matches the image size at its DPI
+}
+FITS = ['contain', 'stretch', 'none']
+JPEG_COLOR_SPACES = {'L': '/DeviceGray', 'RGB': '/DeviceRGB', 'CMYK': '/DeviceCMYK'}
 
-print(f"Found {len(imagelist)} images to add to PDF")
 
-for image in imagelist:
-    try:
-        # Get image dimensions
-        with Image.open(image) as img:
+class StreamingPdfWriter:
+    def __init__(self, path):
+        """
+        Open a PDF for writing pages incrementally
+
+        Object 1 is the catalog and object 2 the page tree, both written by
+        close() once all page ids are known.
+
+        Args:
+            path (str): Output PDF path
+        """
+        self.file = open(path, 'wb')
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = 3
+        self.file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def new_id(self):
+        object_id = self.next_id
+        self.next_id += 1
+        return object_id
+
+    def begin_object(self, object_id):
+        self.offsets[object_id] = self.file.tell()
+        self.file.write(f'{object_id} 0 obj\n'.encode('ascii'))
+
+    def write_object(self, object_id, body):
+        self.begin_object(object_id)
+        self.file.write(body.encode('ascii'))
+        self.file.write(b'\nendobj\n')
+
+    def write_stream(self, object_id, dictionary, length, write_data):
+        self.begin_object(object_id)
+        self.file.write(f'<< {dictionary} /Length {length} >>\nstream\n'.encode('ascii'))
+        write_data(self.file)
+        self.file.write(b'\nendstream\nendobj\n')
+
+    def add_image(self, image_path):
+        """
+        Write an image XObject
+
+        Returns:
+            tuple: (int, int, int, tuple) - (object id, width, height, dpi)
+        """
+        with Image.open(image_path) as img:
             width, height = img.size
-            # Calculate aspect ratio
-            aspect = width / height
-            
-        print(f"Adding image: {image} (dimensions: {width}x{height})")
-        
-        pdf.add_page()
-        
-        # Use A4 page size (210x297 mm)
-        page_width = 210
-        page_height = 297
-        
-        # Calculate dimensions to fit the image properly on the page
-        if aspect > (page_width / page_height):  # wider than tall
-            img_width = page_width
-            img_height = page_width / aspect
-            x = 0
-            y = (page_height - img_height) / 2
-        else:  # taller than wide
-            img_height = page_height
-            img_width = page_height * aspect
-            y = 0
-            x = (page_width - img_width) / 2
-        
-        # Add image with proper dimensions and positioning
-        pdf.image(image, x=x, y=y, w=img_width, h=img_height)
-        
+            dpi = img.info.get('dpi')
+            if img.format == 'JPEG' and img.mode in JPEG_COLOR_SPACES:
+                # Copy the JPEG bytes straight into the PDF
+                dictionary = (f'/Type /XObject /Subtype /Image /Width {width} /Height {height} '
+                              f'/ColorSpace {JPEG_COLOR_SPACES[img.mode]} /BitsPerComponent 8 /Filter /DCTDecode')
+                if img.mode == 'CMYK' and 'adobe' in img.info:
+                    dictionary += ' /Decode [1 0 1 0 1 0 1 0]'  # Adobe CMYK JPEGs are stored inverted
+                length = os.path.getsize(image_path)
+
+                def write_data(out):
+                    with open(image_path, 'rb') as source:
+                        shutil.copyfileobj(source, out, 1024 * 1024)
+            else:
+                mode = 'L' if img.mode in ('1', 'L', 'LA') else 'RGB'
+                data = zlib.compress(img.convert(mode).tobytes(), 6)
+                dictionary = (f'/Type /XObject /Subtype /Image /Width {width} /Height {height} '
+                              f'/ColorSpace {JPEG_COLOR_SPACES[mode]} /BitsPerComponent 8 /Filter /FlateDecode')
+                length = len(data)
+
+                def write_data(out):
+                    out.write(data)
+
+            # Only take an id once the image has been read, so an unreadable image leaves no gap
+            image_id = self.new_id()
+            self.write_stream(image_id, dictionary, length, write_data)
+        return image_id, width, height, dpi
+
+    def add_page(self, image_path, page_size='a4', fit='contain', default_dpi=200):
+        """
+        Add one page showing an image
+
+        Args:
+            image_path (str): Page image
+            page_size (str): One of PAGE_SIZES
+            fit (str): contain (scale to fit, centered), stretch (fill the page), none (actual size at its DPI, centered)
+            default_dpi (float): DPI for images that don't record one
+        """
+        image_id, width, height, dpi = self.add_image(image_path)
+        dpi_x, dpi_y = dpi if dpi and dpi[0] and dpi[1] else (default_dpi, default_dpi)
+        natural_width = width * 72.0 / dpi_x
+        natural_height = height * 72.0 / dpi_y
+
+        if PAGE_SIZES[page_size] is None:
+            page_width, page_height = natural_width, natural_height
+        else:
+            page_width, page_height = PAGE_SIZES[page_size]
+
+        if fit == 'stretch' or PAGE_SIZES[page_size] is None:
+            draw_width, draw_height = page_width, page_height
+        elif fit == 'none':
+            draw_width, draw_height = natural_width, natural_height
+        else:
+            scale = min(page_width / width, page_height / height)
+            draw_width, draw_height = width * scale, height * scale
+        x = (page_width - draw_width) / 2
+        y = (page_height - draw_height) / 2
+
+        content = f'q {draw_width:.4f} 0 0 {draw_height:.4f} {x:.4f} {y:.4f} cm /Im0 Do Q'.encode('ascii')
+        content_id = self.new_id()
+        self.write_stream(content_id, '', len(content), lambda out: out.write(content))
+
+        page_id = self.new_id()
+        self.write_object(page_id, (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width:.4f} {page_height:.4f}] '
+            f'/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>'
+        ))
+        self.page_ids.append(page_id)
+
+    def close(self):
+        """
+        Write the page tree, catalog, cross-reference table and trailer
+        """
+        kids = ' '.join(f'{page_id} 0 R' for page_id in self.page_ids)
+        self.write_object(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>')
+        self.write_object(1, '<< /Type /Catalog /Pages 2 0 R >>')
+
+        xref_offset = self.file.tell()
+        self.file.write(f'xref\n0 {self.next_id}\n'.encode('ascii'))
+        self.file.write(b'0000000000 65535 f \n')
+        for object_id in range(1, self.next_id):
+            if object_id in self.offsets:
+                self.file.write(f'{self.offsets[object_id]:010d} 00000 n \n'.encode('ascii'))
+            else:
+                self.file.write(b'0000000000 00000 f \n')  # Id of a page that failed while being written
+        self.file.write(f'trailer\n<< /Size {self.next_id} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n'.encode('ascii'))
+        self.file.close()
+
+
+def images_to_pdf(image_paths, output_pdf, page_size='a4', fit='contain', default_dpi=200, verbose=True):
+    """
+    Write the images as pages of one PDF, in the given order
+
+    Args:
+        image_paths (list): Page images
+        output_pdf (str): Output PDF path
+        page_size (str): One of PAGE_SIZES
+        fit (str): One of FITS
+        default_dpi (float): DPI for images that don't record one
+
+    Returns:
+        int: Number of pages written
+    """
+    writer = StreamingPdfWriter(output_pdf)
+    try:
+        for image in image_paths:
+            try:
+                writer.add_page(image, page_size, fit, default_dpi)
+                if verbose:
+                    print(f"Adding image: {image}")
+            except Exception as e:
+                print(f"Error processing image {image}: {e}")
+    finally:
+        writer.close()
+    return len(writer.page_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Assemble page images into a PDF')
+    parser.add_argument('--input-dir', default='rr', help='Directory of page images (default: rr)')
+    parser.add_argument('--pattern', default='*.jpg', help="Glob for page images, '*' for all image types (default: *.jpg)")
+    parser.add_argument('--output', default='no_watermark.pdf', help='Output PDF (default: no_watermark.pdf)')
+    parser.add_argument('--page-size', choices=list(PAGE_SIZES), default='a4', help='Page size (default: a4)')
+    parser.add_argument('--fit', choices=FITS, default='contain', help='How the image is placed on the page (default: contain)')
+    parser.add_argument('--dpi', type=float, default=200, help='DPI for images without one, used by --fit none and --page-size image (default: 200)')
+    parser.add_argument('--quiet', action='store_true', help='Do not print every page')
+    args = parser.parse_args()
+
+    # Natural sort keeps img2 before img10
+    imagelist = list_page_images(args.input_dir, None if args.pattern == '*' else args.pattern)
+    print(f"Found {len(imagelist)} images to add to PDF")
+
+    try:
+        pages = images_to_pdf(imagelist, args.output, args.page_size, args.fit, args.dpi, not args.quiet)
+        print(f"PDF created with {pages} pages: {args.output}")
     except Exception as e:
-        print(f"Error processing image {image}: {e}")
+        print(f"Error creating PDF: {e}")
+
 
-try:
-    pdf.output("no_watermark.pdf")
-    print(f"PDF created with {len(imagelist)} pages")
-except Exception as e:
-    print(f"Error creating PDF: {e}")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,147 @@
-from PIL import Image
-import pytesseract
-import os, glob
+"""
+OCR every page image in parallel, printing the text in page order
 
-image_path = 'rr'
-image_pattern = os.path.join(image_path, '*.jpg')
-imagelist = sorted(glob.glob(image_pattern))  # Sort to maintain page order
+Results are cached under --cache-dir keyed by the image content hash plus
+the OCR backend, language and config, so re-runs only OCR changed pages.
 
-print(f"Found {len(imagelist)} images to add to PDF")
+Usage:
+    python img_ocr.py [--input-dir rr] [--workers N] [--lang eng] [--config ''] > sbios_text.txt
+"""
+import argparse
+import hashlib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
-for img_name in imagelist:
-    img = Image.open(img_name)
-    text = pytesseract.image_to_string(img, lang='eng')
-    print(text)
\ No newline at end of file
+from page_files import list_page_images
+
+DEFAULT_CACHE_DIR = '.ocr_cache'
+
+
+def tesseract_ocr(image_path, lang='eng', config=''):
+    from PIL import Image
+    import pytesseract
+    with Image.open(image_path) as img:
+        return pytesseract.image_to_string(img, lang=lang, config=config)
+
+
+# Backends take (image_path, lang, config) and return text; they must be
+# module-level functions so worker processes can pickle them
+OCR_BACKENDS = {
+    'tesseract': tesseract_ocr,
+}
+
+
+def cache_key(image_path, backend_name, lang, config):
+    """
+    Hash of the image content and everything that changes the OCR output
+
+    Returns:
+        str: Hex digest
+    """
+    sha256 = hashlib.sha256()
+    with open(image_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+    sha256.update(f"\0{backend_name}\0{lang}\0{config}".encode('utf-8'))
+    return sha256.hexdigest()
+
+
+def cache_path(cache_dir, key):
+    return os.path.join(cache_dir, key[:2], f"{key}.txt")
+
+
+def read_cache(cache_dir, key):
+    try:
+        with open(cache_path(cache_dir, key), 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def ocr_page(ocr, image_path, lang, config, cache_dir, key):
+    """
+    OCR one page in a worker process and store the result in the cache
+
+    Returns:
+        str: Recognized text
+    """
+    text = ocr(image_path, lang, config)
+    if cache_dir:
+        path = cache_path(cache_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    return text
+
+
+def ocr_pages(image_paths, ocr=tesseract_ocr, backend_name='tesseract', lang='eng', config='',
+              workers=None, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    OCR pages in parallel, yielding results in input order
+
+    Args:
+        image_paths (list): Page images in page order
+        ocr (callable): OCR backend, see OCR_BACKENDS
+        backend_name (str): Name of the backend, part of the cache key
+        lang (str): Tesseract language
+        config (str): Tesseract config string
+        workers (int): Worker processes, CPU count if None
+        cache_dir (str): Result cache directory, None disables caching
+
+    Yields:
+        tuple: (str, str, bool) - (image_path, text, from_cache)
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for image_path in image_paths:
+            key = cache_key(image_path, backend_name, lang, config) if cache_dir else None
+            text = read_cache(cache_dir, key) if cache_dir else None
+            if text is not None:
+                pending.append((image_path, text, None))
+            else:
+                future = executor.submit(ocr_page, ocr, image_path, lang, config, cache_dir, key)
+                pending.append((image_path, None, future))
+
+        for image_path, text, future in pending:
+            if future is None:
+                yield image_path, text, True
+            else:
+                yield image_path, future.result(), False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OCR page images in parallel with result caching')
+    parser.add_argument('--input-dir', default='rr', help='Directory of page images (default: rr)')
+    parser.add_argument('--pattern', default='*.jpg', help='Glob for page images (default: *.jpg)')
+    parser.add_argument('--output', help='Write text to this file instead of stdout')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--lang', default='eng', help='Tesseract language (default: eng)')
+    parser.add_argument('--config', default='', help='Extra tesseract config, e.g. "--psm 6"')
+    parser.add_argument('--backend', choices=list(OCR_BACKENDS), default='tesseract', help='OCR backend (default: tesseract)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help=f'OCR result cache (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--no-cache', action='store_true', help='Always OCR every page')
+    args = parser.parse_args()
+
+    imagelist = list_page_images(args.input_dir, args.pattern)
+    # Status goes to stderr so stdout can be redirected to a text file
+    print(f"Found {len(imagelist)} images to OCR", file=sys.stderr)
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    cached = 0
+    try:
+        for image_path, text, from_cache in ocr_pages(
+                imagelist, OCR_BACKENDS[args.backend], args.backend, args.lang, args.config,
+                args.workers, None if args.no_cache else args.cache_dir):
+            cached += from_cache
+            print(text, file=output)
+    finally:
+        if args.output:
+            output.close()
+    print(f"OCR done: {len(imagelist)} pages, {cached} from cache", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+import glob
+import os
+import re
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff')
+
+
+def natural_key(path):
+    """
+    Sort key that orders img2 before img10
+
+    Args:
+        path (str): File path
+
+    Returns:
+        list: Alternating text and integer parts of the file name
+    """
+    name = os.path.basename(path).lower()
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+
+def list_page_images(image_dir, pattern=None):
+    """
+    List page images of a directory in natural page order
+
+    Args:
+        image_dir (str): Directory with one image per page
+        pattern (str): Glob pattern such as '*.jpg', all image types if None
+
+    Returns:
+        list: Image paths
+    """
+    if pattern:
+        paths = glob.glob(os.path.join(image_dir, pattern))
+    else:
+        paths = [os.path.join(image_dir, name) for name in os.listdir(image_dir)
+                 if name.lower().endswith(IMAGE_EXTENSIONS)]
+    return sorted(paths, key=natural_key)
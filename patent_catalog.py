@@ -0,0 +1,330 @@
+"""
+SQLite catalog of patent metadata and download state
+
+Replaces the per-patent patents/<n>_info.txt files with a single WAL-mode
+database, so existence checks for a whole batch are one query instead of
+several stat calls per patent.
+
+Usage:
+    python patent_catalog.py import [--patents-dir patents] [--db patents/catalog.db]
+    python patent_catalog.py stats [--db patents/catalog.db]
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from pdf_verify import verify_pdf_file
+
+DEFAULT_DB = os.path.join('patents', 'catalog.db')
+QUERY_CHUNK = 500  # Stay well below SQLite's bound parameter limit
+BATCH = 500  # Patents per transaction while importing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patents (
+    patent_number TEXT PRIMARY KEY,
+    title TEXT,
+    abstract TEXT,
+    inventors TEXT,
+    filing_date TEXT,
+    publication_date TEXT,
+    info_saved INTEGER NOT NULL DEFAULT 0,
+    pdf_status TEXT NOT NULL DEFAULT 'missing',
+    pdf_url TEXT,
+    pdf_size INTEGER,
+    pdf_sha256 TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_patents_pdf_status ON patents (pdf_status);
+"""
+
+
+def parse_info_text(content, patent_number):
+    """
+    Parse the text written by GooglePatentDownloader.save_patent_info
+
+    Args:
+        content (str): Content of a <n>_info.txt file
+        patent_number (str): The patent number the file belongs to
+
+    Returns:
+        dict: Patent information
+    """
+    patent_info = {'patent_number': patent_number}
+
+    # 使用更安全的方式提取信息
+    def extract_field(pattern, default='N/A'):
+        match = re.search(pattern, content)
+        return match.group(1) if match else default
+
+    # 提取各个字段
+    patent_info['title'] = extract_field(r'Title: (.+)')
+    patent_info['filing_date'] = extract_field(r'Filing Date: (.+)')
+    patent_info['publication_date'] = extract_field(r'Publication Date: (.+)')
+
+    # 处理发明人
+    inventors_match = re.search(r'Inventors: (.+)', content)
+    patent_info['inventors'] = (
+        inventors_match.group(1).split(', ') if inventors_match
+        else []
+    )
+
+    # 处理摘要 - 使用更宽松的模式
+    abstract_match = re.search(r'Abstract:\n([\s\S]+)$', content)
+    patent_info['abstract'] = (
+        abstract_match.group(1).strip() if abstract_match
+        else 'N/A'
+    )
+
+    return patent_info
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+class PatentCatalog:
+    def __init__(self, path=DEFAULT_DB):
+        """
+        Open (and create if needed) the catalog database
+
+        Args:
+            path (str): Path to the SQLite database file
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # One connection shared by all downloader threads, serialized by a lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.executescript(SCHEMA)
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def upsert(self, patent_number, commit=True, **fields):
+        """
+        Insert or update columns of one patent row
+
+        Args:
+            patent_number (str): The patent number
+            commit (bool): Commit right away; bulk imports pass False and call commit() per batch
+            **fields: Column values to set
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        fields['updated_at'] = now
+        columns = ', '.join(fields)
+        placeholders = ', '.join('?' for _ in fields)
+        updates = ', '.join(f"{column} = excluded.{column}" for column in fields)
+        with self.lock:
+            self.conn.execute(
+                f"INSERT INTO patents (patent_number, created_at, {columns}) VALUES (?, ?, {placeholders}) "
+                f"ON CONFLICT (patent_number) DO UPDATE SET {updates}",
+                [patent_number, now, *fields.values()],
+            )
+            if commit:
+                self.conn.commit()
+
+    def save_info(self, patent_info, commit=True):
+        """
+        Store patent metadata
+
+        Args:
+            patent_info (dict): Patent information as built by the downloader
+            commit (bool): Commit right away, see upsert()
+        """
+        self.upsert(
+            patent_info['patent_number'],
+            commit=commit,
+            title=patent_info['title'],
+            abstract=patent_info['abstract'],
+            inventors=json.dumps(patent_info['inventors'], ensure_ascii=False),
+            filing_date=patent_info['filing_date'],
+            publication_date=patent_info['publication_date'],
+            info_saved=1,
+        )
+
+    def mark_pdf_done(self, patent_number, pdf_size, pdf_sha256, pdf_url=None, commit=True):
+        self.upsert(patent_number, commit=commit, pdf_status='done', pdf_size=pdf_size,
+                    pdf_sha256=pdf_sha256, pdf_url=pdf_url, error=None)
+
+    def mark_pdf_failed(self, patent_number, error, pdf_url=None):
+        self.upsert(patent_number, pdf_status='failed', pdf_url=pdf_url, error=error)
+
+    def state(self, patent_number):
+        """
+        Get the download state of one patent
+
+        Args:
+            patent_number (str): The patent number
+
+        Returns:
+            tuple: (bool, bool) - (pdf_done, info_saved)
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT pdf_status, info_saved FROM patents WHERE patent_number = ?",
+                (patent_number,),
+            ).fetchone()
+        if row is None:
+            return False, False
+        return row['pdf_status'] == 'done', bool(row['info_saved'])
+
+    def row_to_info(self, row):
+        return {
+            'patent_number': row['patent_number'],
+            'title': row['title'],
+            'abstract': row['abstract'],
+            'inventors': json.loads(row['inventors'] or '[]'),
+            'filing_date': row['filing_date'],
+            'publication_date': row['publication_date'],
+        }
+
+    def get(self, patent_number):
+        """
+        Read stored patent metadata
+
+        Args:
+            patent_number (str): The patent number
+
+        Returns:
+            dict: Patent information if stored, None otherwise
+        """
+        return self.get_many([patent_number]).get(patent_number)
+
+    def get_many(self, patent_numbers):
+        """
+        Read stored metadata for many patents at once
+
+        Args:
+            patent_numbers (iterable): Patent numbers to look up
+
+        Returns:
+            dict: Patent number -> patent information, for numbers with saved info
+        """
+        found = {}
+        for rows in self.query_chunks(
+                "SELECT * FROM patents WHERE info_saved = 1 AND patent_number IN ({})", patent_numbers):
+            for row in rows:
+                found[row['patent_number']] = self.row_to_info(row)
+        return found
+
+    def done_numbers(self, patent_numbers):
+        """
+        Find which of the given patents already have metadata and a verified PDF
+
+        Args:
+            patent_numbers (iterable): Patent numbers to check
+
+        Returns:
+            set: Patent numbers that are complete
+        """
+        done = set()
+        for rows in self.query_chunks(
+                "SELECT patent_number FROM patents WHERE pdf_status = 'done' AND info_saved = 1 "
+                "AND patent_number IN ({})", patent_numbers):
+            done.update(row['patent_number'] for row in rows)
+        return done
+
+    def query_chunks(self, sql, patent_numbers):
+        """
+        Run an IN (...) query over the patent numbers in bounded chunks
+
+        Yields:
+            list: sqlite3.Row results for each chunk
+        """
+        patent_numbers = list(patent_numbers)
+        for start in range(0, len(patent_numbers), QUERY_CHUNK):
+            chunk = patent_numbers[start:start + QUERY_CHUNK]
+            with self.lock:
+                rows = self.conn.execute(sql.format(', '.join('?' for _ in chunk)), chunk).fetchall()
+            yield rows
+
+    def counts(self):
+        """
+        Returns:
+            dict: Number of patents per PDF status, plus total and info_saved
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT pdf_status, COUNT(*) AS n, SUM(info_saved) AS info FROM patents GROUP BY pdf_status"
+            ).fetchall()
+        counts = {row['pdf_status']: row['n'] for row in rows}
+        counts['total'] = sum(row['n'] for row in rows)
+        counts['info_saved'] = sum(row['info'] or 0 for row in rows)
+        return counts
+
+    def import_info_files(self, patents_dir='patents'):
+        """
+        One-time import of existing <n>_info.txt files and PDFs
+
+        Args:
+            patents_dir (str): Directory written by the downloader
+
+        Returns:
+            tuple: (int, int) - (info files imported, verified PDFs recorded)
+        """
+        imported = 0
+        pdfs = 0
+        for info_path in sorted(glob.glob(os.path.join(patents_dir, '*_info.txt'))):
+            patent_number = os.path.basename(info_path)[:-len('_info.txt')]
+            try:
+                with open(info_path, 'r', encoding='utf-8') as f:
+                    patent_info = parse_info_text(f.read(), patent_number)
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Skipping {info_path}: {str(e)}")
+                continue
+            self.save_info(patent_info, commit=False)
+            imported += 1
+
+            pdf_path = os.path.join(patents_dir, f"{patent_number}.pdf")
+            if os.path.exists(pdf_path) and verify_pdf_file(pdf_path)[0]:
+                self.mark_pdf_done(patent_number, os.path.getsize(pdf_path), file_sha256(pdf_path), commit=False)
+                pdfs += 1
+            if imported % BATCH == 0:
+                self.commit()
+        self.commit()
+        return imported, pdfs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the SQLite patent catalog')
+    parser.add_argument('command', choices=['import', 'stats'], help='import existing _info.txt files, or show counts')
+    parser.add_argument('--db', default=DEFAULT_DB, help=f'Catalog database (default: {DEFAULT_DB})')
+    parser.add_argument('--patents-dir', default='patents', help='Directory with downloaded patents (default: patents)')
+    args = parser.parse_args()
+
+    catalog = PatentCatalog(args.db)
+    if args.command == 'import':
+        imported, pdfs = catalog.import_info_files(args.patents_dir)
+        print(f"Imported {imported} info files and {pdfs} verified PDFs into {args.db}")
+    counts = catalog.counts()
+    print(f"Catalog {args.db}: {counts['total']} patents, {counts['info_saved']} with info, "
+          f"{counts.get('done', 0)} PDFs done, {counts.get('failed', 0)} failed")
+    catalog.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,348 @@
+"""
+Citation and patent-family crawler with a persistent, prioritized frontier
+
+The downloader hands every parsed page's citation, cited-by and family
+links to a CrawlFrontier (see GooglePatentDownloader.fetch_patent_page),
+so links cost no extra request. The frontier lives in SQLite: every
+patent is stored once, queued patents are popped highest priority first,
+and a patent's priority grows with every page that links to it. Depth and
+size limits keep a crawl from running away, and a stopped crawl resumes
+where it left off.
+
+Usage:
+    python google_patent_downloader.py --file seeds.txt --crawl [--crawl-depth 2] [--crawl-max 20000]
+    python patent_crawler.py stats [--frontier patents/frontier.db]
+    python patent_crawler.py export [--state done] [--output reports/crawl.txt]
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+
+from patent_input import normalize_patent_number
+from patent_parser import RELATIONS
+
+logger = logging.getLogger('patent_downloader')
+
+DEFAULT_FRONTIER = os.path.join('patents', 'frontier.db')
+STATES = ['queued', 'active', 'done', 'failed', 'dropped']
+# Priority a link adds to its target, family members first, then prior art, then later art
+RELATION_WEIGHTS = {'family': 3.0, 'citations': 2.0, 'cited_by': 1.0}
+DEPTH_DECAY = 0.5  # Links found deeper in the crawl count for less
+SEED_PRIORITY = 1e9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    patent_number TEXT PRIMARY KEY,
+    depth INTEGER NOT NULL,
+    priority REAL NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    parent TEXT,
+    relation TEXT,
+    expanded INTEGER NOT NULL DEFAULT 0,
+    discovered_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_nodes_queue ON nodes (state, priority DESC, depth);
+CREATE TABLE IF NOT EXISTS edges (
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    relation TEXT NOT NULL,
+    PRIMARY KEY (source, target, relation)
+);
+"""
+
+
+class CrawlFrontier:
+    def __init__(self, path=DEFAULT_FRONTIER, max_depth=2, max_queued=100000, relations=None, countries=None):
+        """
+        Open (and create if needed) the crawl frontier
+
+        Args:
+            path (str): Path to the SQLite database file
+            max_depth (int): Links are followed up to this many steps from a seed
+            max_queued (int): Queue bound, the lowest priority patents beyond it are dropped
+            relations (list): Relations to follow, all of RELATIONS if None
+            countries (list): Only follow numbers with these prefixes (e.g. ['US', 'EP']), all if None
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_depth = max_depth
+        self.max_queued = max_queued
+        self.relations = set(relations or RELATIONS)
+        self.countries = tuple(country.upper() for country in countries) if countries else None
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.queued = self.count('queued')
+        self.dropped = 0  # Patents dropped by this run to stay under max_queued
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def count(self, state):
+        return self.conn.execute('SELECT COUNT(*) FROM nodes WHERE state = ?', (state,)).fetchone()[0]
+
+    def add_seeds(self, patent_numbers):
+        """
+        Queue seed patents at depth 0, ahead of everything found by the crawl
+
+        Seeds that were already crawled keep their state, so repeating a
+        crawl with the same seeds resumes it.
+
+        Args:
+            patent_numbers (iterable): Normalized patent numbers
+
+        Returns:
+            int: Seeds newly queued
+        """
+        now = time.time()
+        added = 0
+        with self.lock:
+            for patent_number in patent_numbers:
+                cursor = self.conn.execute(
+                    'INSERT OR IGNORE INTO nodes (patent_number, depth, priority, discovered_at, updated_at) '
+                    'VALUES (?, 0, ?, ?, ?)', (patent_number, SEED_PRIORITY, now, now))
+                if cursor.rowcount:
+                    added += 1
+                    continue
+                # A seed found earlier as a link becomes a seed, and is queued again if the frontier dropped it
+                self.conn.execute('UPDATE nodes SET depth = 0, priority = MAX(priority, ?) WHERE patent_number = ?',
+                                  (SEED_PRIORITY, patent_number))
+                cursor = self.conn.execute("UPDATE nodes SET state = 'queued' WHERE patent_number = ? AND state = 'dropped'",
+                                           (patent_number,))
+                added += cursor.rowcount
+            self.queued += added
+            self.conn.commit()
+        return added
+
+    def add_links(self, source, links):
+        """
+        Record the links of a parsed page and queue the patents they point to
+
+        Args:
+            source (str): Patent number of the page
+            links (dict): relation -> linked patent numbers, as extracted by patent_parser
+        """
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute('SELECT depth FROM nodes WHERE patent_number = ?', (source,)).fetchone()
+            if row is None:
+                return  # Not part of the crawl, e.g. a page fetched by another tool
+            depth = row[0] + 1
+            edges = []
+            for relation, numbers in links.items():
+                for number in numbers:
+                    target = normalize_patent_number(number)
+                    if target and target != source:
+                        edges.append((source, target, relation))
+            self.conn.executemany('INSERT OR IGNORE INTO edges VALUES (?, ?, ?)', edges)
+
+            if depth <= self.max_depth:
+                for _, target, relation in edges:
+                    if relation not in self.relations or (self.countries and not target.startswith(self.countries)):
+                        continue
+                    weight = RELATION_WEIGHTS[relation] * DEPTH_DECAY ** (depth - 1)
+                    cursor = self.conn.execute(
+                        'INSERT OR IGNORE INTO nodes (patent_number, depth, priority, parent, relation, discovered_at, updated_at) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)', (target, depth, weight, source, relation, now, now))
+                    if cursor.rowcount:
+                        self.queued += 1
+                    else:
+                        # Already known: more inbound links raise its priority, a shorter path lowers its depth
+                        self.conn.execute('UPDATE nodes SET priority = priority + ?, depth = MIN(depth, ?), updated_at = ? '
+                                          'WHERE patent_number = ?', (weight, depth, now, target))
+                self.trim()
+            self.conn.execute('UPDATE nodes SET expanded = 1 WHERE patent_number = ?', (source,))
+            self.conn.commit()
+
+    def trim(self):
+        # Called with the lock held
+        excess = self.queued - self.max_queued
+        if self.max_queued and excess > 0:
+            self.conn.execute(
+                "UPDATE nodes SET state = 'dropped', updated_at = ? WHERE patent_number IN ("
+                "SELECT patent_number FROM nodes WHERE state = 'queued' ORDER BY priority, depth DESC LIMIT ?)",
+                (time.time(), excess))
+            self.queued -= excess
+            self.dropped += excess
+
+    def pop(self, count):
+        """
+        Take the highest priority queued patents and mark them active
+
+        Returns:
+            list: Up to count patent numbers
+        """
+        with self.lock:
+            numbers = [row[0] for row in self.conn.execute(
+                "SELECT patent_number FROM nodes WHERE state = 'queued' ORDER BY priority DESC, depth LIMIT ?", (count,))]
+            self.conn.executemany("UPDATE nodes SET state = 'active', updated_at = ? WHERE patent_number = ?",
+                                  [(time.time(), number) for number in numbers])
+            self.conn.commit()
+            self.queued -= len(numbers)
+        return numbers
+
+    def finish(self, patent_number, succeeded):
+        with self.lock:
+            self.conn.execute('UPDATE nodes SET state = ?, updated_at = ? WHERE patent_number = ?',
+                              ('done' if succeeded else 'failed', time.time(), patent_number))
+            self.conn.commit()
+
+    def needs_expansion(self, patent_number):
+        """
+        Check whether a patent's links are still unknown and would be followed
+
+        True for patents whose files already existed, so their page was not parsed.
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT depth, expanded FROM nodes WHERE patent_number = ?', (patent_number,)).fetchone()
+        return row is not None and not row[1] and row[0] < self.max_depth
+
+    def requeue_active(self):
+        """
+        Queue patents left active by an interrupted crawl again
+
+        Returns:
+            int: Patents queued again
+        """
+        with self.lock:
+            cursor = self.conn.execute("UPDATE nodes SET state = 'queued' WHERE state = 'active'")
+            self.conn.commit()
+            self.queued += cursor.rowcount
+        return cursor.rowcount
+
+    def requeue_failed(self):
+        """
+        Returns:
+            int: Failed patents queued again
+        """
+        with self.lock:
+            cursor = self.conn.execute("UPDATE nodes SET state = 'queued' WHERE state = 'failed'")
+            self.conn.commit()
+            self.queued += cursor.rowcount
+        return cursor.rowcount
+
+    def stats(self):
+        """
+        Returns:
+            dict: Patents per state, patents per depth and the number of links
+        """
+        with self.lock:
+            states = dict(self.conn.execute('SELECT state, COUNT(*) FROM nodes GROUP BY state'))
+            depths = dict(self.conn.execute('SELECT depth, COUNT(*) FROM nodes GROUP BY depth ORDER BY depth'))
+            edges = self.conn.execute('SELECT COUNT(*) FROM edges').fetchone()[0]
+        return {'states': states, 'depths': depths, 'edges': edges}
+
+    def numbers(self, state):
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                'SELECT patent_number FROM nodes WHERE state = ? ORDER BY depth, priority DESC', (state,))]
+
+
+def crawl(downloader, frontier, workers=1, max_patents=None):
+    """
+    Download patents from the frontier until it is empty or max_patents are processed
+
+    The downloader must have been created with frontier=frontier, so every
+    page it parses queues that page's links. Patents downloaded before the
+    crawl are read from disk and only their page is fetched, to learn
+    their links.
+
+    Args:
+        downloader (GooglePatentDownloader): Downloader feeding the frontier
+        frontier (CrawlFrontier): The crawl frontier
+        workers (int): Number of patents processed concurrently
+        max_patents (int): Stop after this many patents, no limit if None
+
+    Returns:
+        tuple: (int, int) - (succeeded, failed)
+    """
+    workers = max(1, workers)
+    counts = {'submitted': 0, 'succeeded': 0, 'failed': 0}
+
+    def visit(patent_number):
+        patent_info = downloader.download_patent_info(patent_number)
+        if patent_info and frontier.needs_expansion(patent_number):
+            try:
+                downloader.fetch_patent_page(patent_number)
+                downloader.metrics.count('crawl_page_fetches')
+            except requests.RequestException as e:
+                logger.error(f"Error fetching links of patent {patent_number}: {str(e)}")
+        return patent_info
+
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            room = 2 * workers - len(in_flight)
+            if max_patents is not None:
+                room = min(room, max_patents - counts['submitted'])
+            if room > 0:
+                for patent_number in frontier.pop(room):
+                    in_flight[executor.submit(visit, patent_number)] = patent_number
+                    counts['submitted'] += 1
+            if not in_flight:
+                break
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                patent_number = in_flight.pop(future)
+                try:
+                    patent_info = future.result()
+                except Exception as e:
+                    logger.error(f"Error processing patent {patent_number}: {str(e)}")
+                    patent_info = None
+                frontier.finish(patent_number, bool(patent_info))
+                counts['succeeded' if patent_info else 'failed'] += 1
+                logger.info(f"Crawled {counts['succeeded'] + counts['failed']} patents, {frontier.queued} queued")
+
+    if frontier.dropped:
+        logger.info(f"{frontier.dropped} low priority patents dropped to keep the frontier under {frontier.max_queued}")
+    return counts['succeeded'], counts['failed']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect a crawl frontier (crawl with google_patent_downloader.py --crawl)')
+    parser.add_argument('--frontier', default=DEFAULT_FRONTIER, help=f'Frontier database (default: {DEFAULT_FRONTIER})')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help='Show patents per state and depth')
+    export = commands.add_parser('export', help='Write the patent numbers in one state, one per line')
+    export.add_argument('--state', choices=STATES, default='done', help='State to export (default: done)')
+    export.add_argument('--output', default=os.path.join('reports', 'crawl.txt'), help='Output file (default: reports/crawl.txt)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.frontier):
+        print(f"No frontier at {args.frontier}")
+        return
+    frontier = CrawlFrontier(args.frontier)
+    try:
+        if args.command == 'stats':
+            stats = frontier.stats()
+            print(f"Frontier {args.frontier}: {sum(stats['states'].values())} patents, {stats['edges']} links")
+            print('  ' + ', '.join(f"{state}={stats['states'][state]}" for state in STATES if state in stats['states']))
+            print('  ' + ', '.join(f"depth {depth}={count}" for depth, count in stats['depths'].items()))
+        else:
+            numbers = frontier.numbers(args.state)
+            directory = os.path.dirname(args.output)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.writelines(number + '\n' for number in numbers)
+            print(f"{len(numbers)} {args.state} patents written to {args.output}")
+    finally:
+        frontier.close()
+
+
+if __name__ == '__main__':
+    main()
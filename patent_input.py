@@ -0,0 +1,191 @@
+"""
+Streaming reader for patent number lists
+
+Numbers are normalized (US-1234567-B2, us 1234567 b2 and Google Patents
+URLs all become US1234567B2), deduplicated and optionally sharded while
+the file is read, so memory stays flat for inputs of any size.
+"""
+import argparse
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import tempfile
+import zlib
+
+PATENT_URL = re.compile(r'/patent/([^/?#]+)')
+SEPARATORS = re.compile(r'[\s\-_.,/]+')
+DEDUPE_MODES = ['memory', 'disk', 'bloom', 'none']
+
+
+def normalize_patent_number(text):
+    """
+    Normalize a patent number as written in an input file
+
+    Args:
+        text (str): Raw line, e.g. 'US-1234567-B2' or a patents.google.com URL
+
+    Returns:
+        str: Normalized number such as 'US1234567B2', or '' if there is none
+    """
+    text = text.strip()
+    if not text or text.startswith('#'):
+        return ''
+    match = PATENT_URL.search(text)
+    if match:
+        text = match.group(1)
+    return SEPARATORS.sub('', text).upper()
+
+
+def parse_shard(value):
+    """
+    Parse a --shard value of the form 'i/N' (0 <= i < N), as an argparse type
+
+    Returns:
+        tuple: (int, int) - (index, count)
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard '{value}', expected i/N")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"invalid shard '{value}', expected 0 <= i < N")
+    return index, count
+
+
+def shard_of(patent_number, count):
+    # Stable across processes and machines, unlike hash()
+    return zlib.crc32(patent_number.encode('utf-8')) % count
+
+
+class BloomFilter:
+    def __init__(self, capacity=10_000_000, error_rate=0.0001):
+        """
+        Fixed-size probabilistic set, a few bytes per expected item
+
+        A false positive drops a number that was never seen, so pick an
+        error rate that is acceptable for the batch, or use DiskSet.
+
+        Args:
+            capacity (int): Expected number of distinct items
+            error_rate (float): Acceptable false positive rate
+        """
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        """
+        Returns:
+            bool: True if the item was (probably) not in the set before
+        """
+        added = False
+        for position in self.positions(item):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                added = True
+        return added
+
+
+class DiskSet:
+    def __init__(self, path=None):
+        """
+        Exact set kept in a temporary SQLite file instead of memory
+
+        Args:
+            path (str): Database file, a temporary file is used if None
+        """
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix='.db', prefix='patent_seen_')
+            os.close(fd)
+            self.temporary = True
+        else:
+            self.temporary = False
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=OFF')
+        self.conn.execute('PRAGMA synchronous=OFF')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS seen (patent_number TEXT PRIMARY KEY) WITHOUT ROWID')
+
+    def add(self, item):
+        """
+        Returns:
+            bool: True if the item was not in the set before
+        """
+        cursor = self.conn.execute('INSERT OR IGNORE INTO seen VALUES (?)', (item,))
+        return cursor.rowcount == 1
+
+    def close(self):
+        self.conn.close()
+        if self.temporary:
+            os.remove(self.path)
+
+
+class MemorySet(set):
+    def add(self, item):
+        if item in self:
+            return False
+        super().add(item)
+        return True
+
+    def close(self):
+        pass
+
+
+def make_seen_set(dedupe):
+    if dedupe == 'memory':
+        return MemorySet()
+    if dedupe == 'disk':
+        return DiskSet()
+    if dedupe == 'bloom':
+        return BloomFilter()
+    if dedupe == 'none':
+        return None
+    raise ValueError(f"Unknown dedupe mode '{dedupe}', expected one of {DEDUPE_MODES}")
+
+
+def iter_patent_numbers(lines, shard=None, dedupe='memory'):
+    """
+    Normalize, deduplicate and shard patent numbers lazily
+
+    Args:
+        lines (iterable): Raw lines or numbers
+        shard (tuple): (index, count) to keep only this process's share, None for all
+        dedupe (str): One of DEDUPE_MODES
+
+    Yields:
+        str: Normalized patent numbers
+    """
+    seen = make_seen_set(dedupe)
+    try:
+        for line in lines:
+            patent_number = normalize_patent_number(line)
+            if not patent_number:
+                continue
+            if shard and shard_of(patent_number, shard[1]) != shard[0]:
+                continue
+            if seen is not None and not seen.add(patent_number):
+                continue
+            yield patent_number
+    finally:
+        if hasattr(seen, 'close'):
+            seen.close()
+
+
+def read_lines(file_path):
+    """
+    Yield lines of a text file one at a time
+
+    Args:
+        file_path (str): Path to the file
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        yield from f
@@ -0,0 +1,173 @@
+"""
+Single-pass extraction of patent metadata from a Google Patents page
+
+Every backend walks the document once and collects title, abstract,
+inventors, filing/publication dates, the PDF link and the patent numbers
+in the citation, cited-by and family tables. C-accelerated backends
+(selectolax, lxml) are used when installed, otherwise the pure-Python
+BeautifulSoup html.parser tree is used.
+"""
+from bs4 import BeautifulSoup
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# Table row itemprop -> link relation; rows of other tables (similar documents etc.) are ignored
+LINK_ROWS = {
+    'backwardReferences': 'citations',
+    'backwardReferencesOrig': 'citations',
+    'backwardReferencesFamily': 'citations',
+    'forwardReferences': 'cited_by',
+    'forwardReferencesOrig': 'cited_by',
+    'forwardReferencesFamily': 'cited_by',
+    'docdbFamily': 'family',
+}
+RELATIONS = ['citations', 'cited_by', 'family']
+TAGS = ('span', 'time', 'div', 'a', 'tr')
+
+
+class PageCollector:
+    def __init__(self):
+        """
+        Accumulate fields while a backend walks the elements of a page
+        """
+        self.title = None
+        self.abstract = None
+        self.inventors = []
+        self.filing_date = None
+        self.publication_date = None
+        self.pdf_href = None
+        self.links = {relation: [] for relation in RELATIONS}
+        self.row_relation = None  # Relation of the table row being walked
+
+    def visit(self, tag, attrs, text):
+        """
+        Inspect one element, keeping the first match for single-valued fields
+
+        Args:
+            tag (str): Element name
+            attrs (dict): Element attributes
+            text (callable): Returns the element text when called
+        """
+        if tag == 'span':
+            itemprop = attrs.get('itemprop')
+            if itemprop == 'title' and self.title is None:
+                self.title = text().strip()
+            elif itemprop == 'inventor':
+                self.inventors.append(text().strip())
+            elif itemprop == 'publicationNumber' and self.row_relation:
+                number = text().strip()
+                if number and number not in self.links[self.row_relation]:
+                    self.links[self.row_relation].append(number)
+        elif tag == 'tr':
+            self.row_relation = LINK_ROWS.get(attrs.get('itemprop'))
+        elif tag == 'time':
+            itemprop = attrs.get('itemprop')
+            if itemprop == 'filingDate' and self.filing_date is None:
+                self.filing_date = text()
+            elif itemprop == 'publicationDate' and self.publication_date is None:
+                self.publication_date = text()
+        elif tag == 'div':
+            if self.abstract is None and 'abstract' in (attrs.get('class') or '').split():
+                self.abstract = text().strip()
+        elif tag == 'a':
+            href = attrs.get('href')
+            if self.pdf_href is None and href and href.endswith('.pdf'):
+                self.pdf_href = href
+
+    def result(self):
+        return {
+            'title': self.title if self.title is not None else 'N/A',
+            'abstract': self.abstract if self.abstract is not None else 'N/A',
+            'inventors': self.inventors,
+            'filing_date': self.filing_date if self.filing_date is not None else 'N/A',
+            'publication_date': self.publication_date if self.publication_date is not None else 'N/A',
+            'pdf_href': self.pdf_href,
+            'links': self.links,
+        }
+
+
+def _extract_bs4(html, features):
+    collector = PageCollector()
+    soup = BeautifulSoup(html, features)
+    for element in soup.find_all(TAGS):
+        attrs = element.attrs
+        if 'class' in attrs:
+            attrs = dict(attrs, **{'class': ' '.join(attrs['class'])})
+        collector.visit(element.name, attrs, element.get_text)
+    return collector.result()
+
+
+def _extract_html_parser(html):
+    return _extract_bs4(html, 'html.parser')
+
+
+def _extract_bs4_lxml(html):
+    return _extract_bs4(html, 'lxml')
+
+
+def _extract_lxml(html):
+    collector = PageCollector()
+    root = lxml.html.fromstring(html)
+    for element in root.iter(*TAGS):
+        collector.visit(element.tag, element.attrib, element.text_content)
+    return collector.result()
+
+
+def _extract_selectolax(html):
+    collector = PageCollector()
+    tree = LexborHTMLParser(html)
+    for node in tree.root.traverse():
+        tag = node.tag
+        if tag in TAGS:
+            collector.visit(tag, node.attributes, lambda node=node: node.text(deep=True))
+    return collector.result()
+
+
+# Ordered fastest first, the first available backend is the default
+BACKENDS = {
+    'selectolax': (_extract_selectolax, LexborHTMLParser is not None),
+    'lxml': (_extract_lxml, lxml is not None),
+    'bs4-lxml': (_extract_bs4_lxml, lxml is not None),
+    'html.parser': (_extract_html_parser, True),
+}
+
+
+def available_backends():
+    """
+    List the parser backends that can be used in this environment
+
+    Returns:
+        list: Backend names, fastest first
+    """
+    return [name for name, (_, available) in BACKENDS.items() if available]
+
+
+def default_backend():
+    return available_backends()[0]
+
+
+def extract_patent_page(html, backend=None):
+    """
+    Extract patent metadata and the PDF link from a patent page
+
+    Args:
+        html (bytes or str): Page content
+        backend (str): One of available_backends(), default is the fastest
+
+    Returns:
+        dict: title, abstract, inventors, filing_date, publication_date, pdf_href and
+            links (relation -> patent numbers, see RELATIONS)
+    """
+    name = backend or default_backend()
+    extractor, available = BACKENDS[name]
+    if not available:
+        raise ValueError(f"Parser backend '{name}' is not installed")
+    return extractor(html)
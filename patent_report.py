@@ -0,0 +1,233 @@
+"""
+Incremental summary report of downloaded patents
+
+Rows are written as each patent completes and flushed periodically, so a
+crash keeps everything reported so far. Reopening an existing report
+appends to it and skips patents that are already in it.
+"""
+import csv
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger('patent_downloader')
+
+# Field name -> CSV header label
+COLUMNS = {
+    'patent_number': 'Patent Number',
+    'title': 'Title',
+    'inventors': 'Inventors',
+    'filing_date': 'Filing Date',
+    'publication_date': 'Publication Date',
+    'abstract': 'Abstract',
+    'pdf_path': 'PDF Path',
+}
+DEFAULT_COLUMNS = ['patent_number', 'publication_date', 'abstract']
+FORMATS = ['csv', 'jsonl', 'parquet']
+
+
+def default_report_path(report_format):
+    return os.path.join('reports', f'patent_summary.{report_format}')
+
+
+class ReportWriter:
+    def __init__(self, path=None, report_format='csv', columns=None, flush_every=50, flush_interval=10):
+        """
+        Open a report for appending
+
+        Args:
+            path (str): Report file (csv/jsonl) or directory of part files (parquet)
+            report_format (str): One of FORMATS
+            columns (list): Patent info fields to write, see COLUMNS
+            flush_every (int): Flush after this many buffered rows
+            flush_interval (float): Flush when the oldest buffered row is this many seconds old
+        """
+        if report_format not in FORMATS:
+            raise ValueError(f"Unknown report format '{report_format}', expected one of {FORMATS}")
+        columns = columns or DEFAULT_COLUMNS
+        unknown = [column for column in columns if column not in COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown report columns {unknown}, expected some of {list(COLUMNS)}")
+        if 'patent_number' not in columns:
+            columns = ['patent_number'] + list(columns)  # Needed to deduplicate across restarts
+
+        self.path = path or default_report_path(report_format)
+        self.report_format = report_format
+        self.columns = columns
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.buffered_since = None
+        self.written = 0
+        self.file = None
+        self.writer = None
+        self.part = 0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.drop_partial_row()
+        self.seen = self.load_existing()
+        self.open()
+
+    def drop_partial_row(self):
+        """
+        Truncate a last row that a crash left without its newline
+
+        Appending after the fragment would merge the next row into it, so
+        the fragment is dropped before the report is read; its patent is
+        then not in the report and gets written again.
+        """
+        if self.report_format == 'parquet' or not os.path.exists(self.path):
+            return
+        with open(self.path, 'r+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return
+            end = 0
+            position = size
+            while position > 0:
+                start = max(0, position - 65536)
+                f.seek(start)
+                index = f.read(position - start).rfind(b'\n')
+                if index >= 0:
+                    end = start + index + 1
+                    break
+                position = start
+            f.truncate(end)
+        logger.warning(f"Dropped a partial last row ({size - end} bytes) from {self.path}")
+
+    def load_existing(self):
+        """
+        Collect patent numbers already present in the report
+
+        A report written with a different column set is moved aside so the
+        new rows don't end up under the wrong header.
+
+        Returns:
+            set: Patent numbers already reported
+        """
+        seen = set()
+        if self.report_format == 'parquet':
+            import pyarrow.parquet as pq
+            parts = sorted(glob.glob(os.path.join(self.path, 'part-*.parquet')))
+            for part in parts:
+                seen.update(pq.read_table(part, columns=['patent_number']).column('patent_number').to_pylist())
+            self.part = len(parts)
+            return seen
+
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return seen
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            if self.report_format == 'csv':
+                reader = csv.reader(f)
+                header = next(reader, None)
+                if header != [COLUMNS[column] for column in self.columns]:
+                    return self.move_aside()
+                for row in reader:
+                    if row:
+                        seen.add(row[0])
+            else:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Corrupt line, partial rows are dropped by drop_partial_row
+                    if list(record) != self.columns:
+                        return self.move_aside()
+                    seen.add(record['patent_number'])
+        return seen
+
+    def move_aside(self):
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        backup = f"{self.path}.{timestamp}.bak"
+        os.replace(self.path, backup)
+        logger.warning(f"Existing report has different columns, moved to {backup}")
+        return set()
+
+    def open(self):
+        if self.report_format == 'parquet':
+            os.makedirs(self.path, exist_ok=True)
+            return
+        is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, 'a', newline='', encoding='utf-8')
+        if self.report_format == 'csv':
+            self.writer = csv.writer(self.file)
+            if is_new:
+                self.writer.writerow([COLUMNS[column] for column in self.columns])
+                self.file.flush()
+
+    def row(self, patent_info):
+        values = {}
+        for column in self.columns:
+            value = patent_info.get(column, 'N/A')
+            if column == 'inventors' and self.report_format == 'csv':
+                value = ', '.join(value)
+            elif column == 'abstract' and self.report_format == 'csv':
+                value = value.replace('\n', ' ')  # Remove newlines from abstract
+            values[column] = value
+        return values
+
+    def write(self, patent_info):
+        """
+        Add one patent to the report, ignoring patents already reported
+
+        Args:
+            patent_info (dict): Patent information
+
+        Returns:
+            bool: True if the patent was new to the report
+        """
+        with self.lock:
+            if patent_info['patent_number'] in self.seen:
+                return False
+            self.seen.add(patent_info['patent_number'])
+            self.buffer.append(self.row(patent_info))
+            if self.buffered_since is None:
+                self.buffered_since = time.monotonic()
+            if (len(self.buffer) >= self.flush_every
+                    or time.monotonic() - self.buffered_since >= self.flush_interval):
+                self.flush_locked()
+            return True
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        if not self.buffer:
+            return
+        if self.report_format == 'csv':
+            self.writer.writerows([row[column] for column in self.columns] for row in self.buffer)
+            self.file.flush()
+        elif self.report_format == 'jsonl':
+            for row in self.buffer:
+                self.file.write(json.dumps(row, ensure_ascii=False) + '\n')
+            self.file.flush()
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            # One part file per flush keeps every flushed row readable after a crash
+            table = pa.Table.from_pylist(self.buffer)
+            part_path = os.path.join(self.path, f'part-{self.part:05d}.parquet')
+            pq.write_table(table, part_path + '.tmp')
+            os.replace(part_path + '.tmp', part_path)
+            self.part += 1
+        self.written += len(self.buffer)
+        self.buffer = []
+        self.buffered_since = None
+
+    def close(self):
+        with self.lock:
+            self.flush_locked()
+            if self.file:
+                self.file.close()
+                self.file = None
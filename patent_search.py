@@ -0,0 +1,470 @@
+"""
+Full-text search over downloaded patents, using SQLite FTS5
+
+Indexes the metadata the downloader extracts (title, abstract, inventors,
+dates) and per-page text, either from the PDF text layer (pdfplumber) or
+from OCR output (pages separated by form feeds, as tesseract writes
+them). Indexing is incremental: each source records its mtime (or the
+catalog's updated_at), so only new and changed documents are written.
+
+Usage:
+    python patent_search.py index [--info-dir patents] [--catalog patents/catalog.db] [--pdfs] [--text pipeline_out/*/text.txt]
+    python patent_search.py query "power backup" [--from 2015-01-01] [--to 2020-12-31] [--date-field filing] [--limit 20]
+    python patent_search.py stats
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from patent_catalog import parse_info_text
+
+DEFAULT_DB = os.path.join('patents', 'search.db')
+# bm25 column weights: patent number, title, abstract, inventors
+FIELD_WEIGHTS = (5.0, 10.0, 4.0, 2.0)
+TEXT_WEIGHT = 0.5  # Page text matches count half as much as metadata matches
+DATE_FIELDS = {'publication': 'publication_date', 'filing': 'filing_date'}
+BATCH = 500  # Documents per transaction while indexing
+ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    patent_number TEXT NOT NULL UNIQUE,
+    title TEXT,
+    filing_date TEXT,
+    publication_date TEXT,
+    source_version REAL,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_publication_date ON documents (publication_date);
+CREATE INDEX IF NOT EXISTS idx_documents_filing_date ON documents (filing_date);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    patent_number, title, abstract, inventors, tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    patent_number TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    UNIQUE (patent_number, source, page)
+);
+CREATE TABLE IF NOT EXISTS page_sources (
+    patent_number TEXT NOT NULL,
+    source TEXT NOT NULL,
+    source_version REAL,
+    PRIMARY KEY (patent_number, source)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(text, tokenize = 'porter unicode61');
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def quote_query(query):
+    """
+    Turn plain words into an FTS5 query matching all of them
+
+    Returns:
+        str: Query with every word quoted, so punctuation and keywords like OR are literal
+    """
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"' for word in words)
+
+
+def iso_date(value):
+    """
+    Returns:
+        str: The date if it is YYYY-MM-DD, None for placeholders like 'N/A' so date filters exclude it
+    """
+    value = (value or '').strip()
+    return value if ISO_DATE.match(value) else None
+
+
+class PatentSearchIndex:
+    def __init__(self, path=DEFAULT_DB):
+        """
+        Open (and create if needed) the search index
+
+        Args:
+            path (str): Path to the SQLite database file
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        # Earlier versions stored the 'N/A' placeholder, which compares greater than any date
+        for column in DATE_FIELDS.values():
+            self.conn.execute(f"UPDATE documents SET {column} = NULL "
+                              f"WHERE {column} NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def source_version(self, patent_number):
+        row = self.conn.execute('SELECT source_version FROM documents WHERE patent_number = ?',
+                                (patent_number,)).fetchone()
+        return row['source_version'] if row else None
+
+    def add_patent(self, patent_info, source_version=None):
+        """
+        Index or re-index the metadata of one patent (call commit() afterwards)
+
+        Args:
+            patent_info (dict): Patent information as built by the downloader
+            source_version (float): mtime or update time of the source, to skip it next time
+        """
+        patent_number = patent_info['patent_number']
+        inventors = patent_info.get('inventors') or []
+        if isinstance(inventors, str):
+            inventors = json.loads(inventors)
+        row = self.conn.execute('SELECT id FROM documents WHERE patent_number = ?', (patent_number,)).fetchone()
+        values = (patent_info.get('title'), iso_date(patent_info.get('filing_date')),
+                  iso_date(patent_info.get('publication_date')), source_version, time.time())
+        if row:
+            document_id = row['id']
+            self.conn.execute('UPDATE documents SET title = ?, filing_date = ?, publication_date = ?, '
+                              'source_version = ?, indexed_at = ? WHERE id = ?', (*values, document_id))
+            self.conn.execute('DELETE FROM documents_fts WHERE rowid = ?', (document_id,))
+        else:
+            document_id = self.conn.execute(
+                'INSERT INTO documents (patent_number, title, filing_date, publication_date, source_version, indexed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)', (patent_number, *values)).lastrowid
+        self.conn.execute('INSERT INTO documents_fts (rowid, patent_number, title, abstract, inventors) VALUES (?, ?, ?, ?, ?)',
+                          (document_id, patent_number, patent_info.get('title') or '',
+                           patent_info.get('abstract') or '', ' '.join(inventors)))
+
+    def page_source_version(self, patent_number, source):
+        row = self.conn.execute('SELECT source_version FROM page_sources WHERE patent_number = ? AND source = ?',
+                                (patent_number, source)).fetchone()
+        return row['source_version'] if row else None
+
+    def add_pages(self, patent_number, pages, source, source_version=None):
+        """
+        Replace the page text of one patent from one source (call commit() afterwards)
+
+        Args:
+            patent_number (str): The patent number
+            pages (dict): 1-based page number -> text
+            source (str): 'pdf' or 'ocr', a patent can have both
+            source_version (float): mtime of the source file
+        """
+        old_ids = [(row['id'],) for row in self.conn.execute(
+            'SELECT id FROM pages WHERE patent_number = ? AND source = ?', (patent_number, source))]
+        self.conn.executemany('DELETE FROM pages_fts WHERE rowid = ?', old_ids)
+        self.conn.execute('DELETE FROM pages WHERE patent_number = ? AND source = ?', (patent_number, source))
+        for page, text in sorted(pages.items()):
+            if not text or not text.strip():
+                continue
+            page_id = self.conn.execute('INSERT INTO pages (patent_number, page, source) VALUES (?, ?, ?)',
+                                        (patent_number, page, source)).lastrowid
+            self.conn.execute('INSERT INTO pages_fts (rowid, text) VALUES (?, ?)', (page_id, text))
+        self.conn.execute('INSERT OR REPLACE INTO page_sources VALUES (?, ?, ?)', (patent_number, source, source_version))
+
+    def index_info_files(self, patents_dir='patents'):
+        """
+        Index new or changed <n>_info.txt files
+
+        Returns:
+            int: Files indexed
+        """
+        versions = dict(self.conn.execute('SELECT patent_number, source_version FROM documents'))
+        indexed = 0
+        with os.scandir(patents_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith('_info.txt'):
+                    continue
+                patent_number = entry.name[:-len('_info.txt')]
+                mtime = entry.stat().st_mtime
+                if versions.get(patent_number) == mtime:
+                    continue
+                try:
+                    with open(entry.path, 'r', encoding='utf-8') as f:
+                        patent_info = parse_info_text(f.read(), patent_number)
+                except (OSError, UnicodeDecodeError) as e:
+                    print(f"Skipping {entry.path}: {str(e)}")
+                    continue
+                self.add_patent(patent_info, mtime)
+                indexed += 1
+                if indexed % BATCH == 0:
+                    self.commit()
+        self.commit()
+        return indexed
+
+    def index_catalog(self, catalog_path):
+        """
+        Index catalog rows updated since the last run
+
+        Returns:
+            int: Patents indexed
+        """
+        key = f'catalog:{os.path.abspath(catalog_path)}'
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        # updated_at has one-second resolution: re-read rows from the last second instead of missing some
+        since = row['value'] if row else ''
+        catalog = sqlite3.connect(f'file:{catalog_path}?mode=ro', uri=True)
+        catalog.row_factory = sqlite3.Row
+        indexed = 0
+        latest = since
+        try:
+            for info in catalog.execute('SELECT * FROM patents WHERE info_saved = 1 AND updated_at >= ? ORDER BY updated_at',
+                                        (since,)):
+                self.add_patent(dict(info))
+                latest = max(latest, info['updated_at'])
+                indexed += 1
+                if indexed % BATCH == 0:
+                    self.commit()
+        finally:
+            catalog.close()
+        self.conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, latest))
+        self.commit()
+        return indexed
+
+    def index_pdfs(self, patents_dir='patents', workers=None):
+        """
+        Index the text layer of new or changed PDFs, page by page
+
+        Scanned pages without a text layer are skipped; index their OCR
+        output with index_text_files().
+
+        Returns:
+            int: PDFs indexed
+        """
+        from pdf_text import route_pages
+        indexed = 0
+        executor = None
+        try:
+            for pdf_path in sorted(glob.glob(os.path.join(patents_dir, '*.pdf'))):
+                patent_number = os.path.splitext(os.path.basename(pdf_path))[0]
+                mtime = os.path.getmtime(pdf_path)
+                if self.page_source_version(patent_number, 'pdf') == mtime:
+                    continue
+                if executor is None:
+                    # One pool for every PDF, started only once there is something to index
+                    executor = ProcessPoolExecutor(max_workers=workers)
+                try:
+                    pages = route_pages(pdf_path, workers, executor=executor)
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    print(f"Skipping {pdf_path}: {str(e)}")
+                    continue
+                self.add_pages(patent_number, pages, 'pdf', mtime)
+                self.commit()
+                indexed += 1
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return indexed
+
+    def index_text_files(self, paths):
+        """
+        Index OCR text files, split into pages at form feeds
+
+        The patent number is the file name without extension, or the
+        directory name for pipeline.py's <document>/text.txt.
+
+        Returns:
+            int: Files indexed
+        """
+        indexed = 0
+        for path in paths:
+            name = os.path.basename(path)
+            if name == 'text.txt':
+                patent_number = os.path.basename(os.path.dirname(os.path.abspath(path)))
+            else:
+                patent_number = os.path.splitext(name)[0]
+            mtime = os.path.getmtime(path)
+            if self.page_source_version(patent_number, 'ocr') == mtime:
+                continue
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                pages = {page: text for page, text in enumerate(f.read().split('\f'), 1)}
+            self.add_pages(patent_number, pages, 'ocr', mtime)
+            indexed += 1
+            if indexed % BATCH == 0:
+                self.commit()
+        self.commit()
+        return indexed
+
+    def search(self, query, date_from=None, date_to=None, date_field='publication', limit=20,
+               raw=False, include_text=True):
+        """
+        Rank patents by how well their metadata and page text match a query
+
+        Args:
+            query (str): Words to match (all of them), or FTS5 syntax if raw
+            date_from (str): Earliest date, YYYY-MM-DD inclusive
+            date_to (str): Latest date, YYYY-MM-DD inclusive
+            date_field (str): 'publication' or 'filing', see DATE_FIELDS
+            limit (int): Number of results
+            raw (bool): Pass the query to FTS5 unchanged (AND/OR/NOT, "phrases", NEAR, title: filters)
+            include_text (bool): Also match page text
+
+        Returns:
+            list: dicts with patent_number, title, dates, score, snippet and the best matching page
+        """
+        match = query if raw else quote_query(query)
+        if not match:
+            return []
+        column = DATE_FIELDS[date_field]
+        filters = ''
+        params = []
+        if date_from:
+            filters += f' AND d.{column} >= ?'
+            params.append(date_from)
+        if date_to:
+            filters += f' AND d.{column} <= ?'
+            params.append(date_to)
+        # Fetch more candidates than needed from each table so the merged ranking is stable
+        candidates = limit * 5
+
+        results = {}
+        weights = ', '.join(str(weight) for weight in FIELD_WEIGHTS)
+        for row in self.conn.execute(
+                f"SELECT d.patent_number, d.title, d.filing_date, d.publication_date, "
+                f"bm25(documents_fts, {weights}) AS rank, "
+                f"snippet(documents_fts, -1, '[', ']', '...', 12) AS snippet "
+                f"FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+                f"WHERE documents_fts MATCH ?{filters} ORDER BY rank LIMIT ?",
+                [match, *params, candidates]):
+            results[row['patent_number']] = {
+                'patent_number': row['patent_number'], 'title': row['title'],
+                'filing_date': row['filing_date'], 'publication_date': row['publication_date'],
+                'score': -row['rank'], 'snippet': row['snippet'], 'page': None,
+            }
+
+        if include_text:
+            # Page hits only pass the date filter if the patent's metadata is indexed too
+            join = 'JOIN documents d ON d.patent_number = p.patent_number' if filters else \
+                'LEFT JOIN documents d ON d.patent_number = p.patent_number'
+            try:
+                rows = self.conn.execute(
+                    f"SELECT p.patent_number, p.page, p.source, d.title, d.filing_date, d.publication_date, "
+                    f"bm25(pages_fts) AS rank, snippet(pages_fts, 0, '[', ']', '...', 12) AS snippet "
+                    f"FROM pages_fts JOIN pages p ON p.id = pages_fts.rowid {join} "
+                    f"WHERE pages_fts MATCH ?{filters} ORDER BY rank LIMIT ?",
+                    [match, *params, candidates]).fetchall()
+            except sqlite3.OperationalError:
+                if not raw:
+                    raise
+                rows = []  # The query filters on metadata columns, which page text doesn't have
+            for row in rows:
+                score = -row['rank'] * TEXT_WEIGHT
+                result = results.get(row['patent_number'])
+                if result is None:
+                    results[row['patent_number']] = {
+                        'patent_number': row['patent_number'], 'title': row['title'],
+                        'filing_date': row['filing_date'], 'publication_date': row['publication_date'],
+                        'score': score, 'snippet': row['snippet'], 'page': row['page'],
+                    }
+                elif result['page'] is None:
+                    # Best page only, the rows come in rank order
+                    result['score'] += score
+                    result['page'] = row['page']
+        return sorted(results.values(), key=lambda result: result['score'], reverse=True)[:limit]
+
+    def stats(self):
+        """
+        Returns:
+            dict: documents, pages and patents with page text
+        """
+        documents = self.conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+        pages = self.conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+        with_text = self.conn.execute('SELECT COUNT(DISTINCT patent_number) FROM pages').fetchone()[0]
+        return {'documents': documents, 'pages': pages, 'patents_with_text': with_text}
+
+    def optimize(self):
+        """
+        Merge FTS5 index segments, worth running after large imports
+        """
+        self.conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+        self.conn.execute("INSERT INTO pages_fts (pages_fts) VALUES ('optimize')")
+        self.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full-text search over downloaded patents')
+    parser.add_argument('--db', default=DEFAULT_DB, help=f'Search index database (default: {DEFAULT_DB})')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    index = commands.add_parser('index', help='Add new and changed documents to the index')
+    index.add_argument('--info-dir', default='patents', help='Directory with <n>_info.txt files (default: patents)')
+    index.add_argument('--catalog', nargs='?', const='patents/catalog.db', help='Also index the SQLite catalog')
+    index.add_argument('--pdfs', action='store_true', help='Also index the text layer of <info-dir>/*.pdf')
+    index.add_argument('--text', nargs='+', default=[], help='OCR text files to index, pages separated by form feeds')
+    index.add_argument('--workers', type=int, help='Worker processes for PDF text extraction (default: CPU count)')
+    index.add_argument('--optimize', action='store_true', help='Merge index segments afterwards')
+
+    query = commands.add_parser('query', help='Search the index')
+    query.add_argument('query', help='Words to search for; all must match')
+    query.add_argument('--from', dest='date_from', help='Earliest date, YYYY-MM-DD')
+    query.add_argument('--to', dest='date_to', help='Latest date, YYYY-MM-DD')
+    query.add_argument('--date-field', choices=list(DATE_FIELDS), default='publication', help='Date used by --from/--to (default: publication)')
+    query.add_argument('--limit', type=int, default=20, help='Number of results (default: 20)')
+    query.add_argument('--fts', action='store_true', help='Query is FTS5 syntax: AND/OR/NOT, "phrases", NEAR(), title:word')
+    query.add_argument('--no-text', action='store_true', help='Only search metadata, not page text')
+    query.add_argument('--json', action='store_true', help='Print results as JSON lines')
+
+    commands.add_parser('stats', help='Show index size')
+    args = parser.parse_args()
+
+    search_index = PatentSearchIndex(args.db)
+    try:
+        if args.command == 'index':
+            start = time.perf_counter()
+            counts = []
+            if os.path.isdir(args.info_dir):
+                counts.append(f"{search_index.index_info_files(args.info_dir)} info files")
+            if args.catalog:
+                counts.append(f"{search_index.index_catalog(args.catalog)} catalog rows")
+            if args.pdfs:
+                counts.append(f"{search_index.index_pdfs(args.info_dir, args.workers)} PDFs")
+            if args.text:
+                counts.append(f"{search_index.index_text_files(args.text)} text files")
+            if args.optimize:
+                search_index.optimize()
+            print(f"Indexed {', '.join(counts) or 'nothing'} in {time.perf_counter() - start:.1f}s")
+
+        elif args.command == 'query':
+            start = time.perf_counter()
+            try:
+                results = search_index.search(args.query, args.date_from, args.date_to, args.date_field,
+                                              args.limit, args.fts, not args.no_text)
+            except sqlite3.OperationalError as e:
+                print(f"Invalid query: {str(e)}")
+                return
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            for result in results:
+                if args.json:
+                    print(json.dumps(result, ensure_ascii=False))
+                    continue
+                page = f" (page {result['page']})" if result['page'] else ''
+                print(f"{result['score']:7.2f}  {result['patent_number']}  {result['publication_date'] or '':<10}  "
+                      f"{result['title'] or ''}{page}")
+                print(f"         {result['snippet']}")
+            if not args.json:
+                print(f"{len(results)} results in {elapsed_ms:.1f} ms")
+
+        counts = search_index.stats()
+        if args.command == 'stats':
+            print(f"Index {args.db}: {counts['documents']} patents, {counts['pages']} pages of text "
+                  f"from {counts['patents_with_text']} patents")
+    finally:
+        search_index.close()
+
+
+if __name__ == '__main__':
+    main()
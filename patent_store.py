@@ -0,0 +1,474 @@
+"""
+Storage backends for downloaded patent PDFs
+
+    FlatStore     patents/<number>.pdf in one directory, the original layout
+    ContentStore  PDFs stored once per distinct content, named by SHA-256 in a
+                  fan-out tree (objects/ab/cd/<sha256>.pdf), with a SQLite
+                  number -> hash index and optional compressed packs
+
+With ContentStore, existence checks are one indexed query instead of a stat
+and a PDF header/trailer read, republished or equivalent documents share
+one file, and rarely read documents can be moved into zip packs. Only
+verified downloads enter the store. link_dir keeps patents/<number>.pdf
+hard links to the objects for tools that read the flat layout (pipeline.py,
+pdf_audit.py, patent_search.py).
+
+Usage:
+    python patent_store.py import [--patents-dir patents] [--store patents/store] [--link]
+    python patent_store.py stats
+    python patent_store.py pack [--older-than 90] [--compression lzma]
+    python patent_store.py path US1234567B2
+    python patent_store.py gc
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import zipfile
+
+from patent_catalog import file_sha256
+from pdf_verify import classify_pdf, STATUS_OK
+
+DEFAULT_STORE = os.path.join('patents', 'store')
+STORES = ['flat', 'content']
+COMPRESSION = {'deflate': zipfile.ZIP_DEFLATED, 'lzma': zipfile.ZIP_LZMA, 'store': zipfile.ZIP_STORED}
+PACK_SIZE = 1024 ** 3  # Bytes of PDFs per pack file
+ACCESS_RESOLUTION = 3600  # last_access is only rewritten when older than this, so most reads write nothing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    pack TEXT,
+    stored_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_objects_last_access ON objects (last_access) WHERE pack IS NULL;
+CREATE TABLE IF NOT EXISTS refs (
+    patent_number TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_refs_sha256 ON refs (sha256);
+"""
+
+
+class FlatStore:
+    content_addressed = False  # Files may be put in place by hand, so callers verify them
+
+    def __init__(self, root='patents'):
+        """
+        PDFs as <root>/<number>.pdf, downloaded through <root>/<number>.pdf.part
+
+        Args:
+            root (str): Directory of downloaded PDFs
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def file_path(self, patent_number):
+        return os.path.join(self.root, f"{patent_number}.pdf")
+
+    def exists(self, patent_number):
+        return os.path.exists(self.file_path(patent_number))
+
+    def path(self, patent_number):
+        """
+        Returns:
+            str: Readable path of the patent's PDF, None if there is none
+        """
+        path = self.file_path(patent_number)
+        return path if os.path.exists(path) else None
+
+    def location(self, patent_number):
+        return self.path(patent_number)
+
+    def staging_path(self, patent_number):
+        """
+        Returns:
+            str: Partial file a download is written to (and resumed from)
+        """
+        return self.file_path(patent_number) + '.part'
+
+    def put(self, patent_number, source_path, sha256=None):
+        """
+        Move a verified download into place
+
+        Args:
+            patent_number (str): The patent number
+            source_path (str): Verified PDF, moved (not copied)
+            sha256 (str): Hex digest of the file if the caller has it
+
+        Returns:
+            str: Location of the stored PDF
+        """
+        path = self.file_path(patent_number)
+        os.replace(source_path, path)
+        return path
+
+    def close(self):
+        pass
+
+
+class ContentStore:
+    content_addressed = True
+
+    def __init__(self, root=DEFAULT_STORE, link_dir=None):
+        """
+        Open (and create if needed) a content-addressed store
+
+        Args:
+            root (str): Store directory holding objects/, packs/, tmp/ and index.db
+            link_dir (str): Also hard link every stored PDF as <link_dir>/<number>.pdf, optional
+        """
+        self.root = root
+        self.link_dir = link_dir
+        for directory in ['objects', 'packs', 'tmp']:
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+        if link_dir:
+            os.makedirs(link_dir, exist_ok=True)
+        self.stats = {'stored': 0, 'deduplicated': 0, 'unpacked': 0}
+        # One connection shared by all downloader threads, serialized by a lock
+        self.conn = sqlite3.connect(os.path.join(root, 'index.db'), timeout=60, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.executescript(SCHEMA)
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def object_path(self, sha256):
+        # Two levels of 256 directories keep every directory small even at millions of objects
+        return os.path.join(self.root, 'objects', sha256[:2], sha256[2:4], f"{sha256}.pdf")
+
+    def lookup(self, patent_number):
+        """
+        Returns:
+            tuple: (sha256, pack) of the patent's PDF, None if it is not stored
+        """
+        with self.lock:
+            return self.conn.execute(
+                'SELECT refs.sha256, objects.pack FROM refs JOIN objects ON objects.sha256 = refs.sha256 '
+                'WHERE refs.patent_number = ?', (patent_number,)).fetchone()
+
+    def exists(self, patent_number):
+        return self.lookup(patent_number) is not None
+
+    def path(self, patent_number):
+        """
+        Get a readable path of the patent's PDF, unpacking it from its pack if needed
+
+        Returns:
+            str: Path of the object file, None if the patent is not stored
+        """
+        row = self.lookup(patent_number)
+        if row is None:
+            return None
+        sha256, pack = row
+        path = self.object_path(sha256)
+        if pack:
+            self.unpack(sha256, pack)
+        now = time.time()
+        with self.lock:
+            self.conn.execute('UPDATE objects SET last_access = ? WHERE sha256 = ? AND last_access < ?',
+                              (now, sha256, now - ACCESS_RESOLUTION))
+            self.conn.commit()
+        return path
+
+    def location(self, patent_number):
+        """
+        Where the PDF is kept, without unpacking it
+
+        Returns:
+            str: Object path, '<pack>:<member>' for packed PDFs, None if not stored
+        """
+        row = self.lookup(patent_number)
+        if row is None:
+            return None
+        sha256, pack = row
+        if pack:
+            return f"{os.path.join(self.root, 'packs', pack)}:{sha256}.pdf"
+        return self.object_path(sha256)
+
+    def staging_path(self, patent_number):
+        # On the same file system as objects/, so put() is a rename
+        return os.path.join(self.root, 'tmp', f"{patent_number}.pdf.part")
+
+    def put(self, patent_number, source_path, sha256=None):
+        """
+        Store a verified PDF under its content hash and point the patent number at it
+
+        A PDF whose content is already stored is dropped and the patent
+        shares the existing object.
+
+        Args:
+            patent_number (str): The patent number
+            source_path (str): Verified PDF, moved into the store (not copied)
+            sha256 (str): Hex digest of the file, computed if None
+
+        Returns:
+            str: Location of the stored PDF
+        """
+        sha256 = sha256 or file_sha256(source_path)
+        object_path = self.object_path(sha256)
+        size = os.path.getsize(source_path)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute('SELECT pack FROM objects WHERE sha256 = ?', (sha256,)).fetchone()
+            if row is not None and (row[0] or os.path.exists(object_path)):
+                os.remove(source_path)
+                self.stats['deduplicated'] += 1
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.replace(source_path, object_path)
+                self.conn.execute('INSERT OR REPLACE INTO objects VALUES (?, ?, NULL, ?, ?)', (sha256, size, now, now))
+                self.stats['stored'] += 1
+            self.conn.execute('INSERT OR REPLACE INTO refs VALUES (?, ?, ?)', (patent_number, sha256, now))
+            self.conn.commit()
+        if self.link_dir:
+            self.link(patent_number)
+        return self.location(patent_number)
+
+    def link(self, patent_number, link_dir=None):
+        """
+        Hard link <link_dir>/<number>.pdf to the patent's object, replacing an older file
+
+        Args:
+            patent_number (str): The patent number
+            link_dir (str): Directory of the link, self.link_dir if None
+
+        Returns:
+            bool: True if the link exists afterwards
+        """
+        path = self.path(patent_number)
+        link_path = os.path.join(link_dir or self.link_dir, f"{patent_number}.pdf")
+        if path is None:
+            return False
+        if os.path.exists(link_path) and os.path.samefile(path, link_path):
+            return True
+        temp_path = link_path + '.link'
+        try:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            os.link(path, temp_path)
+            os.replace(temp_path, link_path)
+        except OSError:
+            return False  # Different file system, or no hard link support
+        return True
+
+    def unpack(self, sha256, pack):
+        """
+        Restore one object from its pack as a loose file
+        """
+        object_path = self.object_path(sha256)
+        temp_path = os.path.join(self.root, 'tmp', f"{sha256}.unpack")
+        with zipfile.ZipFile(os.path.join(self.root, 'packs', pack)) as archive:
+            with archive.open(f"{sha256}.pdf") as source, open(temp_path, 'wb') as target:
+                while True:
+                    block = source.read(1024 * 1024)
+                    if not block:
+                        break
+                    target.write(block)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.replace(temp_path, object_path)
+        with self.lock:
+            self.conn.execute('UPDATE objects SET pack = NULL WHERE sha256 = ?', (sha256,))
+            self.conn.commit()
+            self.stats['unpacked'] += 1
+
+    def pack(self, older_than_days=90, compression='deflate', pack_size=PACK_SIZE):
+        """
+        Move loose objects not read for a while into zip packs
+
+        Objects that are hard linked elsewhere are left loose, packing them
+        would not free any space. A packed object is unpacked again the
+        next time path() asks for it.
+
+        Args:
+            older_than_days (float): Only pack objects not read for this many days
+            compression (str): One of COMPRESSION
+            pack_size (int): Bytes of PDFs per pack file
+
+        Returns:
+            tuple: (int, int, int) - (objects packed, bytes before, pack bytes)
+        """
+        cutoff = time.time() - older_than_days * 86400
+        with self.lock:
+            candidates = self.conn.execute('SELECT sha256, size FROM objects WHERE pack IS NULL AND last_access < ? '
+                                           'ORDER BY last_access', (cutoff,)).fetchall()
+        batch = []
+        batch_size = 0
+        totals = [0, 0, 0]
+        for sha256, size in candidates:
+            path = self.object_path(sha256)
+            if not os.path.exists(path) or os.stat(path).st_nlink > 1:
+                continue
+            batch.append(sha256)
+            batch_size += size
+            if batch_size >= pack_size:
+                self.write_pack(batch, compression, totals)
+                batch, batch_size = [], 0
+        if batch:
+            self.write_pack(batch, compression, totals)
+        return tuple(totals)
+
+    def write_pack(self, batch, compression, totals):
+        name = f"pack-{time.strftime('%Y%m%d-%H%M%S')}-{batch[0][:8]}.zip"
+        temp_path = os.path.join(self.root, 'tmp', name)
+        with zipfile.ZipFile(temp_path, 'w', COMPRESSION[compression]) as archive:
+            for sha256 in batch:
+                archive.write(self.object_path(sha256), f"{sha256}.pdf")
+        with open(temp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(temp_path, os.path.join(self.root, 'packs', name))
+        # The index points at the pack before the loose files go, so a crash in between only leaves garbage for gc()
+        with self.lock:
+            self.conn.executemany('UPDATE objects SET pack = ? WHERE sha256 = ?', [(name, sha256) for sha256 in batch])
+            self.conn.commit()
+        for sha256 in batch:
+            path = self.object_path(sha256)
+            totals[1] += os.path.getsize(path)
+            os.remove(path)
+        totals[0] += len(batch)
+        totals[2] += os.path.getsize(os.path.join(self.root, 'packs', name))
+
+    def gc(self):
+        """
+        Delete objects no patent points to and loose copies of packed objects
+
+        Returns:
+            int: Files deleted
+        """
+        with self.lock:
+            orphans = [row[0] for row in self.conn.execute(
+                'SELECT sha256 FROM objects WHERE pack IS NULL AND sha256 NOT IN (SELECT sha256 FROM refs)')]
+            self.conn.executemany('DELETE FROM objects WHERE sha256 = ?', [(sha256,) for sha256 in orphans])
+            packed = [row[0] for row in self.conn.execute('SELECT sha256 FROM objects WHERE pack IS NOT NULL')]
+            self.conn.commit()
+        deleted = 0
+        for sha256 in orphans + packed:
+            path = self.object_path(sha256)
+            if os.path.exists(path):
+                os.remove(path)
+                deleted += 1
+        return deleted
+
+    def summary(self):
+        """
+        Returns:
+            dict: patents, distinct objects, their bytes, packed objects and bytes on disk
+        """
+        with self.lock:
+            patents = self.conn.execute('SELECT COUNT(*) FROM refs').fetchone()[0]
+            objects, size = self.conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects').fetchone()
+            packed = self.conn.execute('SELECT COUNT(*) FROM objects WHERE pack IS NOT NULL').fetchone()[0]
+            loose_size = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM objects WHERE pack IS NULL').fetchone()[0]
+        packs_dir = os.path.join(self.root, 'packs')
+        pack_size = sum(entry.stat().st_size for entry in os.scandir(packs_dir) if entry.is_file())
+        return {'patents': patents, 'objects': objects, 'size': size, 'packed': packed,
+                'disk_size': loose_size + pack_size}
+
+    def import_flat(self, patents_dir='patents', link=False):
+        """
+        Move verified patents/<number>.pdf files into the store
+
+        Args:
+            patents_dir (str): Directory of downloaded PDFs
+            link (bool): Leave a hard link to the object in place of each file
+
+        Returns:
+            tuple: (int, int) - (files imported, files skipped because they are not valid PDFs)
+        """
+        imported = 0
+        skipped = 0
+        with os.scandir(patents_dir) as entries:
+            names = [entry.name for entry in entries if entry.name.endswith('.pdf') and entry.is_file()]
+        for name in names:
+            path = os.path.join(patents_dir, name)
+            patent_number = name[:-len('.pdf')]
+            if os.stat(path).st_nlink > 1 and self.exists(patent_number):
+                continue  # Already a link into the store
+            if classify_pdf(path, count_pages=False)[0] != STATUS_OK:
+                skipped += 1
+                continue
+            staging_path = self.staging_path(patent_number)
+            shutil.move(path, staging_path)
+            self.put(patent_number, staging_path)
+            if link:
+                self.link(patent_number, patents_dir)
+            imported += 1
+        return imported, skipped
+
+
+def open_store(kind='flat', root=None, link_dir=None):
+    """
+    Create a storage backend by name
+
+    Args:
+        kind (str): One of STORES
+        root (str): Store directory, 'patents' for flat and DEFAULT_STORE for content if None
+        link_dir (str): ContentStore only, directory for <number>.pdf hard links
+
+    Returns:
+        FlatStore or ContentStore
+    """
+    if kind == 'flat':
+        return FlatStore(root or 'patents')
+    if kind == 'content':
+        return ContentStore(root or DEFAULT_STORE, link_dir)
+    raise ValueError(f"Unknown store '{kind}', expected one of {STORES}")
+
+
+def format_size(size):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the content-addressed PDF store')
+    parser.add_argument('--store', default=DEFAULT_STORE, help=f'Store directory (default: {DEFAULT_STORE})')
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help='Move patents/<number>.pdf files into the store')
+    import_parser.add_argument('--patents-dir', default='patents', help='Directory of downloaded PDFs (default: patents)')
+    import_parser.add_argument('--link', action='store_true', help='Leave a hard link in place of each imported file')
+    commands.add_parser('stats', help='Show patents, distinct PDFs and disk usage')
+    pack = commands.add_parser('pack', help='Move PDFs not read for a while into compressed packs')
+    pack.add_argument('--older-than', type=float, default=90, help='Days since a PDF was last read (default: 90)')
+    pack.add_argument('--compression', choices=list(COMPRESSION), default='deflate', help='Pack compression (default: deflate)')
+    path = commands.add_parser('path', help='Print the readable path of a patent PDF, unpacking it if needed')
+    path.add_argument('patent_number', help='Patent number')
+    commands.add_parser('gc', help='Delete PDFs no patent points to')
+    args = parser.parse_args()
+
+    store = ContentStore(args.store)
+    try:
+        if args.command == 'import':
+            imported, skipped = store.import_flat(args.patents_dir, args.link)
+            print(f"Imported {imported} PDFs ({store.stats['deduplicated']} duplicates), "
+                  f"skipped {skipped} invalid ones (see pdf_audit.py)")
+        elif args.command == 'pack':
+            packed, before, after = store.pack(args.older_than, args.compression)
+            print(f"Packed {packed} PDFs: {format_size(before)} -> {format_size(after)}")
+        elif args.command == 'path':
+            print(store.path(args.patent_number) or f"{args.patent_number} is not in the store")
+            return
+        elif args.command == 'gc':
+            print(f"Deleted {store.gc()} unreferenced files")
+        summary = store.summary()
+        print(f"Store {args.store}: {summary['patents']} patents, {summary['objects']} distinct PDFs "
+              f"({format_size(summary['size'])}), {summary['packed']} packed, {format_size(summary['disk_size'])} on disk")
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
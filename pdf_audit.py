@@ -0,0 +1,253 @@
+"""
+Audit every downloaded PDF and list the patents that need downloading again
+
+Each file is classified (see pdf_verify.classify_pdf) as ok, empty, an
+HTML page saved as .pdf, not a PDF, truncated, or without pages. Files
+are checked in parallel worker processes, and results are cached in
+SQLite by (size, mtime), so a repeat audit only opens files that changed.
+Nothing is modified unless --quarantine or --catalog is given.
+
+Usage:
+    python pdf_audit.py [--patents-dir patents] [--output reports/redownload.txt] [--workers 8]
+                        [--report reports/pdf_audit.csv] [--quarantine] [--catalog patents/catalog.db]
+
+    python google_patent_downloader.py --file reports/redownload.txt
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from pdf_verify import STATUSES, STATUS_OK, classify_pdf
+
+DEFAULT_CACHE = os.path.join('patents', 'audit.db')
+QUARANTINE_DIR = 'quarantine'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    pages INTEGER,
+    reason TEXT,
+    checked_at REAL NOT NULL
+);
+"""
+
+
+def scan_pdfs(patents_dir):
+    """
+    List PDFs with their size and mtime, using the stat data os.scandir already has
+
+    Yields:
+        tuple: (str, int, int) - (file name, size, mtime in ns)
+    """
+    with os.scandir(patents_dir) as entries:
+        for entry in entries:
+            if entry.name.lower().endswith('.pdf') and entry.is_file():
+                stat = entry.stat()
+                yield entry.name, stat.st_size, stat.st_mtime_ns
+
+
+def audit_chunk(patents_dir, names, count_pages, full_parse):
+    """
+    Classify a chunk of files, run in a worker process
+
+    Returns:
+        list: (name, status, pages, reason) tuples
+    """
+    return [(name, *classify_pdf(os.path.join(patents_dir, name), count_pages, full_parse)) for name in names]
+
+
+class AuditCache:
+    def __init__(self, path=DEFAULT_CACHE):
+        """
+        Open (and create if needed) the audit result cache
+
+        Args:
+            path (str): Path to the SQLite database file
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def load(self):
+        """
+        Returns:
+            dict: name -> (size, mtime_ns, status, pages, reason)
+        """
+        return {row[0]: row[1:] for row in self.conn.execute(
+            'SELECT name, size, mtime_ns, status, pages, reason FROM audit')}
+
+    def save(self, rows):
+        """
+        Args:
+            rows (list): (name, size, mtime_ns, status, pages, reason) tuples
+        """
+        now = time.time()
+        self.conn.executemany('INSERT OR REPLACE INTO audit VALUES (?, ?, ?, ?, ?, ?, ?)',
+                              [(*row, now) for row in rows])
+        self.conn.commit()
+
+    def forget_missing(self, names):
+        """
+        Drop cached results for files that no longer exist
+        """
+        cached = {row[0] for row in self.conn.execute('SELECT name FROM audit')}
+        gone = [(name,) for name in cached - names]
+        self.conn.executemany('DELETE FROM audit WHERE name = ?', gone)
+        self.conn.commit()
+        return len(gone)
+
+    def close(self):
+        self.conn.close()
+
+
+def audit(patents_dir='patents', cache_path=DEFAULT_CACHE, workers=None, chunk_size=256,
+          count_pages=True, full_parse=True, recheck=False):
+    """
+    Classify every PDF in a directory, reusing cached results for unchanged files
+
+    Args:
+        patents_dir (str): Directory of downloaded PDFs
+        cache_path (str): Audit cache database, None disables the cache
+        workers (int): Worker processes, CPU count if None
+        chunk_size (int): Files per worker task
+        count_pages (bool): Read the page count of every PDF
+        full_parse (bool): Fully parse PDFs whose page count can't be read from the xref table
+        recheck (bool): Ignore cached results
+
+    Returns:
+        tuple: (list, int) - ((name, size, mtime_ns, status, pages, reason) for every file, files checked this run)
+    """
+    cache = AuditCache(cache_path) if cache_path else None
+    cached = cache.load() if cache and not recheck else {}
+    files = {name: (size, mtime_ns) for name, size, mtime_ns in scan_pdfs(patents_dir)}
+
+    results = []
+    stale = []
+    for name, (size, mtime_ns) in files.items():
+        previous = cached.get(name)
+        if previous and previous[0] == size and previous[1] == mtime_ns:
+            results.append((name, size, mtime_ns, *previous[2:]))
+        else:
+            stale.append(name)
+
+    print(f"{len(files)} PDFs in {patents_dir}, {len(files) - len(stale)} unchanged since the last audit, "
+          f"checking {len(stale)}")
+    chunks = (stale[i:i + chunk_size] for i in range(0, len(stale), chunk_size))
+    checked = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = set()
+        max_in_flight = 2 * (workers or os.cpu_count() or 1)
+
+        def collect(done):
+            nonlocal checked
+            rows = []
+            for future in done:
+                for name, status, pages, reason in future.result():
+                    rows.append((name, *files[name], status, pages, reason))
+            results.extend(rows)
+            if cache:
+                cache.save(rows)
+            checked += len(rows)
+            print(f"\rChecked {checked}/{len(stale)}", end='', flush=True)
+
+        for chunk in chunks:
+            if len(in_flight) >= max_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight.add(executor.submit(audit_chunk, patents_dir, chunk, count_pages, full_parse))
+        collect(in_flight)
+    if stale:
+        print()
+
+    if cache:
+        cache.forget_missing(set(files))
+        cache.close()
+    return results, checked
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Audit downloaded patent PDFs and list the ones to download again')
+    parser.add_argument('--patents-dir', default='patents', help='Directory of downloaded PDFs (default: patents)')
+    parser.add_argument('--output', default=os.path.join('reports', 'redownload.txt'),
+                        help='Patent numbers to download again, one per line (default: reports/redownload.txt)')
+    parser.add_argument('--report', help='Also write every file with its status and page count as CSV')
+    parser.add_argument('--cache', default=DEFAULT_CACHE, help=f'Audit result cache (default: {DEFAULT_CACHE})')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the audit cache')
+    parser.add_argument('--recheck', action='store_true', help='Check every file again, refreshing the cache')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=256, help='Files per worker task (default: 256)')
+    parser.add_argument('--no-pages', action='store_true', help='Only check header and trailer, skip the page count')
+    parser.add_argument('--fast', action='store_true',
+                        help='Never fully parse a PDF; files whose xref table cannot be read are reported ok without a page count')
+    parser.add_argument('--quarantine', action='store_true',
+                        help=f'Move bad files to <patents-dir>/{QUARANTINE_DIR}/ (truncated ones become .part files so the download resumes)')
+    parser.add_argument('--catalog', nargs='?', const='patents/catalog.db',
+                        help='Mark bad PDFs as failed in the SQLite catalog so the downloader fetches them again')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results, checked = audit(args.patents_dir, None if args.no_cache else args.cache, args.workers, args.chunk_size,
+                             not args.no_pages, not args.fast, args.recheck)
+    seconds = time.perf_counter() - start
+
+    counts = {}
+    bad = []
+    for name, size, mtime_ns, status, pages, reason in results:
+        counts[status] = counts.get(status, 0) + 1
+        if status != STATUS_OK:
+            bad.append((name, status, reason))
+    bad.sort()
+    print(f"Audited {len(results)} PDFs in {seconds:.1f}s ({checked} checked): "
+          + ', '.join(f"{status}={counts[status]}" for status in STATUSES if status in counts))
+
+    if args.report:
+        if os.path.dirname(args.report):
+            os.makedirs(os.path.dirname(args.report), exist_ok=True)
+        with open(args.report, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['file', 'size', 'status', 'pages', 'reason'])
+            for name, size, _, status, pages, reason in sorted(results):
+                writer.writerow([name, size, status, '' if pages is None else pages, reason])
+        print(f"Audit report written to: {args.report}")
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        for name, _, _ in bad:
+            f.write(os.path.splitext(name)[0] + '\n')
+    print(f"{len(bad)} patents to download again listed in: {args.output}")
+
+    if args.catalog and bad:
+        from patent_catalog import PatentCatalog
+        catalog = PatentCatalog(args.catalog)
+        for name, status, reason in bad:
+            catalog.mark_pdf_failed(os.path.splitext(name)[0], f"audit: {status}: {reason}")
+        catalog.close()
+        print(f"Marked {len(bad)} PDFs as failed in {args.catalog}")
+
+    if args.quarantine and bad:
+        quarantine_dir = os.path.join(args.patents_dir, QUARANTINE_DIR)
+        os.makedirs(quarantine_dir, exist_ok=True)
+        for name, status, _ in bad:
+            path = os.path.join(args.patents_dir, name)
+            part_path = path + '.part'
+            if status == 'truncated' and not os.path.exists(part_path):
+                os.replace(path, part_path)  # Resumed with a Range request on the next download
+            else:
+                os.replace(path, os.path.join(quarantine_dir, name))
+        print(f"Moved {len(bad)} bad files out of {args.patents_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,44 +1,138 @@
+"""
+Extract requirement rows from the tables of a PDF
+
+Every table on every selected page is extracted, rows are kept when
+their first cell matches --id-pattern, and pages are processed in
+parallel worker processes that each open the PDF themselves.
+
+Usage:
+    python pdf_extract.py [--input nv.pdf] [--pages 6-17,20 | --pages all] [--format tsv|csv|jsonl] [--output rows.csv]
+"""
+import argparse
+import csv
+import json
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
 import pdfplumber
 
-if False:
-    with pdfplumber.open("nv.pdf") as pdf:
-        first_page = pdf.pages[6].find_tables()
-        t1_content = first_page[0].extract(x_tolerance = 5)
-        t2_content = first_page[1].extract(x_tolerance = 5)
-        print(t1_content, '\n' ,t2_content)
-        exit()
-
-with pdfplumber.open(r'nv.pdf') as pdf:
-    for no in [ 5, 6, 7,8,9,10,11,12,13,14,15,16]:
-    #for no in [ 7,8]:
-        #my_page = pdf.pages[no]
-        #print(my_page.extract_text())
-        #print(my_page.extract_table())
-        #myTable=my_page.extract_table()
-        my_page=pdf.pages[no].find_tables()
-        #TODO, handle up to two tables in a page
-        myTable=[]
-        if len(my_page)>0:
-            t1_content = my_page[0].extract(x_tolerance = 5)
-            myTable=t1_content
-        if len(my_page)>1:
-            t2_content = my_page[1].extract(x_tolerance = 5)
-            myTable=myTable+t2_content
-        for row in myTable:
-            id_str=row[0].replace('\n', '') if len(row) > 1 and row[0] is not None else ""
-            fields=[id_str]
-            if id_str.startswith("SBIOS"):
-                for item in row[1:]:
-                    truncated_item_str=item.replace('\n', ' ')[:40] if item is not None else False
-                    fields.append(truncated_item_str) if item is not None else False
-
-                #print(f"page={no}, {fields[0]}, {fields[1]}, {fields[2]}")
-                print(f"{fields[0]}\t{fields[1]}\t{fields[2]}")
-                #spec_str=row[3].replace('\n', ' ') if len(row) > 6 and row[3] is not None else ""
-                #description_str=row[6].replace('\n', ' ') if len(row) > 6 and row[6] is not None else ""
-                #print(f"page={no}, {id_str}, {spec_str}, {description_str}, {row}")
-        #im =my_page.to_image(resolution=150)
-        #im.draw_rect(my_page.extract_words(), stroke_width=1)
-        #im.save('a.png', format="PNG", quantize=True, colors=256, bits=8)
-        #im.show()
+FORMATS = ['tsv', 'csv', 'jsonl']
+
+
+def parse_page_ranges(spec, page_count):
+    """
+    Parse a page selection such as '6-17,20' or 'all' (1-based, inclusive)
+
+    Args:
+        spec (str): Page selection
+        page_count (int): Pages in the document
+
+    Returns:
+        list: Sorted 1-based page numbers
+    """
+    if spec == 'all':
+        return list(range(1, page_count + 1))
+    pages = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            first = int(first) if first else 1
+            last = int(last) if last else page_count
+        else:
+            first = last = int(part)
+        if first < 1 or last > page_count or first > last:
+            raise ValueError(f"Page range '{part}' is outside 1-{page_count}")
+        pages.update(range(first, last + 1))
+    return sorted(pages)
+
+
+def extract_rows(pdf_path, page_numbers, id_pattern, x_tolerance=5):
+    """
+    Extract matching table rows from some pages, run in a worker process
+
+    Args:
+        pdf_path (str): Input PDF
+        page_numbers (list): 1-based page numbers
+        id_pattern (str): Regex the first cell of a row must match
+        x_tolerance (float): pdfplumber x_tolerance for cell text
+
+    Returns:
+        list: dict rows with page, table, id and cells
+    """
+    id_regex = re.compile(id_pattern)
+    rows = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_number in page_numbers:
+            page = pdf.pages[page_number - 1]
+            for table_index, table in enumerate(page.find_tables()):
+                for row in table.extract(x_tolerance=x_tolerance):
+                    id_str = row[0].replace('\n', '') if len(row) > 1 and row[0] is not None else ""
+                    if not id_regex.search(id_str):
+                        continue
+                    rows.append({
+                        'page': page_number,
+                        'table': table_index,
+                        'id': id_str,
+                        'cells': [item.replace('\n', ' ') if item is not None else '' for item in row[1:]],
+                    })
+            page.flush_cache()  # Keep memory flat on long documents
+    return rows
+
+
+def iter_rows(pdf_path, page_numbers, id_pattern, workers=None, chunk_pages=10, x_tolerance=5):
+    """
+    Extract rows from page chunks in parallel, yielding them in page order
+
+    Yields:
+        dict: Row with page, table, id and cells
+    """
+    chunks = [page_numbers[i:i + chunk_pages] for i in range(0, len(page_numbers), chunk_pages)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(extract_rows, pdf_path, chunk, id_pattern, x_tolerance) for chunk in chunks]
+        for future in futures:
+            yield from future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract requirement rows from PDF tables')
+    parser.add_argument('--input', default='nv.pdf', help='Input PDF (default: nv.pdf)')
+    parser.add_argument('--pages', default='all', help="1-based pages such as '6-17,20', or 'all' (default: all)")
+    parser.add_argument('--id-pattern', default=r'^SBIOS', help='Regex the first cell must match (default: ^SBIOS)')
+    parser.add_argument('--format', choices=FORMATS, default='tsv', help='Output format (default: tsv)')
+    parser.add_argument('--output', help='Write rows to this file instead of stdout')
+    parser.add_argument('--truncate', type=int, default=0, help='Truncate cells to this many characters (default: no truncation)')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--chunk-pages', type=int, default=10, help='Pages per worker task (default: 10)')
+    parser.add_argument('--x-tolerance', type=float, default=5, help='pdfplumber x_tolerance (default: 5)')
+    args = parser.parse_args()
+
+    with pdfplumber.open(args.input) as pdf:
+        page_count = len(pdf.pages)
+    page_numbers = parse_page_ranges(args.pages, page_count)
+
+    output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    writer = csv.writer(output) if args.format == 'csv' else None
+    count = 0
+    try:
+        for row in iter_rows(args.input, page_numbers, args.id_pattern, args.workers, args.chunk_pages, args.x_tolerance):
+            if args.truncate:
+                row['cells'] = [cell[:args.truncate] for cell in row['cells']]
+            if args.format == 'jsonl':
+                output.write(json.dumps(row, ensure_ascii=False) + '\n')
+            elif args.format == 'csv':
+                writer.writerow([row['page'], row['table'], row['id'], *row['cells']])
+            else:
+                output.write('\t'.join([row['id'], *row['cells']]) + '\n')
+            count += 1
+    finally:
+        if args.output:
+            output.close()
+    print(f"Extracted {count} rows from {len(page_numbers)} pages", file=sys.stderr)
+
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,523 @@
+"""
+Remove the watermark from the embedded page images of a PDF, without rasterizing it
+
+Scanned patent and spec PDFs are usually one image per page. Instead of
+rendering every page, cleaning the pixels and rebuilding a new PDF from
+JPEGs (remove_watermark.py + img_2_pdf.py), this reads each image XObject
+at its native resolution, applies the same watermark mask
+(remove_watermark.watermark_mask) and writes the changed images back into
+a copy of the file. Text, fonts, bookmarks, links and all other objects
+are copied as they are, streams without being decoded.
+
+Supported images are 8-bit gray or RGB, stored as JPEG (DCTDecode, written
+back with the original quantization tables so the second encode loses as
+little as possible) or with lossless filters (Flate, LZW, ASCII85,
+ASCIIHex, RunLength, also chained, written back as Flate with PNG
+predictors). Other images (1-bit fax/JBIG2 scans, CMYK, indexed, JPEG 2000)
+are left alone. They cannot hold the gray watermark, or the pixel rules
+do not apply to them.
+
+By default the copy is a rewrite: every object is written once and the
+cross-reference table is rebuilt, so the output is about the size of the
+input. With incremental=True the original bytes are kept and only the
+changed images are appended as an incremental update, which is faster for
+large files but keeps the watermarked originals in the previous revision
+and roughly adds their size again.
+
+Usage:
+    python remove_watermark.py --mode images --input nv.pdf [--output nv_clean.pdf] [--band] [--incremental]
+"""
+import io
+import math
+import os
+import shutil
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+from PIL import Image, JpegImagePlugin
+from pdfminer.pdfdocument import PDFDocument, PDFXRefFallback
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import PDFObjectNotFound, PDFObjRef, PDFStream, resolve1
+from pdfminer.psparser import PSKeyword, PSLiteral
+
+from remove_watermark import BAND_HIGH, BAND_LOW, BAND_SLOPE, DEFAULT_RULES, band_mask, watermark_mask
+
+RENDER_DPI = 200  # Resolution the judge() band coordinates were measured at
+COMPONENTS = {'DeviceGray': 1, 'CalGray': 1, 'DeviceRGB': 3, 'CalRGB': 3}
+PNG_COLOR_TYPES = {1: 0, 3: 2}  # Components -> PNG color type (gray, truecolor)
+DCT_FILTERS = {'DCTDecode', 'DCT'}
+FLATE_FILTERS = {'FlateDecode', 'Fl'}
+# Lossless filters pdfminer decodes, in any chain and with any predictor
+LOSSLESS_FILTERS = FLATE_FILTERS | {'LZWDecode', 'LZW', 'ASCII85Decode', 'A85', 'ASCIIHexDecode', 'AHx',
+                                    'RunLengthDecode', 'RL'}
+
+
+def literal_name(value):
+    value = resolve1(value)
+    if isinstance(value, PSLiteral):
+        name = value.name
+        return name.decode('latin-1') if isinstance(name, bytes) else name
+    return None
+
+
+def color_components(color_space):
+    """
+    Returns:
+        int: Components of a gray or RGB color space, None for any other
+    """
+    name = literal_name(color_space)
+    if name:
+        return COMPONENTS.get(name)
+    color_space = resolve1(color_space)
+    if isinstance(color_space, list) and color_space:
+        family = literal_name(color_space[0])
+        if family == 'ICCBased' and len(color_space) > 1:
+            profile = resolve1(color_space[1])
+            components = resolve1(profile.get('N')) if isinstance(profile, PDFStream) else None
+            return components if components in (1, 3) else None
+        return COMPONENTS.get(family)
+    return None
+
+
+def image_spec(stream):
+    """
+    Check whether an image XObject can be cleaned
+
+    Returns:
+        tuple: (dict, str) - (decoding parameters, None) or (None, reason it is skipped)
+    """
+    if resolve1(stream.get('ImageMask')):
+        return None, 'image mask'
+    if resolve1(stream.get('BitsPerComponent')) != 8:
+        return None, 'not 8-bit'
+    if stream.get('Decode') is not None:
+        return None, 'custom decode array'
+    components = color_components(stream.get('ColorSpace'))
+    if components is None:
+        return None, 'color space'
+    filters = [(literal_name(name), resolve1(parms) or {}) for name, parms in stream.get_filters()]
+    names = [name for name, _ in filters]
+    width, height = resolve1(stream.get('Width')), resolve1(stream.get('Height'))
+    spec = {'width': width, 'height': height, 'components': components}
+    if names and names[-1] in DCT_FILTERS:
+        if filters[-1][1]:
+            return None, 'JPEG decode parameters'
+        if not set(names[:-1]) <= LOSSLESS_FILTERS:
+            return None, f"filter chain {' '.join(names)}"
+        # Outer filters (usually ASCII85) are undone by pdfminer, the JPEG itself is passed through
+        return dict(spec, filter='dct', decoded=len(names) > 1), None
+    if len(names) == 1 and names[0] in FLATE_FILTERS:
+        parms = filters[0][1]
+        if (resolve1(parms.get('Predictor')) or 1) >= 10 and (resolve1(parms.get('Colors')) or 1) == components \
+                and (resolve1(parms.get('BitsPerComponent')) or 8) == 8 and (resolve1(parms.get('Columns')) or 1) == width:
+            return dict(spec, filter='flate-png', decoded=False), None
+    if set(names) <= LOSSLESS_FILTERS:
+        return dict(spec, filter='raw', decoded=True), None
+    return None, f"filter {' '.join(names)}"
+
+
+def image_data(stream, spec):
+    """
+    Returns:
+        bytes: The stream data clean_image() expects for spec, the stream itself is left undecoded
+    """
+    if not spec['decoded']:
+        return stream.get_rawdata()
+    # pdfminer drops the raw data of a decoded stream, decode a copy so the original can still be written out
+    return PDFStream(stream.attrs, stream.get_rawdata()).get_data()
+
+
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def decode_image(data, spec):
+    """
+    Returns:
+        tuple: (np.ndarray, PIL.Image) - HxW or HxWx3 pixels, and the decoded JPEG (None for lossless images)
+    """
+    width, height, components = spec['width'], spec['height'], spec['components']
+    if spec['filter'] == 'dct':
+        img = Image.open(io.BytesIO(data))
+        if img.mode not in ('L', 'RGB'):
+            raise ValueError(f"JPEG mode {img.mode}")
+        return np.array(img), img
+    if spec['filter'] == 'flate-png':
+        # PDF PNG predictors are PNG scanline filters, so wrapping the data in a PNG lets PIL undo them
+        header = struct.pack('>IIBBBBB', width, height, 8, PNG_COLOR_TYPES[components], 0, 0, 0)
+        png = b'\x89PNG\r\n\x1a\n' + png_chunk(b'IHDR', header) + png_chunk(b'IDAT', data) + png_chunk(b'IEND', b'')
+        return np.array(Image.open(io.BytesIO(png))), None
+    size = width * height * components
+    if len(data) < size:
+        raise ValueError('image data too short')
+    pixels = np.frombuffer(data, dtype=np.uint8, count=size).copy()
+    return pixels.reshape((height, width, components) if components == 3 else (height, width)), None
+
+
+def encode_image(pixels, spec, jpeg):
+    """
+    Returns:
+        tuple: (bytes, str) - (stream data, PDF filter entries)
+    """
+    if spec['filter'] == 'dct':
+        out = io.BytesIO()
+        # Reuse the original quantization tables and subsampling instead of picking a quality
+        subsampling = JpegImagePlugin.get_sampling(jpeg)
+        Image.fromarray(pixels).save(out, 'JPEG', qtables=jpeg.quantization,
+                                     subsampling=subsampling if subsampling != -1 else 0, optimize=True)
+        return out.getvalue(), '/Filter /DCTDecode'
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, 'PNG', compress_level=6)
+    png = out.getvalue()
+    idat = []
+    position = 8
+    while position < len(png):
+        length, kind = struct.unpack('>I4s', png[position:position + 8])
+        if kind == b'IDAT':
+            idat.append(png[position + 8:position + 8 + length])
+        position += 12 + length
+    parms = (f"/DecodeParms << /Predictor 15 /Colors {spec['components']} /BitsPerComponent 8 "
+             f"/Columns {spec['width']} >>")
+    return b''.join(idat), f'/Filter /FlateDecode {parms}'
+
+
+def clean_image(data, spec, rules=DEFAULT_RULES, band_scale=None):
+    """
+    Remove the watermark from one encoded image, run in a worker process
+
+    Args:
+        data (bytes): Image stream data from image_data()
+        spec (dict): Decoding parameters from image_spec()
+        rules (list): Watermark rules, see remove_watermark.watermark_mask
+        band_scale (float): Image pixels per 200 dpi page pixel, only clean inside the judge() band if given
+
+    Returns:
+        tuple: (bytes, str, int) - (new stream data, filter entries, pixels cleaned), None if no pixel changed
+    """
+    pixels, jpeg = decode_image(data, spec)
+    height, width = pixels.shape[:2]
+    rgb = pixels if pixels.ndim == 3 else np.broadcast_to(pixels[..., None], (height, width, 3))
+    mask = watermark_mask(rgb, rules)
+    if band_scale:
+        mask &= band_mask(height, width, BAND_SLOPE, BAND_LOW * band_scale, BAND_HIGH * band_scale)
+    cleaned = int(np.count_nonzero(mask))
+    if not cleaned:
+        return None
+    pixels[mask] = 255
+    new_data, filters = encode_image(pixels, spec, jpeg)
+    return new_data, filters, cleaned
+
+
+class PdfValueWriter:
+    def __init__(self, document):
+        """
+        Serialize pdfminer objects back to PDF syntax
+
+        Args:
+            document (PDFDocument): Document the objects come from, for generation numbers
+        """
+        self.document = document
+
+    def generation(self, object_id):
+        for xref in self.document.xrefs:
+            try:
+                return xref.get_pos(object_id)[2]
+            except KeyError:
+                continue
+        return 0
+
+    def name(self, value):
+        if isinstance(value, bytes):
+            value = value.decode('latin-1')
+        # Delimiters, whitespace and '#' are written as #xx escapes
+        return '/' + ''.join(c if 33 <= ord(c) <= 126 and c not in '()<>[]{}/%#' else f'#{ord(c):02x}' for c in value)
+
+    def value(self, value):
+        if value is None:
+            return 'null'
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        if isinstance(value, int):
+            return str(value)
+        if isinstance(value, float):
+            return f'{value:.6f}'.rstrip('0').rstrip('.')
+        if isinstance(value, PSLiteral):
+            return self.name(value.name)
+        if isinstance(value, PSKeyword):
+            return value.name.decode('latin-1') if isinstance(value.name, bytes) else value.name
+        if isinstance(value, PDFObjRef):
+            return f'{value.objid} {self.generation(value.objid)} R'
+        if isinstance(value, str):
+            value = value.encode('latin-1', 'replace')
+        if isinstance(value, bytes):
+            return f'<{value.hex()}>'
+        if isinstance(value, list):
+            return '[' + ' '.join(self.value(item) for item in value) + ']'
+        if isinstance(value, dict):
+            return '<< ' + ' '.join(f'{self.name(key)} {self.value(item)}' for key, item in value.items()) + ' >>'
+        raise ValueError(f"Cannot write PDF value of type {type(value).__name__}")
+
+
+def find_images(document, first_page=1, last_page=None):
+    """
+    Collect the image XObjects drawn on a page range, including those inside form XObjects
+
+    Yields:
+        tuple: (PDFStream, float) - (image, page width in points)
+    """
+    seen = set()
+
+    def walk(resources, page_width):
+        xobjects = resolve1(resolve1(resources or {}).get('XObject')) or {}
+        for ref in xobjects.values():
+            if not isinstance(ref, PDFObjRef) or ref.objid in seen:
+                continue
+            seen.add(ref.objid)
+            xobject = resolve1(ref)
+            if not isinstance(xobject, PDFStream):
+                continue
+            subtype = literal_name(xobject.get('Subtype'))
+            if subtype == 'Image':
+                yield xobject, page_width
+            elif subtype == 'Form':
+                yield from walk(xobject.get('Resources'), page_width)
+
+    for number, page in enumerate(PDFPage.create_pages(document), 1):
+        if number < first_page:
+            continue
+        if last_page and number > last_page:
+            break
+        mediabox = page.mediabox or [0, 0, 612, 792]
+        yield from walk(page.resources, abs(mediabox[2] - mediabox[0]))
+
+
+def trailer_entries(document):
+    """
+    Returns:
+        dict: Root, Info and ID from the newest trailer that has them, and the largest Size
+    """
+    entries = {}
+    size = 0
+    for xref in document.xrefs:
+        trailer = xref.get_trailer()
+        size = max(size, resolve1(trailer.get('Size')) or 0)
+        for key in ('Root', 'Info', 'ID'):
+            if key not in entries and key in trailer:
+                entries[key] = trailer[key]
+    entries['Size'] = size
+    return entries
+
+
+def last_startxref(path):
+    """
+    Returns:
+        tuple: (int, bool) - (offset of the newest cross-reference section, True if it is a classic xref table)
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 4096))
+        tail = f.read()
+        index = tail.rfind(b'startxref')
+        if index < 0:
+            raise ValueError('no startxref')
+        offset = int(tail[index + 9:].split()[0])
+        f.seek(offset)
+        return offset, f.read(32).lstrip().startswith(b'xref')
+
+
+def append_update(output_pdf, objects, trailer, writer, prev_offset, classic):
+    """
+    Append replaced objects and their cross-reference section to a PDF
+
+    Args:
+        output_pdf (str): PDF to append to, a copy of the original
+        objects (list): (object id, generation, dictionary, data) for each replaced stream
+        trailer (dict): Trailer entries from trailer_entries()
+        writer (PdfValueWriter): Serializer for the trailer values
+        prev_offset (int): Offset of the original newest cross-reference section
+        classic (bool): Write an xref table (True) or an xref stream, matching the original
+    """
+    offsets = {}
+    with open(output_pdf, 'r+b') as f:
+        f.seek(0, os.SEEK_END)
+        f.write(b'\n')
+        for object_id, generation, dictionary, data in objects:
+            offsets[object_id] = (f.tell(), generation)
+            f.write(f'{object_id} {generation} obj\n<< {dictionary} /Length {len(data)} >>\nstream\n'.encode('latin-1'))
+            f.write(data)
+            f.write(b'\nendstream\nendobj\n')
+
+        entries = ' '.join(f'/{key} {writer.value(trailer[key])}' for key in ('Root', 'Info', 'ID') if key in trailer)
+        xref_offset = f.tell()
+        if classic:
+            f.write(b'xref\n')
+            for object_id in sorted(offsets):
+                offset, generation = offsets[object_id]
+                f.write(f'{object_id} 1\n{offset:010d} {generation:05d} n \n'.encode('ascii'))
+            f.write(f"trailer\n<< /Size {trailer['Size']} {entries} /Prev {prev_offset} >>\n".encode('latin-1'))
+        else:
+            # The xref stream is a new object, listed in itself
+            stream_id = trailer['Size']
+            offsets[stream_id] = (xref_offset, 0)
+            width = max(4, math.ceil(xref_offset.bit_length() / 8))
+            rows = b''.join(b'\x01' + offsets[object_id][0].to_bytes(width, 'big') + offsets[object_id][1].to_bytes(2, 'big')
+                            for object_id in sorted(offsets))
+            index = ' '.join(f'{object_id} 1' for object_id in sorted(offsets))
+            f.write(f"{stream_id} 0 obj\n<< /Type /XRef /Size {stream_id + 1} /W [1 {width} 2] /Index [{index}] "
+                    f"{entries} /Prev {prev_offset} /Length {len(rows)} >>\nstream\n".encode('latin-1'))
+            f.write(rows)
+            f.write(b'\nendstream\nendobj\n')
+        f.write(f'startxref\n{xref_offset}\n%%EOF\n'.encode('ascii'))
+
+
+def write_pdf(document, output_pdf, objects, trailer, writer, version):
+    """
+    Write every object of a parsed PDF to a new file, substituting the replaced streams
+
+    Objects inside object streams are written as plain objects and the
+    cross-reference table is rebuilt as a classic xref table.
+
+    Args:
+        document (PDFDocument): Parsed original, its file must still be open
+        output_pdf (str): PDF to write
+        objects (list): (object id, generation, dictionary, data) for each replaced stream
+        trailer (dict): Trailer entries from trailer_entries()
+        writer (PdfValueWriter): Serializer for the object values
+        version (str): PDF header version, e.g. '1.4'
+    """
+    replaced = {object_id: (dictionary, data) for object_id, _, dictionary, data in objects}
+    object_ids = set()
+    for xref in document.xrefs:
+        object_ids.update(xref.get_objids())
+    offsets = {}
+    with open(output_pdf, 'wb') as f:
+        f.write(f'%PDF-{version}\n%\xe2\xe3\xcf\xd3\n'.encode('latin-1'))
+        for object_id in sorted(object_ids):
+            if object_id in replaced:
+                dictionary, data = replaced[object_id]
+            else:
+                try:
+                    obj = document.getobj(object_id)
+                except PDFObjectNotFound:
+                    continue
+                if isinstance(obj, PDFStream):
+                    # The cross-reference table is rebuilt and object streams are unpacked
+                    if literal_name(obj.get('Type')) in ('XRef', 'ObjStm'):
+                        continue
+                    dictionary = ' '.join(f'{writer.name(key)} {writer.value(value)}' for key, value in obj.attrs.items()
+                                          if key != 'Length')
+                    data = obj.get_rawdata()
+                else:
+                    dictionary, data = None, writer.value(obj).encode('latin-1')
+            generation = writer.generation(object_id)
+            offsets[object_id] = (f.tell(), generation)
+            f.write(f'{object_id} {generation} obj\n'.encode('ascii'))
+            if dictionary is None:
+                f.write(data)
+            else:
+                f.write(f'<< {dictionary} /Length {len(data)} >>\nstream\n'.encode('latin-1'))
+                f.write(data)
+                f.write(b'\nendstream')
+            f.write(b'\nendobj\n')
+
+        size = max(offsets, default=0) + 1
+        xref_offset = f.tell()
+        rows = [b'0000000000 65535 f \n']
+        for object_id in range(1, size):
+            offset, generation = offsets.get(object_id, (0, 0))
+            rows.append(f'{offset:010d} {generation:05d} {"n" if object_id in offsets else "f"} \n'.encode('ascii'))
+        f.write(f'xref\n0 {size}\n'.encode('ascii') + b''.join(rows))
+        entries = ' '.join(f'/{key} {writer.value(trailer[key])}' for key in ('Root', 'Info', 'ID') if key in trailer)
+        f.write(f'trailer\n<< /Size {size} {entries} >>\nstartxref\n{xref_offset}\n%%EOF\n'.encode('latin-1'))
+
+
+def pdf_version(path):
+    """
+    Returns:
+        str: Version from the %PDF- header, '1.4' if it cannot be read
+    """
+    with open(path, 'rb') as f:
+        header = f.read(1024)
+    index = header.find(b'%PDF-')
+    version = header[index + 5:index + 8].decode('latin-1') if index >= 0 else ''
+    return version if len(version) == 3 and version[0].isdigit() and version[2].isdigit() else '1.4'
+
+
+def clean_pdf_images(input_pdf, output_pdf, rules=DEFAULT_RULES, band=False, workers=None,
+                     first_page=1, last_page=None, incremental=False):
+    """
+    Remove the watermark from the page images of a PDF, writing a cleaned copy
+
+    Args:
+        input_pdf (str): Input PDF
+        output_pdf (str): Output PDF
+        rules (list): Watermark rules, see remove_watermark.watermark_mask
+        band (bool): Only clean inside the judge() diagonal band, scaled to each image
+        workers (int): Worker processes, CPU count if None
+        first_page (int): First page whose images are cleaned
+        last_page (int): Last page, inclusive (default: last page of the PDF)
+        incremental (bool): Append the cleaned images to a copy of the input instead of rewriting it
+
+    Returns:
+        dict: images found, images and pixels cleaned, and skipped images per reason
+    """
+    stats = {'images': 0, 'cleaned': 0, 'pixels': 0, 'skipped': {}}
+    replaced = []
+    with open(input_pdf, 'rb') as f:
+        document = PDFDocument(PDFParser(f))
+        if document.encryption:
+            raise ValueError('encrypted PDFs are not supported')
+        if incremental and any(isinstance(xref, PDFXRefFallback) for xref in document.xrefs):
+            raise ValueError('damaged cross-reference table, an incremental update needs a valid one')
+        writer = PdfValueWriter(document)
+        workers = max(1, workers or os.cpu_count() or 1)
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            in_flight = {}
+
+            def collect(done):
+                for future in done:
+                    image = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        reason = f"decode error: {str(e)}"
+                        stats['skipped'][reason] = stats['skipped'].get(reason, 0) + 1
+                        continue
+                    if result is None:
+                        continue
+                    data, filters, pixels = result
+                    # Keep every entry of the original image dictionary except its encoding
+                    kept = ' '.join(f'{writer.name(key)} {writer.value(value)}' for key, value in image.attrs.items()
+                                    if key not in ('Length', 'Filter', 'DecodeParms', 'DL'))
+                    replaced.append((image.objid, writer.generation(image.objid), f'{kept} {filters}', data))
+                    stats['cleaned'] += 1
+                    stats['pixels'] += pixels
+
+            for image, page_width in find_images(document, first_page, last_page):
+                stats['images'] += 1
+                spec, reason = image_spec(image)
+                if spec is None:
+                    stats['skipped'][reason] = stats['skipped'].get(reason, 0) + 1
+                    continue
+                band_scale = spec['width'] / (page_width / 72.0 * RENDER_DPI) if band else None
+                if len(in_flight) >= 2 * workers:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight[executor.submit(clean_image, image_data(image, spec), spec, rules, band_scale)] = image
+            collect(list(in_flight))
+        trailer = trailer_entries(document)
+        replaced.sort()
+        if not incremental:
+            write_pdf(document, output_pdf, replaced, trailer, writer, pdf_version(input_pdf))
+            return stats
+
+    prev_offset, classic = last_startxref(input_pdf)
+    shutil.copyfile(input_pdf, output_pdf)
+    if replaced:
+        append_update(output_pdf, replaced, trailer, writer, prev_offset, classic)
+    return stats
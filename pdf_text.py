@@ -0,0 +1,163 @@
+"""
+Extract text from a PDF, using the native text layer wherever it is usable
+
+Pages whose text layer pdfplumber can read are extracted directly. Only
+scanned/image-only pages go through the raster + watermark + OCR path
+(remove_watermark.clean_pages and img_ocr.ocr_pages).
+
+Usage:
+    python pdf_text.py [--input nv.pdf] [--output sbios_text.txt] [--work-dir rr] [--workers N]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pdfplumber
+
+from img_ocr import DEFAULT_CACHE_DIR, OCR_BACKENDS, ocr_pages
+from remove_watermark import DEFAULT_RULES, RULES, clean_pages
+
+MIN_CHARS = 50          # Fewer characters than this is treated as no text layer
+MIN_READABLE = 0.8      # Share of letters, digits, punctuation and spaces in a usable layer
+
+
+def usable_text(text, min_chars=MIN_CHARS, min_readable=MIN_READABLE):
+    """
+    Decide whether an extracted text layer is real text
+
+    Scanned pages have no (or almost no) text, and fonts without a
+    unicode map come out as (cid:NN) or control characters.
+
+    Args:
+        text (str): Text extracted from the page
+        min_chars (int): Minimum non-space characters
+        min_readable (float): Minimum share of readable characters
+
+    Returns:
+        bool: True if the text can be used instead of OCR
+    """
+    if not text:
+        return False
+    stripped = ''.join(text.split())
+    if len(stripped) < min_chars or '(cid:' in text:
+        return False
+    readable = sum(1 for c in stripped if c.isprintable() and c != '�')
+    return readable / len(stripped) >= min_readable
+
+
+def extract_native(pdf_path, page_numbers, min_chars=MIN_CHARS):
+    """
+    Extract the text layer of some pages, run in a worker process
+
+    Args:
+        pdf_path (str): Input PDF
+        page_numbers (list): 1-based page numbers
+        min_chars (int): See usable_text()
+
+    Returns:
+        list: (page_number, text or None if the page needs OCR)
+    """
+    results = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_number in page_numbers:
+            page = pdf.pages[page_number - 1]
+            text = page.extract_text()
+            results.append((page_number, text if usable_text(text, min_chars) else None))
+            page.flush_cache()  # Keep memory flat on long documents
+    return results
+
+
+def route_pages(pdf_path, workers=None, min_chars=MIN_CHARS, chunk_pages=20, executor=None):
+    """
+    Extract native text for every page, in parallel page chunks
+
+    Args:
+        executor (ProcessPoolExecutor): Pool to run the chunks on, reused across PDFs;
+            a pool of `workers` processes is started for this PDF if None
+
+    Returns:
+        dict: page_number -> text, or None for pages that need OCR
+    """
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return route_pages(pdf_path, workers, min_chars, chunk_pages, executor)
+    with pdfplumber.open(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+    chunks = [list(range(first, min(first + chunk_pages, page_count + 1)))
+              for first in range(1, page_count + 1, chunk_pages)]
+    texts = {}
+    for results in executor.map(extract_native, [pdf_path] * len(chunks), chunks, [min_chars] * len(chunks)):
+        texts.update(results)
+    return texts
+
+
+def ocr_fallback(pdf_path, page_numbers, work_dir, dpi=200, workers=None, rules=DEFAULT_RULES, band=False,
+                 backend='tesseract', lang='eng', config='', cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Rasterize, clean and OCR only the given pages
+
+    Returns:
+        dict: page_number -> OCR text
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(clean_pages, pdf_path, page_number, page_number, work_dir, dpi, 'png', 75, rules, band)
+                   for page_number in page_numbers]
+        image_paths = [future.result()[0] for future in futures]
+    texts = {}
+    results = ocr_pages(image_paths, OCR_BACKENDS[backend], backend, lang, config, workers, cache_dir)
+    for page_number, (_, text, _) in zip(page_numbers, results):
+        texts[page_number] = text
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract PDF text natively, falling back to OCR for scanned pages')
+    parser.add_argument('--input', default='nv.pdf', help='Input PDF (default: nv.pdf)')
+    parser.add_argument('--output', help='Write text to this file instead of stdout')
+    parser.add_argument('--work-dir', default='rr', help='Directory for cleaned images of OCR pages (default: rr)')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--min-chars', type=int, default=MIN_CHARS, help=f'Minimum characters for a usable text layer (default: {MIN_CHARS})')
+    parser.add_argument('--force-ocr', action='store_true', help='Ignore the text layer and OCR every page')
+    parser.add_argument('--dpi', type=int, default=200, help='Rasterization resolution for OCR pages (default: 200)')
+    parser.add_argument('--rules', nargs='+', choices=RULES, default=DEFAULT_RULES, help='Watermark pixel rules (default: range)')
+    parser.add_argument('--band', action='store_true', help='Only clean inside the diagonal watermark band')
+    parser.add_argument('--backend', choices=list(OCR_BACKENDS), default='tesseract', help='OCR backend (default: tesseract)')
+    parser.add_argument('--lang', default='eng', help='Tesseract language (default: eng)')
+    parser.add_argument('--config', default='', help='Extra tesseract config')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.force_ocr:
+        with pdfplumber.open(args.input) as pdf:
+            texts = {page_number: None for page_number in range(1, len(pdf.pages) + 1)}
+    else:
+        texts = route_pages(args.input, args.workers, args.min_chars)
+    native_seconds = time.perf_counter() - start
+
+    ocr_pages_needed = sorted(page_number for page_number, text in texts.items() if text is None)
+    start = time.perf_counter()
+    if ocr_pages_needed:
+        texts.update(ocr_fallback(args.input, ocr_pages_needed, args.work_dir, args.dpi, args.workers,
+                                  args.rules, args.band, args.backend, args.lang, args.config))
+    ocr_seconds = time.perf_counter() - start
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for page_number in sorted(texts):
+            print(texts[page_number], file=output)
+    finally:
+        if args.output:
+            output.close()
+
+    native = len(texts) - len(ocr_pages_needed)
+    print(f"{len(texts)} pages: {native} native text ({native_seconds:.1f}s), "
+          f"{len(ocr_pages_needed)} OCR ({ocr_seconds:.1f}s)", file=sys.stderr)
+    if ocr_pages_needed:
+        print(f"OCR pages: {', '.join(str(page_number) for page_number in ocr_pages_needed)}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
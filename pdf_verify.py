@@ -0,0 +1,210 @@
+import os
+import re
+
+PDF_HEADER = b'%PDF-'
+PDF_TRAILER = b'%%EOF'
+TRAILER_WINDOW = 1024  # %%EOF may be followed by whitespace or a little junk
+
+
+def read_pdf_markers(path):
+    """
+    Read the size of a file and whether it has the PDF header and trailer
+
+    Args:
+        path (str): Path to the file
+
+    Returns:
+        tuple: (int, bool, bool) - (size, has_header, has_trailer)
+
+    Raises:
+        OSError: If the file cannot be read
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.read(len(PDF_HEADER))
+        f.seek(max(0, size - TRAILER_WINDOW))
+        tail = f.read()
+    return size, header == PDF_HEADER, PDF_TRAILER in tail
+
+
+def verify_pdf_file(path, expected_size=None):
+    """
+    Check that a file looks like a complete PDF
+
+    Args:
+        path (str): Path to the file
+        expected_size (int): Size announced by the server, None if unknown
+
+    Returns:
+        tuple: (bool, str) - (is_valid, reason when invalid)
+    """
+    try:
+        size, has_header, has_trailer = read_pdf_markers(path)
+    except OSError as e:
+        return False, str(e)
+
+    if expected_size is not None and size != expected_size:
+        return False, f"size {size} does not match expected {expected_size}"
+    if not has_header:
+        return False, "missing %PDF- header"
+    if not has_trailer:
+        return False, "missing %%EOF trailer"
+    return True, ''
+
+
+# Audit results, worst first
+STATUS_OK = 'ok'
+STATUSES = ['unreadable', 'empty', 'html', 'not_pdf', 'truncated', 'no_pages', STATUS_OK]
+XREF_READ_LIMIT = 16 * 1024 * 1024  # Give up on cross-reference tables larger than this
+
+STARTXREF = re.compile(rb'startxref\s+(\d+)')
+XREF_SUBSECTION = re.compile(rb'\s*(\d+) +(\d+)\s*[\r\n]+')
+XREF_ENTRY = re.compile(rb'(\d{10}) (\d{5}) ([nf])')
+TRAILER_ROOT = re.compile(rb'/Root\s+(\d+)\s+\d+\s+R')
+TRAILER_PREV = re.compile(rb'/Prev\s+(\d+)')
+CATALOG_PAGES = re.compile(rb'/Pages\s+(\d+)\s+\d+\s+R')
+PAGES_COUNT = re.compile(rb'/Count\s+(\d+)')
+
+
+def read_xref_sections(f, size, offset):
+    """
+    Read classic cross-reference tables, following /Prev to older sections
+
+    Args:
+        f (file): PDF opened in binary mode
+        size (int): File size
+        offset (int): Offset of the newest xref table (from startxref)
+
+    Returns:
+        tuple: (dict, int) - (object number -> offset, root object number), or (None, None)
+               for cross-reference streams (PDF 1.5+) and damaged tables
+    """
+    objects = {}
+    root = None
+    seen = set()
+    while offset is not None and offset not in seen and 0 <= offset < size:
+        seen.add(offset)
+        f.seek(offset)
+        data = f.read(65536)
+        while b'trailer' not in data and len(data) < XREF_READ_LIMIT:
+            more = f.read(1024 * 1024)
+            if not more:
+                break
+            data += more
+        if not data.startswith(b'xref') or b'trailer' not in data:
+            return None, None
+        table, _, trailer = data[4:].partition(b'trailer')
+
+        position = 0
+        while True:
+            subsection = XREF_SUBSECTION.match(table, position)
+            if not subsection:
+                break
+            first, count = int(subsection.group(1)), int(subsection.group(2))
+            position = subsection.end()
+            for number in range(first, first + count):
+                entry = XREF_ENTRY.match(table, position)
+                if not entry:
+                    return None, None
+                position = entry.end()
+                while position < len(table) and table[position] in b' \r\n':
+                    position += 1
+                if entry.group(3) == b'n':
+                    objects.setdefault(number, int(entry.group(1)))  # Newer sections win
+
+        trailer = trailer[:trailer.find(b'>>') + 2] if b'>>' in trailer else trailer
+        if root is None:
+            match = TRAILER_ROOT.search(trailer)
+            root = int(match.group(1)) if match else None
+        match = TRAILER_PREV.search(trailer)
+        offset = int(match.group(1)) if match else None
+    return objects, root
+
+
+def read_object(f, offset, length=4096):
+    f.seek(offset)
+    data = f.read(length)
+    end = data.find(b'endobj')
+    return data if end < 0 else data[:end]
+
+
+def pdf_page_count(path):
+    """
+    Page count from the document catalog, reading only the xref table and two objects
+
+    Much cheaper than a full parse, but only understands classic xref
+    tables; callers can fall back to a full parser when None is returned.
+
+    Args:
+        path (str): Path to the PDF
+
+    Returns:
+        int: Page count, None if it could not be determined this way
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        f.seek(max(0, size - TRAILER_WINDOW))
+        matches = STARTXREF.findall(f.read())
+        if not matches:
+            return None
+        objects, root = read_xref_sections(f, size, int(matches[-1]))
+        if not objects or root not in objects:
+            return None
+        match = CATALOG_PAGES.search(read_object(f, objects[root]))
+        if not match or int(match.group(1)) not in objects:
+            return None
+        match = PAGES_COUNT.search(read_object(f, objects[int(match.group(1))]))
+        return int(match.group(1)) if match else None
+
+
+def full_page_count(path):
+    """
+    Page count from a full parse with pdfplumber, for xref streams and damaged files
+
+    Returns:
+        int: Page count, None if the file cannot be parsed
+    """
+    import pdfplumber
+    try:
+        with pdfplumber.open(path) as pdf:
+            return len(pdf.pages)
+    except Exception:
+        return None
+
+
+def classify_pdf(path, count_pages=True, full_parse=False):
+    """
+    Classify a downloaded file without modifying it
+
+    Args:
+        path (str): Path to the file
+        count_pages (bool): Also read the page count (catches files with a valid trailer but no pages)
+        full_parse (bool): Fall back to a full parse when the fast page count fails
+
+    Returns:
+        tuple: (str, int, str) - (status from STATUSES, page count or None, reason)
+    """
+    try:
+        size, has_header, has_trailer = read_pdf_markers(path)
+        if size == 0:
+            return 'empty', None, 'file is empty'
+        if not has_header:
+            with open(path, 'rb') as f:
+                start = f.read(512).lstrip().lower()
+            if start.startswith((b'<!doctype', b'<html', b'<?xml', b'<head', b'<body')):
+                return 'html', None, 'HTML page saved as PDF'
+            return 'not_pdf', None, "missing %PDF- header"
+        if not has_trailer:
+            return 'truncated', None, "missing %%EOF trailer"
+        if not count_pages:
+            return STATUS_OK, None, ''
+        pages = pdf_page_count(path)
+        if pages is None and full_parse:
+            pages = full_page_count(path)
+            if pages is None:
+                return 'no_pages', None, 'PDF structure cannot be parsed'
+        if pages == 0:
+            return 'no_pages', 0, 'document has no pages'
+        return STATUS_OK, pages, ''
+    except OSError as e:
+        return 'unreadable', None, str(e)
@@ -0,0 +1,433 @@
+"""
+Run the whole document flow as one pipeline with stage-level caching
+
+Stages (per document):
+    source        PDF path, or download it by patent number; hashed for the cache keys
+    pages         remove_watermark: PDF -> cleaned page images (stale pages only)
+    pdf           img_2_pdf: page images -> no_watermark.pdf
+    text          img_ocr: page images -> text (per-page OCR cache)
+    requirements  post_ocr: text -> SBIOS records
+    tables        pdf_extract: PDF -> table rows
+
+Every stage output is keyed by a hash of its inputs' keys and its own
+options, recorded in <out-dir>/<document>/manifest.json. A stage whose
+key and outputs are unchanged is skipped. Independent stages and
+documents run concurrently, and a timing summary is printed at the end.
+
+Usage:
+    python pipeline.py --pdf nv.pdf [--patents US1234567B2 ...] [--out-dir pipeline_out] [--stages pages pdf text]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import pdfplumber
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import PDFObjRef, PDFStream
+
+from img_2_pdf import FITS, PAGE_SIZES, images_to_pdf
+from img_ocr import DEFAULT_CACHE_DIR, OCR_BACKENDS, ocr_pages
+from patent_catalog import file_sha256
+from pdf_extract import iter_rows, parse_page_ranges
+from post_ocr import DEFAULT_ID_PATTERN, DEFAULT_STRIP_RULES, clean_lines, dedupe_records, parse_records
+from remove_watermark import DEFAULT_RULES, RULES, clean_pages
+
+STAGE_VERSION = 1  # Bump to invalidate every cached stage output
+BACK_REFERENCES = {'Parent', 'P'}  # Page tree and annotation back links, not part of what a page draws
+
+
+def make_key(*parts):
+    return hashlib.sha256(json.dumps([STAGE_VERSION, *parts], sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class Document:
+    def __init__(self, name, out_dir, pdf_path=None, patent_number=None):
+        """
+        One document flowing through the pipeline
+
+        Args:
+            name (str): Document name, used for its output directory
+            out_dir (str): Pipeline output root
+            pdf_path (str): Source PDF, or where a downloaded patent will be
+            patent_number (str): Patent to download if pdf_path doesn't exist
+        """
+        self.name = name
+        self.pdf_path = pdf_path
+        self.patent_number = patent_number
+        self.dir = os.path.join(out_dir, name)
+        os.makedirs(self.dir, exist_ok=True)
+        self.manifest_path = os.path.join(self.dir, 'manifest.json')
+        self.lock = threading.Lock()
+        self.keys = {}  # Stage name -> key for this run
+        self.downloader = None  # Downloader shared by every document, set by run_pipeline
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    def path(self, *parts):
+        return os.path.join(self.dir, *parts)
+
+    def is_fresh(self, stage, key):
+        entry = self.manifest.get(stage)
+        return bool(entry) and entry['key'] == key and all(os.path.exists(path) for path in entry['outputs'])
+
+    def record(self, stage, key, outputs):
+        with self.lock:
+            self.manifest[stage] = {'key': key, 'outputs': outputs, 'finished_at': time.time()}
+            tmp_path = self.manifest_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f, indent=2)
+            os.replace(tmp_path, self.manifest_path)
+
+
+# Stage functions take (document, options) and return (key, outputs, ran).
+# Keys only depend on upstream keys and options, so a stage can tell it is
+# fresh without looking at upstream outputs.
+
+def run_source(doc, options):
+    if not os.path.exists(doc.pdf_path) and doc.patent_number:
+        if not doc.downloader.download_pdf(doc.patent_number):
+            raise RuntimeError(f"Could not download patent {doc.patent_number}")
+    key = file_sha256(doc.pdf_path)
+    return key, [doc.pdf_path], False
+
+
+def feed_object(sha256, value, seen):
+    """
+    Hash a pdfminer object by value, following references, so renumbered objects hash the same
+    """
+    if isinstance(value, PDFObjRef):
+        if value.objid in seen:
+            sha256.update(b'<cycle>')
+            return
+        seen.add(value.objid)
+        value = value.resolve()
+    if isinstance(value, PDFStream):
+        feed_object(sha256, value.attrs, seen)
+        sha256.update(value.get_rawdata() or b'')
+    elif isinstance(value, dict):
+        for key in sorted(value):
+            if key not in BACK_REFERENCES:
+                sha256.update(f'/{key}'.encode('utf-8'))
+                feed_object(sha256, value[key], seen)
+    elif isinstance(value, list):
+        sha256.update(b'[')
+        for item in value:
+            feed_object(sha256, item, seen)
+        sha256.update(b']')
+    else:
+        sha256.update(repr(value).encode('utf-8'))
+
+
+def page_hashes(pdf_path):
+    """
+    Hash what each page draws: its content streams, resources, boxes and rotation
+
+    Returns:
+        list: sha256 hex digest per page, in page order
+    """
+    hashes = []
+    with open(pdf_path, 'rb') as f:
+        document = PDFDocument(PDFParser(f))
+        for page in PDFPage.create_pages(document):
+            sha256 = hashlib.sha256()
+            feed_object(sha256, page.attrs, set())  # Inherited attributes are already merged in
+            hashes.append(sha256.hexdigest())
+    return hashes
+
+
+def run_pages(doc, options):
+    """
+    Render and clean the pages that changed
+
+    Every page is keyed on its own content hash and the render options, so
+    after the source PDF changes only the pages that differ are rendered
+    again. A page whose content moved (pages inserted or removed before it)
+    reuses the image rendered for its old position.
+    """
+    key = make_key('pages', doc.keys['source'], options.dpi, options.rules, options.band)
+    pages_dir = doc.path('pages')
+    if doc.is_fresh('pages', key):
+        return key, doc.manifest['pages']['outputs'], False
+
+    os.makedirs(pages_dir, exist_ok=True)
+    page_keys = [make_key('page', page_hash, options.dpi, options.rules, options.band)
+                 for page_hash in page_hashes(doc.pdf_path)]
+    page_count = len(page_keys)
+
+    # Per-page keys let an interrupted run pick up where it stopped
+    index_path = os.path.join(pages_dir, 'pages.json')
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            rendered = json.load(f)  # Page number -> key of the image on disk
+    except (OSError, ValueError):
+        rendered = {}
+    outputs = [os.path.join(pages_dir, f'img{page}.jpg') for page in range(1, page_count + 1)]
+    existing = {page_key: os.path.join(pages_dir, f'img{page}.jpg') for page, page_key in rendered.items()
+                if os.path.exists(os.path.join(pages_dir, f'img{page}.jpg'))}
+    rendered = {page: page_key for page, page_key in rendered.items() if int(page) <= page_count}
+    stale = [page for page in range(1, page_count + 1)
+             if rendered.get(str(page)) != page_keys[page - 1] or not os.path.exists(outputs[page - 1])]
+
+    # Reuse images of pages that only moved; copy them all aside first, a source may be overwritten
+    moved = {page: existing[page_keys[page - 1]] for page in stale if page_keys[page - 1] in existing}
+    for page, source in moved.items():
+        shutil.copyfile(source, outputs[page - 1] + '.tmp')
+    for page in moved:
+        os.replace(outputs[page - 1] + '.tmp', outputs[page - 1])
+        rendered[str(page)] = page_keys[page - 1]
+    stale = [page for page in stale if page not in moved]
+
+    with ProcessPoolExecutor(max_workers=options.workers) as executor:
+        futures = {executor.submit(clean_pages, doc.pdf_path, page, page, pages_dir, options.dpi, 'jpg', 75,
+                                   options.rules, options.band): page for page in stale}
+        for done, future in enumerate(futures, 1):
+            future.result()
+            rendered[str(futures[future])] = page_keys[futures[future] - 1]
+            if done % 20 == 0:
+                with open(index_path, 'w', encoding='utf-8') as f:
+                    json.dump(rendered, f)
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(rendered, f)
+    return key, outputs, True
+
+
+def run_pdf(doc, options):
+    key = make_key('pdf', doc.keys['pages'], options.page_size, options.fit)
+    output = doc.path('no_watermark.pdf')
+    if doc.is_fresh('pdf', key):
+        return key, [output], False
+    images_to_pdf(doc.manifest['pages']['outputs'], output, options.page_size, options.fit, verbose=False)
+    return key, [output], True
+
+
+def run_text(doc, options):
+    key = make_key('text', doc.keys['pages'], options.ocr_backend, options.lang, options.ocr_config)
+    output = doc.path('text.txt')
+    if doc.is_fresh('text', key):
+        return key, [output], False
+    with open(output, 'w', encoding='utf-8') as f:
+        for _, text, _ in ocr_pages(doc.manifest['pages']['outputs'], OCR_BACKENDS[options.ocr_backend],
+                                    options.ocr_backend, options.lang, options.ocr_config, options.workers,
+                                    options.ocr_cache_dir):
+            f.write(text + '\n')
+    return key, [output], True
+
+
+def run_requirements(doc, options):
+    key = make_key('requirements', doc.keys['text'], options.id_pattern, DEFAULT_STRIP_RULES)
+    output = doc.path('requirements.jsonl')
+    if doc.is_fresh('requirements', key):
+        return key, [output], False
+    stats = {'duplicates': 0, 'conflicts': 0}
+    with open(doc.path('text.txt'), 'r', encoding='utf-8') as source, open(output, 'w', encoding='utf-8') as f:
+        for record in dedupe_records(parse_records(clean_lines(source), options.id_pattern), stats):
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    return key, [output], True
+
+
+def run_tables(doc, options):
+    key = make_key('tables', doc.keys['source'], options.table_pages, options.table_id_pattern)
+    output = doc.path('tables.jsonl')
+    if doc.is_fresh('tables', key):
+        return key, [output], False
+    with pdfplumber.open(doc.pdf_path) as pdf:
+        page_numbers = parse_page_ranges(options.table_pages, len(pdf.pages))
+    with open(output, 'w', encoding='utf-8') as f:
+        for row in iter_rows(doc.pdf_path, page_numbers, options.table_id_pattern, options.workers):
+            f.write(json.dumps(row, ensure_ascii=False) + '\n')
+    return key, [output], True
+
+
+# Stage name -> (dependencies, function)
+STAGES = {
+    'source': ([], run_source),
+    'pages': (['source'], run_pages),
+    'pdf': (['pages'], run_pdf),
+    'text': (['pages'], run_text),
+    'requirements': (['text'], run_requirements),
+    'tables': (['source'], run_tables),
+}
+
+
+def with_dependencies(stages):
+    """
+    Add every stage the requested ones depend on
+
+    Returns:
+        list: Stage names in STAGES order
+    """
+    needed = set()
+
+    def add(stage):
+        if stage not in needed:
+            needed.add(stage)
+            for dependency in STAGES[stage][0]:
+                add(dependency)
+
+    for stage in stages:
+        add(stage)
+    return [stage for stage in STAGES if stage in needed]
+
+
+def make_downloader(options):
+    """
+    Build the downloader shared by every patent document, throttled like google_patent_downloader.py
+
+    Returns:
+        GooglePatentDownloader: Downloader with one rate limiter for all pipeline jobs
+    """
+    from google_patent_downloader import GooglePatentDownloader
+    from http_client import HostRateLimiter
+
+    host_rates = {}
+    if options.page_rate is not None:
+        host_rates['patents.google.com'] = options.page_rate
+    if options.pdf_rate is not None:
+        host_rates['patentimages.storage.googleapis.com'] = options.pdf_rate
+    rate_limiter = HostRateLimiter(default_rate=1.0 / options.delay if options.delay > 0 else None, host_rates=host_rates)
+    return GooglePatentDownloader(rate_limiter=rate_limiter)
+
+
+def run_pipeline(documents, stages, options, jobs=4):
+    """
+    Run the stages of every document, starting each stage as soon as its dependencies finish
+
+    Patent documents share one downloader, so its rate limits hold across
+    all concurrent jobs; it is closed when the pipeline finishes.
+
+    Args:
+        documents (list): Document objects
+        stages (list): Stage names to produce (dependencies are added)
+        options (argparse.Namespace): Stage options
+        jobs (int): Stages run at the same time across all documents
+
+    Returns:
+        list: (document name, stage, seconds, 'ran' | 'cached' | 'failed') timings
+    """
+    stages = with_dependencies(stages)
+    timings = []
+    remaining = {(doc.name, stage): doc for doc in documents for stage in stages}
+    done = set()
+    failed = set()
+    downloader = None
+    if 'source' in stages and any(doc.patent_number for doc in documents):
+        downloader = make_downloader(options)
+        for doc in documents:
+            doc.downloader = downloader
+
+    def timed(doc, stage):
+        start = time.perf_counter()
+        key, outputs, ran = STAGES[stage][1](doc, options)
+        seconds = time.perf_counter() - start
+        doc.keys[stage] = key
+        if ran or stage == 'source':
+            doc.record(stage, key, outputs)
+        return seconds, ran
+
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            running = {}
+            while remaining or running:
+                for name, stage in list(remaining):
+                    doc = remaining[(name, stage)]
+                    dependencies = [(name, dependency) for dependency in STAGES[stage][0]]
+                    if any(dependency in failed for dependency in dependencies):
+                        del remaining[(name, stage)]
+                        failed.add((name, stage))
+                        timings.append((name, stage, 0.0, 'skipped'))
+                    elif all(dependency in done for dependency in dependencies):
+                        del remaining[(name, stage)]
+                        running[executor.submit(timed, doc, stage)] = (name, stage)
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, stage = running.pop(future)
+                    try:
+                        seconds, ran = future.result()
+                    except Exception as e:
+                        print(f"[{name}] {stage} failed: {str(e)}")
+                        failed.add((name, stage))
+                        timings.append((name, stage, 0.0, 'failed'))
+                        continue
+                    done.add((name, stage))
+                    status = 'ran' if ran else 'cached'
+                    timings.append((name, stage, seconds, status))
+                    print(f"[{name}] {stage} {status} in {seconds:.2f}s")
+    finally:
+        if downloader:
+            downloader.close()
+    return timings
+
+
+def print_summary(timings):
+    print(f"\n{'document':<24} {'stage':<14} {'status':<8} {'seconds':>9}")
+    for name, stage, seconds, status in timings:
+        print(f"{name:<24} {stage:<14} {status:<8} {seconds:>9.2f}")
+
+    totals = {}
+    for _, stage, seconds, status in timings:
+        total = totals.setdefault(stage, [0.0, 0, 0])
+        total[0] += seconds
+        total[1] += status == 'ran'
+        total[2] += status == 'cached'
+    print(f"\n{'stage':<14} {'ran':>5} {'cached':>7} {'seconds':>9}")
+    for stage in STAGES:
+        if stage in totals:
+            seconds, ran, cached = totals[stage]
+            print(f"{stage:<14} {ran:>5} {cached:>7} {seconds:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the document pipeline with stage-level caching')
+    parser.add_argument('--pdf', nargs='+', default=[], help='Source PDF files')
+    parser.add_argument('--patents', nargs='+', default=[], help='Patent numbers, downloaded into patents/ if missing')
+    parser.add_argument('--out-dir', default='pipeline_out', help='Output root, one directory per document (default: pipeline_out)')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=['pdf', 'requirements', 'tables'],
+                        help='Stages to produce, dependencies are added (default: pdf requirements tables)')
+    parser.add_argument('--jobs', type=int, default=4, help='Stages running at the same time (default: 4)')
+    parser.add_argument('--workers', type=int, help='Worker processes inside each stage (default: CPU count)')
+    parser.add_argument('--delay', type=float, default=2, help='Minimum seconds between requests to the same host when downloading patents (default: 2)')
+    parser.add_argument('--page-rate', type=float, help='Max requests per second to patents.google.com (overrides --delay)')
+    parser.add_argument('--pdf-rate', type=float, help='Max requests per second to patentimages.storage.googleapis.com (overrides --delay)')
+    parser.add_argument('--dpi', type=int, default=200, help='Rasterization resolution (default: 200)')
+    parser.add_argument('--rules', nargs='+', choices=RULES, default=DEFAULT_RULES, help='Watermark pixel rules (default: range)')
+    parser.add_argument('--band', action='store_true', help='Only clean inside the diagonal watermark band')
+    parser.add_argument('--page-size', choices=list(PAGE_SIZES), default='a4', help='Page size of the rebuilt PDF (default: a4)')
+    parser.add_argument('--fit', choices=FITS, default='contain', help='Image placement in the rebuilt PDF (default: contain)')
+    parser.add_argument('--ocr-backend', choices=list(OCR_BACKENDS), default='tesseract', help='OCR backend (default: tesseract)')
+    parser.add_argument('--lang', default='eng', help='Tesseract language (default: eng)')
+    parser.add_argument('--ocr-config', default='', help='Extra tesseract config')
+    parser.add_argument('--ocr-cache-dir', default=DEFAULT_CACHE_DIR, help=f'OCR result cache (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--id-pattern', default=DEFAULT_ID_PATTERN, help='Requirement ID regex for the requirements stage')
+    parser.add_argument('--table-pages', default='all', help="Pages for the tables stage, e.g. '6-17' (default: all)")
+    parser.add_argument('--table-id-pattern', default=r'^SBIOS', help='First-cell regex for the tables stage (default: ^SBIOS)')
+    args = parser.parse_args()
+
+    documents = []
+    for pdf_path in args.pdf:
+        documents.append(Document(os.path.splitext(os.path.basename(pdf_path))[0], args.out_dir, pdf_path))
+    for patent_number in args.patents:
+        documents.append(Document(patent_number, args.out_dir, os.path.join('patents', f"{patent_number}.pdf"), patent_number))
+    if not documents:
+        parser.error('give at least one --pdf or --patents')
+
+    start = time.perf_counter()
+    timings = run_pipeline(documents, args.stages, args, args.jobs)
+    print_summary(timings)
+    print(f"\nPipeline finished in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
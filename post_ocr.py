@@ -1,17 +1,261 @@
-#TODO, use AI to do post process seems better
 """
-echo "RUN AI prompt:"
+Turn OCR text into structured SBIOS requirement records
 
-Read through the entire file and identify all lines that start with 'SBIOS-'
+Replaces the sed chain and the manual "AI prompt" step of tune_ocr.sh:
 
-For each matching line, extract and format two specific fields:
+1. Strip headers/footers (NVIDIA CONFIDENTIAL block, DG-11194-001_1.0,
+   blank lines and non-printable characters, configurable)
+2. Join wrapped lines back onto the requirement they belong to
+3. Extract 'SBIOS-<AREA>-<NNN>: description' records, deduplicated
+4. Optionally diff the records against a previous run
 
-First field: The SBIOS ID (e.g., 'SBIOS-CORE-010', 'SBIOS-SEC-001')
-Second field: The description that follows the ID
-Format the output so that:
+Everything streams line by line, so input size doesn't matter.
 
-Each SBIOS entry is on a new line
-The ID and description are on the same line, separated by a colon
-The format should be: 'SBIOS-ID: Description'
-Maintain the exact text of both the ID and description as they appear in the original file
+Usage:
+    python post_ocr.py sbios_text.txt [--output sbios_requirements.txt] [--format text|jsonl|csv]
+                       [--clean-output sbios_text_tune.txt] [--previous old_requirements.txt]
 """
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+
+# (pattern, number of following lines dropped with the match), as in tune_ocr.sh
+DEFAULT_STRIP_RULES = [
+    (r'NVIDIA CONFIDENTIAL', 2),
+    (r'DG-11194-001_1\.0', 0),
+]
+DEFAULT_ID_PATTERN = r'SBIOS-[A-Z0-9]+-\d+'
+SENTENCE_END = ('.', '!', '?', ';')
+FORMATS = ['text', 'jsonl', 'csv']
+# Control characters, zero-width/direction marks, BOM and the replacement character (tab is kept)
+NON_PRINTABLE = re.compile(r'[\x00-\x08\x0a-\x1f\x7f-\x9f\u200b-\u200f\u2028-\u202e\ufeff\ufffd]')
+
+
+def load_strip_rules(path):
+    """
+    Read strip rules from a JSON file: [{"pattern": "...", "drop_following": 2}, ...]
+
+    Returns:
+        list: (pattern, drop_following) tuples
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return [(rule['pattern'], rule.get('drop_following', 0)) for rule in json.load(f)]
+
+
+def clean_lines(lines, strip_rules=DEFAULT_STRIP_RULES):
+    """
+    Drop header/footer lines and non-printable characters
+
+    Blank lines are passed through as '' so the record parser can use them
+    as boundaries; they are dropped from the cleaned text output.
+
+    Args:
+        lines (iterable): Raw OCR lines
+        strip_rules (list): (pattern, drop_following) tuples
+
+    Yields:
+        str: Cleaned lines
+    """
+    compiled = [(re.compile(pattern), drop_following) for pattern, drop_following in strip_rules]
+    skip = 0
+    for line in lines:
+        if skip:
+            skip -= 1
+            continue
+        line = NON_PRINTABLE.sub('', line.rstrip('\r\n'))
+        matched = False
+        for regex, drop_following in compiled:
+            if regex.search(line):
+                skip = drop_following
+                matched = True
+                break
+        if matched:
+            continue
+        yield line if line.strip() else ''
+
+
+def parse_records(lines, id_pattern=DEFAULT_ID_PATTERN, join_wrapped=True, max_join=5):
+    """
+    Extract requirement records, joining wrapped description lines
+
+    A record starts at a line beginning with an ID. Following lines are
+    appended while the description has not ended a sentence, the line is
+    not blank and does not start another record.
+
+    Args:
+        lines (iterable): Cleaned lines
+        id_pattern (str): Regex for requirement IDs
+        join_wrapped (bool): Join continuation lines onto the description
+        max_join (int): Most continuation lines joined onto one record
+
+    Yields:
+        dict: {'id': ..., 'description': ...}
+    """
+    record_start = re.compile(rf'^\s*({id_pattern})\s*[:\-–—]?\s*(.*)$')
+    current = None
+    joined = 0
+    for line in lines:
+        match = record_start.match(line)
+        if match:
+            if current:
+                yield current
+            current = {'id': match.group(1), 'description': match.group(2).strip()}
+            joined = 0
+            continue
+        if current is None:
+            continue
+        text = line.strip()
+        if (not join_wrapped or not text or joined >= max_join
+                or current['description'].endswith(SENTENCE_END)):
+            yield current
+            current = None
+            continue
+        current['description'] = f"{current['description']} {text}".strip()
+        joined += 1
+    if current:
+        yield current
+
+
+def dedupe_records(records, stats):
+    """
+    Keep the first record for every ID
+
+    Args:
+        records (iterable): Parsed records
+        stats (dict): Updated with 'duplicates' and 'conflicts' counts
+
+    Yields:
+        dict: Unique records
+    """
+    seen = {}
+    for record in records:
+        previous = seen.get(record['id'])
+        if previous is None:
+            seen[record['id']] = record['description']
+            yield record
+            continue
+        stats['duplicates'] += 1
+        if previous != record['description']:
+            stats['conflicts'] += 1
+
+
+def read_records(path):
+    """
+    Read records written by a previous run in any of FORMATS
+
+    Returns:
+        dict: id -> description
+    """
+    records = {}
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    records[record['id']] = record['description']
+        elif path.endswith('.csv'):
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                if row:
+                    records[row[0]] = row[1]
+        else:
+            for line in f:
+                record_id, _, description = line.rstrip('\n').partition(': ')
+                if record_id:
+                    records[record_id] = description
+    return records
+
+
+def diff_records(previous, current):
+    """
+    Compare two id -> description mappings
+
+    Returns:
+        tuple: (list, list, list) - (added ids, removed ids, changed ids)
+    """
+    added = sorted(record_id for record_id in current if record_id not in previous)
+    removed = sorted(record_id for record_id in previous if record_id not in current)
+    changed = sorted(record_id for record_id in current
+                     if record_id in previous and previous[record_id] != current[record_id])
+    return added, removed, changed
+
+
+def write_records(records, output, output_format):
+    writer = None
+    if output_format == 'csv':
+        writer = csv.writer(output)
+        writer.writerow(['id', 'description'])
+    for record in records:
+        if output_format == 'jsonl':
+            output.write(json.dumps(record, ensure_ascii=False) + '\n')
+        elif output_format == 'csv':
+            writer.writerow([record['id'], record['description']])
+        else:
+            output.write(f"{record['id']}: {record['description']}\n")
+        yield record
+
+
+def tee_clean_text(lines, clean_output):
+    for line in lines:
+        if line:
+            clean_output.write(line + '\n')
+        yield line
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract SBIOS requirement records from OCR text')
+    parser.add_argument('input', nargs='?', default='sbios_text.txt', help='OCR text file, - for stdin (default: sbios_text.txt)')
+    parser.add_argument('--output', help='Records output file (default: stdout)')
+    parser.add_argument('--format', choices=FORMATS, help='Records format (default: from --output extension, else text)')
+    parser.add_argument('--clean-output', help='Also write the cleaned text (what the old sed chain produced)')
+    parser.add_argument('--rules', help='JSON file of strip rules replacing the defaults')
+    parser.add_argument('--strip', action='append', default=[], metavar='REGEX', help='Extra line pattern to drop (repeatable)')
+    parser.add_argument('--id-pattern', default=DEFAULT_ID_PATTERN, help=f'Requirement ID regex (default: {DEFAULT_ID_PATTERN})')
+    parser.add_argument('--no-join', action='store_true', help='Do not join wrapped lines onto records')
+    parser.add_argument('--max-join', type=int, default=5, help='Most wrapped lines joined onto one record (default: 5)')
+    parser.add_argument('--previous', help='Records from a previous run to diff against')
+    args = parser.parse_args()
+
+    output_format = args.format
+    if output_format is None:
+        extension = os.path.splitext(args.output or '')[1].lstrip('.')
+        output_format = extension if extension in ('jsonl', 'csv') else 'text'
+
+    strip_rules = load_strip_rules(args.rules) if args.rules else list(DEFAULT_STRIP_RULES)
+    strip_rules += [(pattern, 0) for pattern in args.strip]
+
+    source = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8', errors='replace')
+    output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    clean_output = open(args.clean_output, 'w', encoding='utf-8') if args.clean_output else None
+    stats = {'duplicates': 0, 'conflicts': 0}
+    current = {}
+    try:
+        lines = clean_lines(source, strip_rules)
+        if clean_output:
+            lines = tee_clean_text(lines, clean_output)
+        records = dedupe_records(parse_records(lines, args.id_pattern, not args.no_join, args.max_join), stats)
+        for record in write_records(records, output, output_format):
+            current[record['id']] = record['description']
+    finally:
+        for f in (source, output, clean_output):
+            if f not in (None, sys.stdin, sys.stdout):
+                f.close()
+
+    print(f"{len(current)} records, {stats['duplicates']} duplicates dropped "
+          f"({stats['conflicts']} with a different description)", file=sys.stderr)
+
+    if args.previous:
+        added, removed, changed = diff_records(read_records(args.previous), current)
+        print(f"Diff against {args.previous}: {len(added)} added, {len(removed)} removed, {len(changed)} changed",
+              file=sys.stderr)
+        for label, ids in (('+', added), ('-', removed), ('~', changed)):
+            for record_id in ids:
+                print(f"{label} {record_id}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
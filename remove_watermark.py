@@ -1,37 +1,42 @@
-from skimage import io
-from pdf2image import convert_from_path
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from functools import lru_cache
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image
 import numpy as np
 # imgs = io.imread('./test.png')
 # io.imsave('./hh.png',imgs)
 # imgs = np.array(imgs)
 # print(imgs.shape)
-# r = []
-# g = []
-# b = []
-# alpha = []
+
+# Pixel rules used to find the watermark, see handle()
+RULE_RANGE = 'range'  # select_pixel2: every channel strictly between RANGE_LOW and RANGE_HIGH
+RULE_GRAY = 'gray'    # select_pixel: exact watermark grays
+RULES = [RULE_RANGE, RULE_GRAY]
+DEFAULT_RULES = [RULE_RANGE]
+
+MODE_RASTER = 'raster'  # Render pages with pdf2image, save cleaned page images
+MODE_IMAGES = 'images'  # Clean embedded page images in place, see pdf_images.py
+MODES = [MODE_RASTER, MODE_IMAGES]
+
+RANGE_LOW = 175
+RANGE_HIGH = 250
+GRAY_VALUES = (208, 196, 206)
+
+# Diagonal band from judge(): BAND_LOW + slope * x < y < BAND_HIGH + slope * x
+BAND_SLOPE = -(600.0/1575.0)
+BAND_LOW = 1350
+BAND_HIGH = 1500
 
 def judge(x,y):
-    temp = -(600.0/1575.0) * x
-    if y > 1350 + temp and y < 1500 + temp:
+    temp = BAND_SLOPE * x
+    if y > BAND_LOW + temp and y < BAND_HIGH + temp:
         return True
     else:
         return False
 
-# for  i in range(imgs.shape[0]):
-#     for j in range(imgs.shape[1]):
-#         if not judge(j,i):
-#             continue
-#         if imgs[i][j][1] > 100 and imgs[i][j][1] < 250 and imgs[i][j][2] > 100 and imgs[i][j][2] < 250:
-#             imgs[i][j][0] =  imgs[i][j][1] = imgs[i][j][2] = 255
-#         if imgs[i][j][1] < 10 and imgs[i][j][2] < 100:
-#             imgs[i][j][0] =  imgs[i][j][1] = imgs[i][j][2] = 0 
-
-# io.imsave('./hh.png',imgs)
-# print(r)
-# print(g)
-# print(b)
-# print(alpha)
-
 def select_pixel(r,g,b):
     if (r == 208 and g == 208 and b == 208 ) or (r == 196 and g == 196 and b == 196) \
         or (r == 206 and g == 206 and b == 206 ):
@@ -43,26 +48,189 @@ def select_pixel2(r,g,b):
         return True
     else:
         return False
-def handle(imgs):
-    for  i in range(imgs.shape[0]):
-        for j in range(imgs.shape[1]):
-            # if not judge(j,i):
-            #     continue
-            # if imgs[i][j][1] > 100 and imgs[i][j][1] < 250 and imgs[i][j][2] > 100 and imgs[i][j][2] < 250:
-            if select_pixel2(imgs[i][j][0],imgs[i][j][1],imgs[i][j][2]):
-                imgs[i][j][0] =  imgs[i][j][1] = imgs[i][j][2] = 255
-            # if not select_pixel(imgs[i][j][0],imgs[i][j][1],imgs[i][j][2]):
-            #     imgs[i][j][0] =  imgs[i][j][1] = imgs[i][j][2] = 0 
+
+def range_mask(rgb, low=RANGE_LOW, high=RANGE_HIGH):
+    """
+    Vectorized select_pixel2 over a whole HxWx3 array
+
+    Returns:
+        np.ndarray: HxW boolean mask
+    """
+    if rgb.dtype == np.uint8:
+        # low < v < high as one unsigned compare, values <= low wrap around to large numbers
+        in_range = (rgb - np.uint8(low + 1)) < np.uint8(high - low - 1)
+    else:
+        in_range = (rgb > low) & (rgb < high)
+    return in_range[..., 0] & in_range[..., 1] & in_range[..., 2]
+
+def gray_mask(rgb, values=GRAY_VALUES):
+    """
+    Vectorized select_pixel: pixels whose three channels equal one of the gray values
+
+    Returns:
+        np.ndarray: HxW boolean mask
+    """
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    lookup = np.zeros(256, dtype=bool)
+    lookup[list(values)] = True
+    return (r == g) & (g == b) & lookup[r]
+
+@lru_cache(maxsize=8)
+def band_mask(height, width, slope=BAND_SLOPE, low=BAND_LOW, high=BAND_HIGH):
+    """
+    Vectorized judge(): the diagonal band the watermark is printed in
+
+    Pages of a document share a size, so the mask is cached per shape.
+
+    Returns:
+        np.ndarray: HxW boolean mask (shared, do not modify)
+    """
+    y, x = np.ogrid[:height, :width]
+    offset = slope * x
+    mask = (y > low + offset) & (y < high + offset)
+    mask.flags.writeable = False
+    return mask
+
+def watermark_mask(imgs, rules=DEFAULT_RULES, band=False):
+    """
+    Build the mask of watermark pixels for one page
+
+    Args:
+        imgs (np.ndarray): HxWx3 (or HxWx4) page image
+        rules (list): Any of RULES, a pixel matching one of them is watermark
+        band (bool): Only consider pixels inside the judge() diagonal band
+
+    Returns:
+        np.ndarray: HxW boolean mask
+    """
+    rgb = imgs[..., :3]
+    mask = None
+    for rule in rules:
+        if rule == RULE_RANGE:
+            rule_mask = range_mask(rgb)
+        elif rule == RULE_GRAY:
+            rule_mask = gray_mask(rgb)
+        else:
+            raise ValueError(f"Unknown watermark rule '{rule}', expected one of {RULES}")
+        mask = rule_mask if mask is None else mask | rule_mask
+    if mask is None:
+        mask = np.zeros(imgs.shape[:2], dtype=bool)
+    if band:
+        mask &= band_mask(*imgs.shape[:2])
+    return mask
+
+def handle(imgs, rules=DEFAULT_RULES, band=False):
+    """
+    Whiten watermark pixels in place using boolean masks over the whole page
+
+    Args:
+        imgs (np.ndarray): HxWx3 (or HxWx4) page image
+        rules (list): Any of RULES, see watermark_mask()
+        band (bool): Only clean inside the judge() diagonal band
+
+    Returns:
+        np.ndarray: The cleaned image
+    """
+    mask = watermark_mask(imgs, rules, band)
+    if imgs.shape[2] == 3:
+        imgs[mask] = 255
+    else:
+        imgs[mask, :3] = 255
     return imgs
 
-images = convert_from_path('./nv.pdf')
-# images = np.array(images)
-index = 0
-for img in images:
-    index += 1
-    img = np.array(img)
-    print(img.shape)
-    img = handle(img)
-    io.imsave('./rr/img'+str(index)+'.jpg', img)
-    # break
-    print(index)
\ No newline at end of file
+def clean_pages(pdf_path, first_page, last_page, output_dir, dpi=200, image_format='jpg',
+                quality=75, rules=DEFAULT_RULES, band=False):
+    """
+    Rasterize a page range, remove the watermark and save each page
+
+    Runs in a worker process, only this range is ever held in memory.
+
+    Args:
+        pdf_path (str): Input PDF
+        first_page (int): First page, 1-based
+        last_page (int): Last page, inclusive
+        output_dir (str): Directory for img<page>.<format> files
+        dpi (int): Rasterization resolution
+        image_format (str): 'jpg' or 'png'
+        quality (int): JPEG quality
+        rules (list): Watermark rules, see handle()
+        band (bool): Only clean inside the judge() diagonal band
+
+    Returns:
+        list: Paths of the saved pages
+    """
+    paths = []
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=first_page, last_page=last_page)
+    for index, img in enumerate(images, first_page):
+        img = handle(np.array(img), rules, band)
+        path = os.path.join(output_dir, f'img{index}.{image_format}')
+        if image_format == 'jpg':
+            Image.fromarray(img).save(path, quality=quality)
+        else:
+            Image.fromarray(img).save(path)
+        paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description='Remove the watermark from every page of a PDF')
+    parser.add_argument('--mode', choices=MODES, default=MODE_RASTER,
+                        help='raster: render pages and save cleaned images for img_2_pdf.py; images: clean the embedded '
+                             'page images at native resolution and write a copy of the PDF, keeping text (default: raster)')
+    parser.add_argument('--input', default='nv.pdf', help='Input PDF (default: nv.pdf)')
+    parser.add_argument('--output', help='Cleaned PDF written by --mode images (default: <input>_clean.pdf)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='With --mode images, append the cleaned images to a copy of the input instead of rewriting '
+                             'it; faster, but the watermarked originals stay in the file')
+    parser.add_argument('--output-dir', default='rr', help='Directory for cleaned page images (default: rr)')
+    parser.add_argument('--dpi', type=int, default=200, help='Rasterization resolution (default: 200)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes (default: CPU count)')
+    parser.add_argument('--chunk-pages', type=int, default=1, help='Pages rasterized per task (default: 1)')
+    parser.add_argument('--format', choices=['jpg', 'png'], default='jpg', help='Output image format (default: jpg)')
+    parser.add_argument('--quality', type=int, default=75, help='JPEG quality (default: 75)')
+    parser.add_argument('--rules', nargs='+', choices=RULES, default=DEFAULT_RULES, help='Watermark pixel rules (default: range)')
+    parser.add_argument('--band', action='store_true', help='Only clean inside the diagonal watermark band')
+    parser.add_argument('--first-page', type=int, default=1, help='First page to process (default: 1)')
+    parser.add_argument('--last-page', type=int, help='Last page to process (default: last page of the PDF)')
+    args = parser.parse_args()
+
+    if args.mode == MODE_IMAGES:
+        from pdf_images import clean_pdf_images
+        output = args.output or os.path.splitext(args.input)[0] + '_clean.pdf'
+        start = time.perf_counter()
+        stats = clean_pdf_images(args.input, output, args.rules, args.band, args.workers, args.first_page,
+                                 args.last_page, args.incremental)
+        print(f"Cleaned {stats['cleaned']} of {stats['images']} page images ({stats['pixels']} pixels) "
+              f"in {time.perf_counter() - start:.1f}s")
+        for reason, count in sorted(stats['skipped'].items()):
+            print(f"Skipped {count} images: {reason}")
+        print(f"Saved {output} ({os.path.getsize(output) / 1024:.0f} KB, input {os.path.getsize(args.input) / 1024:.0f} KB)")
+        return
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    page_count = pdfinfo_from_path(args.input)['Pages']
+    last_page = min(args.last_page or page_count, page_count)
+    ranges = [(first, min(first + args.chunk_pages - 1, last_page))
+              for first in range(args.first_page, last_page + 1, args.chunk_pages)]
+    workers = max(1, args.workers)
+    print(f"Cleaning pages {args.first_page}-{last_page} of {args.input} with {workers} workers")
+
+    # At most 2 * workers page ranges are rasterized or waiting to be written at any time
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = set()
+        for first, last in ranges:
+            if len(in_flight) >= 2 * workers:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    done += len(future.result())
+                    print(f"{done} pages done")
+            in_flight.add(executor.submit(clean_pages, args.input, first, last, args.output_dir, args.dpi,
+                                          args.format, args.quality, args.rules, args.band))
+        for future in as_completed(in_flight):
+            done += len(future.result())
+            print(f"{done} pages done")
+
+    print(f"Saved {done} cleaned pages to {args.output_dir}/")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+from patent_search import PatentSearchIndex
+
+
+def add(index, patent_number, publication_date):
+    index.add_patent({'patent_number': patent_number, 'title': 'Power supply', 'abstract': 'Backup power',
+                      'inventors': [], 'filing_date': 'N/A', 'publication_date': publication_date})
+    index.commit()
+
+
+def test_date_filter_excludes_undated_patents(tmp_path):
+    index = PatentSearchIndex(str(tmp_path / 'search.db'))
+    add(index, 'US1A', '2016-05-01')
+    add(index, 'US2A', '2010-01-01')
+    add(index, 'US3A', 'N/A')
+
+    assert [r['patent_number'] for r in index.search('power', date_from='2015-01-01')] == ['US1A']
+    assert [r['patent_number'] for r in index.search('power', date_to='2012-01-01')] == ['US2A']
+    assert {r['patent_number'] for r in index.search('power')} == {'US1A', 'US2A', 'US3A'}
+    index.close()
@@ -0,0 +1,48 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+
+from google_patent_downloader import GooglePatentDownloader
+from http_cache import HttpCache
+
+
+class AbortingHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # Announce a full PDF, send the first block and drop the connection
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', '100000')
+        self.end_headers()
+        self.wfile.write(b'%PDF-1.4\n' + b'0' * 1000)
+        self.wfile.flush()
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(('127.0.0.1', 0), AbortingHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_aborted_stream_leaves_no_spool_file(tmp_path, monkeypatch, server):
+    monkeypatch.chdir(tmp_path)
+    cache = HttpCache(str(tmp_path / 'cache'))
+    downloader = GooglePatentDownloader(max_retries=0, http_cache=cache)
+
+    with pytest.raises(requests.RequestException):
+        downloader.stream_pdf(f'{server}/US1A.pdf', str(tmp_path / 'US1A.pdf.part'))
+
+    assert os.listdir(cache.tmp_dir) == []
+    assert cache.summary()['entries'] == 0
+    downloader.close()
+    cache.close()
@@ -0,0 +1,428 @@
+"""
+Crash-safe work queue of patent numbers, shared by any number of downloader processes
+
+Each patent is one row in a SQLite (WAL) database. A worker leases a few
+patents at a time; while it works it renews the lease with a heartbeat,
+and when it finishes it marks each patent done or failed. A worker that
+crashes stops renewing, so its leases expire and other workers (or the
+same one after a restart) take those patents over. Failed patents are
+retried with exponential backoff, and after max_attempts they move to the
+dead state, where they stay until they are queued again by hand.
+
+SQLite locking relies on the file system: a local disk (or one machine's
+shared volume used by several containers) is safe. NFS and SMB mounts often
+have unreliable locks, so keep one queue database per machine there.
+
+Usage:
+    python work_queue.py enqueue input.txt [--db patents/queue.db]
+    python google_patent_downloader.py --queue [--workers 4]       # on as many machines/processes as needed
+    python work_queue.py stats
+    python work_queue.py requeue [--state dead]
+    python work_queue.py export --state dead [--output reports/dead.txt]
+"""
+import argparse
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+
+from patent_input import iter_patent_numbers, read_lines
+
+logger = logging.getLogger('patent_downloader')
+
+DEFAULT_QUEUE = os.path.join('patents', 'queue.db')
+STATES = ['queued', 'leased', 'done', 'dead']
+ENQUEUE_CHUNK = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    patent_number TEXT PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, available_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs (lease_expires) WHERE state = 'leased';
+"""
+
+
+def worker_id():
+    """
+    Returns:
+        str: Lease owner name unique to this process, e.g. host:1234:9f2c1a
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class WorkQueue:
+    def __init__(self, path=DEFAULT_QUEUE, lease_seconds=300, max_attempts=5, retry_delay=60):
+        """
+        Open (and create if needed) the work queue
+
+        Args:
+            path (str): Path to the SQLite database file
+            lease_seconds (float): How long a lease lasts without a heartbeat
+            max_attempts (int): Attempts before a patent is moved to the dead state
+            retry_delay (float): Seconds before the first retry, doubled for every further attempt
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        # One connection shared by the worker threads, serialized by a lock. Other
+        # processes wait up to 60s for the write lock instead of failing
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def transaction(self, sql, params=()):
+        # BEGIN IMMEDIATE takes the write lock up front, so read-then-update can't race another process
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self.conn.execute(sql, params).fetchall()
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+        return rows
+
+    def enqueue(self, patent_numbers):
+        """
+        Add patent numbers, ignoring ones already in the queue whatever their state
+
+        Args:
+            patent_numbers (iterable): Normalized patent numbers, may be a generator
+
+        Returns:
+            int: Patents added
+        """
+        patent_numbers = iter(patent_numbers)
+        added = 0
+        while True:
+            chunk = list(islice(patent_numbers, ENQUEUE_CHUNK))
+            if not chunk:
+                return added
+            now = time.time()
+            with self.lock:
+                self.conn.execute('BEGIN IMMEDIATE')
+                before = self.conn.total_changes
+                self.conn.executemany('INSERT OR IGNORE INTO jobs (patent_number, updated_at) VALUES (?, ?)',
+                                      [(patent_number, now) for patent_number in chunk])
+                added += self.conn.total_changes - before
+                self.conn.execute('COMMIT')
+
+    def lease(self, owner, count):
+        """
+        Lease up to count patents: expired leases first, then queued patents in insertion order
+
+        A patent whose lease expired max_attempts times (it keeps crashing
+        its worker) is moved to the dead state instead.
+
+        Args:
+            owner (str): Lease owner, see worker_id()
+            count (int): Maximum patents to lease
+
+        Returns:
+            list: Leased patent numbers
+        """
+        now = time.time()
+        self.transaction("UPDATE jobs SET state = 'dead', lease_owner = NULL, updated_at = ?, "
+                         "last_error = 'lease expired ' || attempts || ' times' "
+                         "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                         (now, now, self.max_attempts))
+        rows = self.transaction(
+            "UPDATE jobs SET state = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? "
+            "WHERE rowid IN ("
+            "SELECT rowid FROM jobs WHERE state = 'leased' AND lease_expires < ? "
+            "UNION ALL SELECT rowid FROM (SELECT rowid FROM jobs WHERE state = 'queued' AND available_at <= ? ORDER BY rowid) "
+            "LIMIT ?) RETURNING patent_number",
+            (owner, now + self.lease_seconds, now, now, now, count))
+        return [row[0] for row in rows]
+
+    def heartbeat(self, owner, patent_numbers):
+        """
+        Extend the leases this owner still holds
+
+        Returns:
+            set: Patent numbers whose lease was extended; others were taken over after expiring
+        """
+        if not patent_numbers:
+            return set()
+        now = time.time()
+        placeholders = ', '.join('?' for _ in patent_numbers)
+        rows = self.transaction(
+            f"UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE state = 'leased' AND lease_owner = ? "
+            f"AND patent_number IN ({placeholders}) RETURNING patent_number",
+            (now + self.lease_seconds, now, owner, *patent_numbers))
+        return {row[0] for row in rows}
+
+    def complete(self, owner, patent_number):
+        """
+        Mark a patent done if owner still holds its lease
+
+        Returns:
+            bool: False if the lease expired and was taken over, the result is then dropped
+        """
+        rows = self.transaction(
+            "UPDATE jobs SET state = 'done', lease_owner = NULL, lease_expires = NULL, last_error = NULL, "
+            "updated_at = ? WHERE patent_number = ? AND state = 'leased' AND lease_owner = ? RETURNING patent_number",
+            (time.time(), patent_number, owner))
+        return bool(rows)
+
+    def fail(self, owner, patent_number, error):
+        """
+        Record a failed attempt: retry later with backoff, or move to dead after max_attempts
+
+        Only applies while owner still holds the lease, so a late failure
+        can't requeue a patent another worker is already processing.
+
+        Returns:
+            str: The new state, 'queued' or 'dead', None if the lease was taken over
+        """
+        now = time.time()
+        rows = self.transaction(
+            "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'dead' ELSE 'queued' END, "
+            "available_at = ? + ? * (1 << (attempts - 1)), lease_owner = NULL, lease_expires = NULL, "
+            "last_error = ?, updated_at = ? WHERE patent_number = ? AND state = 'leased' AND lease_owner = ? RETURNING state",
+            (self.max_attempts, now, self.retry_delay, str(error), now, patent_number, owner))
+        return rows[0][0] if rows else None
+
+    def release(self, owner):
+        """
+        Give back every lease held by owner without counting the attempt, e.g. on Ctrl-C
+
+        Returns:
+            int: Patents queued again
+        """
+        rows = self.transaction(
+            "UPDATE jobs SET state = 'queued', attempts = MAX(attempts - 1, 0), lease_owner = NULL, "
+            "lease_expires = NULL, updated_at = ? WHERE state = 'leased' AND lease_owner = ? RETURNING patent_number",
+            (time.time(), owner))
+        return len(rows)
+
+    def requeue(self, state='dead'):
+        """
+        Queue every patent in a state again with a fresh attempt count
+
+        Returns:
+            int: Patents queued again
+        """
+        rows = self.transaction(
+            "UPDATE jobs SET state = 'queued', attempts = 0, available_at = 0, lease_owner = NULL, "
+            "lease_expires = NULL, updated_at = ? WHERE state = ? RETURNING patent_number", (time.time(), state))
+        return len(rows)
+
+    def outstanding(self):
+        """
+        Returns:
+            tuple: (int, float) - (queued or leased patents, seconds until the next one can be leased or None)
+        """
+        now = time.time()
+        with self.lock:
+            count = self.conn.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'leased')").fetchone()[0]
+            next_at = self.conn.execute(
+                "SELECT MIN(CASE state WHEN 'queued' THEN available_at ELSE lease_expires END) "
+                "FROM jobs WHERE state IN ('queued', 'leased')").fetchone()[0]
+        return count, None if next_at is None else max(0.0, next_at - now)
+
+    def counts(self):
+        """
+        Returns:
+            dict: state -> number of patents
+        """
+        with self.lock:
+            return dict(self.conn.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state'))
+
+    def numbers(self, state):
+        with self.lock:
+            return self.conn.execute('SELECT patent_number, last_error FROM jobs WHERE state = ? ORDER BY rowid',
+                                     (state,)).fetchall()
+
+
+class Heartbeat:
+    def __init__(self, queue, owner):
+        """
+        Renew the leases of the patents in progress from a background thread
+
+        Args:
+            queue (WorkQueue): The work queue
+            owner (str): Lease owner
+        """
+        self.queue = queue
+        self.owner = owner
+        self.held = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def add(self, patent_number):
+        with self.lock:
+            self.held.add(patent_number)
+
+    def discard(self, patent_number):
+        with self.lock:
+            self.held.discard(patent_number)
+
+    def run(self):
+        # Renew three times per lease period, so one late heartbeat doesn't lose the lease
+        while not self.stopped.wait(self.queue.lease_seconds / 3):
+            with self.lock:
+                held = list(self.held)
+            try:
+                lost = set(held) - self.queue.heartbeat(self.owner, held)
+            except sqlite3.Error as e:
+                logger.warning(f"Queue heartbeat failed: {str(e)}")
+                continue
+            for patent_number in lost:
+                logger.warning(f"Lease on {patent_number} expired and was taken over by another worker")
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+
+def drain(downloader, queue, workers=1, owner=None, wait_for_others=False, poll_interval=10):
+    """
+    Download patents leased from the queue until none are left
+
+    A patent counts as done only when its info and a verified PDF exist
+    afterwards; anything else is a failed attempt and is retried later.
+
+    Args:
+        downloader (GooglePatentDownloader): Downloader doing the work
+        queue (WorkQueue): The work queue
+        workers (int): Number of patents processed concurrently
+        owner (str): Lease owner, worker_id() if None
+        wait_for_others (bool): Keep polling while other workers hold leases or retries are pending,
+            so patents of crashed workers and late retries are picked up
+        poll_interval (float): Longest sleep between polls when waiting
+
+    Returns:
+        tuple: (int, int) - (succeeded, failed attempts)
+    """
+    workers = max(1, workers)
+    owner = owner or worker_id()
+    counts = {'succeeded': 0, 'failed': 0}
+
+    def work(patent_number):
+        patent_info = downloader.download_patent_info(patent_number)
+        if patent_info is None:
+            return 'patent page could not be fetched'
+        pdf_exists, info_exists = downloader.check_existing_files(patent_number)
+        if not (pdf_exists and info_exists):
+            return 'PDF download failed'
+        return None
+
+    def handle(future, patent_number):
+        try:
+            error = future.result()
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+        heartbeat.discard(patent_number)
+        if error is None:
+            if not queue.complete(owner, patent_number):
+                logger.warning(f"Lease on {patent_number} expired and was taken over, dropping the result")
+                return
+            counts['succeeded'] += 1
+        else:
+            state = queue.fail(owner, patent_number, error)
+            if state is None:
+                logger.warning(f"Lease on {patent_number} expired and was taken over, dropping the failure ({error})")
+                return
+            counts['failed'] += 1
+            downloader.metrics.count('queue_failures')
+            logger.error(f"Patent {patent_number} failed ({error}), {'gave up' if state == 'dead' else 'will retry'}")
+        logger.info(f"Processed {counts['succeeded'] + counts['failed']} patents from the queue")
+
+    logger.info(f"Draining work queue {queue.path} as {owner}")
+    in_flight = {}
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        with Heartbeat(queue, owner) as heartbeat:
+            while True:
+                room = 2 * workers - len(in_flight)
+                leased = queue.lease(owner, room) if room > 0 else []
+                for patent_number in leased:
+                    heartbeat.add(patent_number)
+                    in_flight[executor.submit(work, patent_number)] = patent_number
+
+                if not in_flight:
+                    outstanding, next_in = queue.outstanding()
+                    if not wait_for_others or not outstanding:
+                        break
+                    time.sleep(min(poll_interval, next_in if next_in is not None else poll_interval) + 0.1)
+                    continue
+
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    handle(future, in_flight.pop(future))
+    except KeyboardInterrupt:
+        # Patents in progress go straight back to the queue instead of waiting for their leases to expire
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.warning(f"Interrupted, released {queue.release(owner)} leased patents")
+        raise
+    executor.shutdown()
+    return counts['succeeded'], counts['failed']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the download work queue (drain it with google_patent_downloader.py --queue)')
+    parser.add_argument('--db', default=DEFAULT_QUEUE, help=f'Queue database (default: {DEFAULT_QUEUE})')
+    commands = parser.add_subparsers(dest='command', required=True)
+    enqueue = commands.add_parser('enqueue', help='Add the patent numbers of a file')
+    enqueue.add_argument('file', help='File with patent numbers, one per line')
+    commands.add_parser('stats', help='Show patents per state')
+    requeue = commands.add_parser('requeue', help='Queue dead (or done) patents again')
+    requeue.add_argument('--state', choices=['dead', 'done'], default='dead', help='State to queue again (default: dead)')
+    export = commands.add_parser('export', help='Write the patent numbers in one state, one per line')
+    export.add_argument('--state', choices=STATES, default='dead', help='State to export (default: dead)')
+    export.add_argument('--output', default=os.path.join('reports', 'queue_dead.txt'), help='Output file (default: reports/queue_dead.txt)')
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.db)
+    try:
+        if args.command == 'enqueue':
+            added = queue.enqueue(iter_patent_numbers(read_lines(args.file), dedupe='none'))
+            print(f"Added {added} patents to {args.db}")
+        elif args.command == 'requeue':
+            print(f"Queued {queue.requeue(args.state)} {args.state} patents again")
+        elif args.command == 'export':
+            rows = queue.numbers(args.state)
+            directory = os.path.dirname(args.output)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.writelines(patent_number + '\n' for patent_number, _ in rows)
+            print(f"{len(rows)} {args.state} patents written to {args.output}")
+        counts = queue.counts()
+        print(f"Queue {args.db}: " + (', '.join(f"{state}={counts[state]}" for state in STATES if state in counts) or 'empty'))
+    finally:
+        queue.close()
+
+
+if __name__ == '__main__':
+    main()